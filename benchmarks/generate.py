@@ -0,0 +1,221 @@
+"""
+Generates synthetic NGINX configs of a given number of directives.
+
+The main config holds the usual top-level and http directives, maps and
+upstreams, and includes the virtual hosts from sites/*.conf. Each server
+block has plain, regex and nested locations, and a seeded share of them
+is given one of the misconfigurations the signatures look for. The same
+size and seed always give the same config.
+
+    Example: poetry run python -m benchmarks.generate --directives 100000 --output /tmp/bench
+"""
+
+import argparse as ap
+import random
+from dataclasses import dataclass, field
+from os import makedirs, path
+
+
+SERVERS_PER_FILE = 100
+
+# Misconfiguration name -> lines added to a server block, given the server index
+MISCONFIGURATIONS = {
+    'alias_lfi': lambda index: ['location /assets {', f'    alias /var/www/site{index}/assets/;', '}'],
+    'ssrf': lambda index: ['location ~ /fetch/(.*)/(.*)$ {', '    proxy_pass http://$1/$2;', '}'],
+    'host_spoofing': lambda index: ['location /upstream/ {', '    proxy_set_header Host $http_host;',
+                                    f'    proxy_pass http://backend{index % 10};', '}'],
+    'crlf_injection': lambda index: ['location /old/ {', '    return 302 https://example.com$uri;', '}'],
+    'add_header_redefinition': lambda index: ['add_header X-Frame-Options DENY;', 'location /framed/ {',
+                                              '    add_header X-Content-Type-Options nosniff;', '}'],
+    'merge_slashes_off': lambda index: ['merge_slashes off;'],
+    'valid_referers': lambda index: ['valid_referers none server_names *.example.com;'],
+    'dangerous_root_location': lambda index: ['root /;'],
+    'raw_backend_response_reading': lambda index: ['proxy_intercept_errors on;', 'proxy_hide_header Secret-Header;'],
+}
+
+
+@dataclass
+class GeneratedConfig:
+    """
+    Data class that represents a generated config on disk
+    """
+    filepath: str = None
+    num_directives: int = 0
+    num_files: int = 0
+    # Misconfiguration name -> number of server blocks it was seeded in
+    seeded: dict[str, int] = field(default_factory=dict)
+
+
+def count_directives(lines: list[str]) -> int:
+    """
+    Args:
+        lines (list[str]): Config lines with one directive, block opening or
+                           block closing each, as written by the generator
+
+    Returns:
+        int: Number of directives, i.e. every line but the closing braces
+    """
+    return sum(1 for line in lines if line.strip() != '}')
+
+
+def indent(lines: list[str], level: int = 1) -> list[str]:
+    return [f'{"    " * level}{line}' for line in lines]
+
+
+def generate_server(index: int, rng: random.Random, misconfiguration_rate: float,
+                    seeded: dict[str, int]) -> list[str]:
+    """
+    Args:
+        index (int): Index of the server block, used in names and paths
+        rng (random.Random): Seeded random number generator
+        misconfiguration_rate (float): Probability of seeding a misconfiguration
+        seeded (dict[str, int]): Counts of seeded misconfigurations, updated in place
+
+    Returns:
+        list[str]: Lines of the server block
+    """
+    body = [
+        f'listen {8000 + index % 1000};',
+        f'server_name site{index}.example.com www.site{index}.example.com;',
+        f'root /var/www/site{index};',
+        f'access_log /var/log/nginx/site{index}.access.log main;',
+        'index index.html index.php;',
+        'location / {',
+        '    try_files $uri $uri/ /index.php?$args;',
+        '}',
+        'location /static/ {',
+        f'    alias /var/www/site{index}/static/;',
+        '    expires 30d;',
+        '}',
+        'location ~ \\.php$ {',
+        '    fastcgi_pass unix:/run/php/php-fpm.sock;',
+        '    fastcgi_param SCRIPT_FILENAME $document_root$fastcgi_script_name;',
+        '}',
+        'location /api/ {',
+        f'    proxy_pass http://backend{index % 10};',
+        '    proxy_set_header Host $host;',
+        '    proxy_set_header X-Real-IP $remote_addr;',
+        '    location /api/admin/ {',
+        '        allow 10.0.0.0/8;',
+        '        deny all;',
+        f'        proxy_pass http://backend{index % 10};',
+        '    }',
+        '}',
+    ]
+
+    if rng.random() < misconfiguration_rate:
+        name = rng.choice(list(MISCONFIGURATIONS))
+        body.extend(MISCONFIGURATIONS[name](index))
+        seeded[name] = seeded.get(name, 0) + 1
+
+    return ['server {', *indent(body), '}']
+
+
+def generate_config(folder: str, num_directives: int, seed: int = 0,
+                    misconfiguration_rate: float = 0.05) -> GeneratedConfig:
+    """
+    Write a config of roughly the given number of directives (rounded up to
+    a whole server block) into folder.
+
+    Args:
+        folder (str): Folder to write nginx.conf and sites/*.conf to
+        num_directives (int): Number of directives to aim for
+        seed (int, optional): Seed of the generated contents
+        misconfiguration_rate (float, optional): Share of server blocks
+                                                 given a misconfiguration
+
+    Returns:
+        GeneratedConfig
+    """
+    rng = random.Random(seed)
+    generated = GeneratedConfig(filepath=path.join(folder, 'nginx.conf'))
+    makedirs(path.join(folder, 'sites'), exist_ok=True)
+
+    http_body = [
+        'default_type application/octet-stream;',
+        'log_format main \'$remote_addr - $remote_user [$time_local] "$request" $status\';',
+        'sendfile on;',
+        'keepalive_timeout 65;',
+        'map $http_upgrade $connection_upgrade {',
+        '    default upgrade;',
+        "    '' close;",
+        '}',
+        'map $uri $redirect_target {',
+        '    /old /new;',
+        '    /legacy /current;',
+        '}',
+        *[line for backend in range(10) for line in [
+            f'upstream backend{backend} {{',
+            f'    server 10.0.{backend}.1:8080;',
+            f'    server 10.0.{backend}.2:8080;',
+            '}',
+        ]],
+        'include sites/*.conf;',
+    ]
+    main_lines = [
+        'user www-data;',
+        'worker_processes auto;',
+        'pid /run/nginx.pid;',
+        'events {',
+        '    worker_connections 1024;',
+        '}',
+        'http {',
+        *indent(http_body),
+        '}',
+    ]
+    with open(generated.filepath, 'w') as f:
+        f.write('\n'.join(main_lines) + '\n')
+    generated.num_directives = count_directives(main_lines)
+    generated.num_files = 1
+
+    server_index = 0
+    while generated.num_directives < num_directives:
+        site_lines = []
+        while len(site_lines) == 0 or (server_index % SERVERS_PER_FILE
+                                       and generated.num_directives < num_directives):
+            server_lines = generate_server(server_index, rng, misconfiguration_rate, generated.seeded)
+            site_lines.extend(server_lines)
+            generated.num_directives += count_directives(server_lines)
+            server_index += 1
+
+        site_path = path.join(folder, 'sites', f'site{generated.num_files:05}.conf')
+        with open(site_path, 'w') as f:
+            f.write('\n'.join(site_lines) + '\n')
+        generated.num_files += 1
+
+    return generated
+
+
+def parse_size(size: str) -> int:
+    """
+    Args:
+        size (str): Number with an optional k or M suffix, e.g. "10k"
+
+    Returns:
+        int
+    """
+    multipliers = {'k': 1000, 'm': 1000000}
+    suffix = size[-1].lower()
+    if suffix in multipliers:
+        return int(float(size[:-1]) * multipliers[suffix])
+    return int(size)
+
+
+def main():
+    argument_parser = ap.ArgumentParser()
+    argument_parser.add_argument('--directives', type=parse_size, default=10000,
+                                 help='Number of directives, e.g. 1k, 10k, 100k or 1M')
+    argument_parser.add_argument('--output', type=str, required=True, help='Folder to write the config to')
+    argument_parser.add_argument('--seed', type=int, default=0)
+    argument_parser.add_argument('--misconfiguration-rate', type=float, default=0.05,
+                                 help='Share of server blocks given a misconfiguration')
+    args = argument_parser.parse_args()
+
+    generated = generate_config(args.output, args.directives, args.seed, args.misconfiguration_rate)
+    print(f'Wrote {generated.filepath}: {generated.num_directives} directives in {generated.num_files} files')
+    for name, count in sorted(generated.seeded.items()):
+        print(f'{count:8}  {name}')
+
+
+if __name__ == '__main__':
+    main()
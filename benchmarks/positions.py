@@ -0,0 +1,91 @@
+"""
+Benchmarks resolving the position of flagged directives.
+
+Generates a config of the given number of lines, flags the given number
+of directives through SignatureBuilder.add_flagged, and compares against
+the previous approach of re-splitting the whole file for every flag
+(timed on a sample and extrapolated, as it is quadratic).
+
+    Example: poetry run python -m benchmarks.positions --lines 50000 --flags 10000
+"""
+
+import argparse as ap
+import re
+import tempfile
+from os import path
+from time import perf_counter
+
+from unginxed.nginx_config import NginxConfig
+from unginxed.signature import SignatureBuilder
+
+
+def generate_config(num_lines: int) -> str:
+    lines = ['http {']
+    server_index = 0
+    while len(lines) < num_lines - 1:
+        lines.extend([
+            '    server {',
+            f'        server_name site{server_index}.example.com;',
+            '        location / {',
+            '            proxy_set_header Host $http_host;',
+            f'            add_header X-Site "site {server_index}";',
+            '        }',
+            '    }',
+        ])
+        server_index += 1
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def legacy_get_directive_position(config: str, directive_and_args: list[str], line_number: int):
+    pattern = r'\s+'.join(['[\'\"]?{}[\'\"]?'.format(re.escape(arg)) for arg in directive_and_args])
+    config_trimmed = '\n'.join(config.splitlines()[line_number-1:])
+    match = re.search(pattern, config_trimmed)
+    if match:
+        [start_index, end_index] = match.span()
+        return (start_index + 1, end_index + 1)
+    return None
+
+
+def main():
+    argument_parser = ap.ArgumentParser()
+    argument_parser.add_argument('--lines', type=int, default=50000, help='Number of config lines')
+    argument_parser.add_argument('--flags', type=int, default=10000, help='Number of directives to flag')
+    argument_parser.add_argument('--legacy-sample', type=int, default=100,
+                                 help='Number of flags to time with the legacy approach (0 to skip)')
+    args = argument_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = path.join(directory, 'bench.conf')
+        with open(filepath, 'w') as f:
+            f.write(generate_config(args.lines))
+
+        start = perf_counter()
+        config = NginxConfig(filepath)
+        load_time = perf_counter() - start
+
+    directives = [*config.get_directives('proxy_set_header'), *config.get_directives('add_header')]
+    directives = directives[:args.flags]
+
+    start = perf_counter()
+    builder = SignatureBuilder(config)
+    for directive in directives:
+        builder.add_flagged(directive)
+    flag_time = perf_counter() - start
+
+    print(f'Config: {len(config.locator.line_starts)} lines, {len(directives)} flags')
+    print(f'Load (parse + index + line offsets): {load_time:.3f}s')
+    print(f'add_flagged with locator: {flag_time:.3f}s ({flag_time / len(directives) * 1e6:.1f}us per flag)')
+
+    if args.legacy_sample:
+        sample = directives[:args.legacy_sample]
+        start = perf_counter()
+        for directive in sample:
+            legacy_get_directive_position(config.raw, [directive.directive, *directive.args], directive.line)
+        legacy_time = perf_counter() - start
+        print(f'Legacy re-split approach: {legacy_time / len(sample) * 1e6:.1f}us per flag '
+              f'(~{legacy_time / len(sample) * len(directives):.1f}s extrapolated for {len(directives)} flags)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmarks routing a large corpus of requests through a generated config.
+
+Generates a config (see benchmarks.generate) and random requests to its
+virtual hosts, then times routing every request to its server and
+location block, and counting the requests reaching each finding.
+
+    Example: poetry run python -m benchmarks.routing --directives 100k --requests 1M
+"""
+
+import argparse as ap
+import random
+import tempfile
+from time import perf_counter
+
+from unginxed.engine import ScanEngine
+from unginxed.nginx_config import NginxConfig
+from unginxed.routing import Router, get_reachable_findings
+from unginxed.signature import get_signatures
+
+from .generate import generate_config, parse_size
+
+
+# Paths hitting the prefix, regex and nested locations of generated server
+# blocks (and some of the seeded misconfigurations)
+PATHS = [
+    '/', '/index.html', '/static/app.js', '/static/../index.php', '/api/users', '/api/admin/stats',
+    '/fetch/internal/secret', '/assets/logo.png', '/upstream/health', '/old/page', '/framed/widget',
+    '//double//slash', '/search?q=%2e%2e',
+]
+
+
+def generate_requests(num_requests: int, num_servers: int, seed: int = 0) -> list[str]:
+    """
+    Args:
+        num_requests (int): Number of requests
+        num_servers (int): Number of generated server blocks to spread them over
+        seed (int, optional): Seed of the random requests
+
+    Returns:
+        list[str]: Requests as "<host> <URI>" lines
+    """
+    rng = random.Random(seed)
+    return [f'site{rng.randrange(num_servers)}.example.com {rng.choice(PATHS)}?id={rng.randrange(1000)}'
+            for _ in range(num_requests)]
+
+
+def main():
+    argument_parser = ap.ArgumentParser()
+    argument_parser.add_argument('--directives', type=str, default='10k', help='Config size, e.g. 10k or 1M')
+    argument_parser.add_argument('--requests', type=str, default='1M', help='Number of requests, e.g. 100k or 1M')
+    args = argument_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        generated = generate_config(folder, parse_size(args.directives))
+        config = NginxConfig(generated.filepath)
+        results = ScanEngine(get_signatures()).run(config)
+
+    router = Router(config)
+    requests = generate_requests(parse_size(args.requests), len(router.servers))
+
+    start = perf_counter()
+    routes = list(router.route_many(requests))
+    route_time = perf_counter() - start
+
+    start = perf_counter()
+    reachable = get_reachable_findings(config, results, routes)
+    reachable_time = perf_counter() - start
+
+    num_reachable = sum(1 for _, _, num_requests in reachable if num_requests)
+    print(f'Config: {generated.num_directives} directives, {len(router.servers)} server blocks')
+    print(f'Routing: {len(routes)} requests in {route_time:.3f}s '
+          f'({route_time / len(routes) * 1e6:.2f}us per request)')
+    print(f'Reachable findings: {num_reachable} of {len(reachable)} in {reachable_time:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
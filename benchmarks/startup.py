@@ -0,0 +1,109 @@
+"""
+Benchmarks CLI cold start, i.e. a full `python -m unginxed` run on a small
+config, as in a pre-commit hook.
+
+Times the given number of runs of `-s --format jsonl` (with and without the
+result cache) against a bare interpreter start, and lists the slowest
+top-level imports from `python -X importtime`. Exits with status 1 if the
+median cached run exceeds the target.
+
+    Example: poetry run python -m benchmarks.startup --runs 20 --target-ms 100
+"""
+
+import argparse as ap
+import os
+import subprocess
+import sys
+import tempfile
+from os import path
+from statistics import median
+from time import perf_counter
+
+SMALL_CONFIG = """
+http {
+    server {
+        listen 80;
+        root /var/www;
+        location /proxy/ {
+            proxy_set_header Host $http_host;
+            proxy_pass http://backend;
+        }
+    }
+}
+"""
+
+
+def time_command(command: list[str], env: dict[str, str], runs: int) -> float:
+    durations = []
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        durations.append(perf_counter() - start)
+    return median(durations)
+
+
+def get_import_times(command: list[str], env: dict[str, str]) -> list[tuple[str, int]]:
+    """
+    Returns:
+        list[tuple[str, int]]: Top-level modules imported by the command and
+                               their cumulative import time in microseconds,
+                               slowest first
+    """
+    process = subprocess.run([command[0], '-X', 'importtime', *command[1:]], env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    import_times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        # Nested imports are indented under the module importing them
+        if not module[1:].startswith(' '):
+            import_times.append((module.strip(), int(cumulative)))
+    return sorted(import_times, key=lambda import_time: import_time[1], reverse=True)
+
+
+def main():
+    argument_parser = ap.ArgumentParser()
+    argument_parser.add_argument('--runs', type=int, default=20, help='Number of timed runs per command')
+    argument_parser.add_argument('--target-ms', type=float, default=100.0,
+                                 help='Target median wall time of a cached run')
+    argument_parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list')
+    args = argument_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = path.join(directory, 'small.conf')
+        with open(filepath, 'w') as f:
+            f.write(SMALL_CONFIG)
+
+        # Isolated cache, so that the result cache and signature manifest
+        # of the user are left alone
+        env = {**os.environ, 'XDG_CACHE_HOME': path.join(directory, 'cache')}
+        command = [sys.executable, '-m', 'unginxed', filepath, '-s', '--format', 'jsonl']
+
+        # Warm up bytecode, the signature manifest and the result cache
+        time_command(command, env, 1)
+
+        interpreter_time = time_command([sys.executable, '-c', 'pass'], env, args.runs)
+        cached_time = time_command(command, env, args.runs)
+        uncached_time = time_command([*command, '--no-cache'], env, args.runs)
+        import_times = get_import_times([*command, '--no-cache'], env)
+
+    print(f'Median of {args.runs} runs')
+    print(f'Interpreter start:           {interpreter_time * 1000:.1f} ms')
+    print(f'-s --format jsonl:           {cached_time * 1000:.1f} ms '
+          f'(+{(cached_time - interpreter_time) * 1000:.1f} ms over the interpreter)')
+    print(f'-s --format jsonl, no cache: {uncached_time * 1000:.1f} ms '
+          f'(+{(uncached_time - interpreter_time) * 1000:.1f} ms over the interpreter)')
+
+    print('\nSlowest top-level imports (cumulative, no cache)')
+    for module, cumulative in import_times[:args.top]:
+        print(f'{cumulative / 1000:8.1f} ms  {module}')
+
+    within_target = cached_time * 1000 <= args.target_ms
+    print(f'\nTarget {args.target_ms:.0f} ms: {"met" if within_target else "NOT met"}')
+    if not within_target:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
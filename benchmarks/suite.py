@@ -0,0 +1,271 @@
+"""
+Benchmarks the whole scan pipeline on generated configs of several sizes,
+and compares the timings against a stored baseline.
+
+For each size, a config is generated (see benchmarks.generate) and the
+best of the given number of runs is recorded for: parsing, building the
+directive tree and its index from the parsed files, loading the config in
+low memory mode, running every signature, and each report backend. The
+peak RSS of a process loading and scanning the config is recorded as
+well, in both modes. With --check, the run fails (exit status 1) if any
+timing regressed past the tolerance.
+
+    Example:
+        poetry run python -m benchmarks.suite --sizes 1k,10k,100k --save baseline.json
+        poetry run python -m benchmarks.suite --sizes 1k,10k,100k --check baseline.json --tolerance 0.2
+"""
+
+import argparse as ap
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from importlib.util import find_spec
+from os import path
+from time import perf_counter
+from typing import Callable, Optional
+
+from unginxed.batch import ScanResult
+from unginxed.engine import ScanEngine
+from unginxed.formats import WRITERS, get_writer
+from unginxed.loader import ConfigLoader, ParseCache
+from unginxed.nginx_config import NginxConfig
+from unginxed.signature import get_signatures
+from unginxed.streaming import StreamingScan
+
+from .generate import generate_config, parse_size
+
+
+REPORT_BACKENDS = [*WRITERS, 'html', 'pdf']
+DEFAULT_BACKENDS = [*WRITERS, 'html']
+
+# Loads and scans a config in a fresh interpreter, then prints its peak RSS
+PEAK_RSS_SCRIPT = """
+import sys
+from resource import RUSAGE_SELF, getrusage
+
+from unginxed.engine import ScanEngine
+from unginxed.nginx_config import NginxConfig
+from unginxed.signature import get_signatures
+
+config = NginxConfig(sys.argv[1], low_memory=sys.argv[2] == 'low_memory')
+ScanEngine(get_signatures()).run(config)
+print(getrusage(RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def best_of(runs: int, setup: Callable, run: Callable) -> float:
+    """
+    Args:
+        runs (int): Number of timed runs
+        setup (Callable): Called before each run, untimed. Its result is passed to run
+        run (Callable): Timed call
+
+    Returns:
+        float: Fastest run, in seconds
+    """
+    durations = []
+    for _ in range(runs):
+        argument = setup()
+        start = perf_counter()
+        run(argument)
+        durations.append(perf_counter() - start)
+    return min(durations)
+
+
+def measure_peak_rss(filepath: str, low_memory: bool) -> Optional[float]:
+    """
+    Args:
+        filepath (str): Path to the config
+        low_memory (bool): Load the config in low memory mode
+
+    Returns:
+        float: Peak RSS of a process loading and scanning the config, in MiB.
+               None if it cannot be measured on this platform
+    """
+    # Not available on Windows
+    if find_spec('resource') is None:
+        return None
+
+    mode = 'low_memory' if low_memory else 'default'
+    output = subprocess.run([sys.executable, '-c', PEAK_RSS_SCRIPT, filepath, mode],
+                            capture_output=True, text=True, check=True).stdout
+    # Kilobytes, except on macOS where it is in bytes
+    return int(output.split()[-1]) / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def benchmark_size(folder: str, num_directives: int, runs: int, backends: list[str]) -> dict:
+    """
+    Args:
+        folder (str): Folder to generate the config in
+        num_directives (int): Size of the config
+        runs (int): Number of timed runs per measurement
+        backends (list[str]): Report backends to time
+
+    Returns:
+        dict: Size of the config, number of findings, timings in seconds
+              keyed by measurement, and peak RSS in MiB keyed by mode
+    """
+    generated = generate_config(folder, num_directives)
+    filepath = generated.filepath
+
+    warm_cache = ParseCache()
+    ConfigLoader(filepath, warm_cache).load()
+    # Tree and index from files that were already parsed, and parsing
+    # as what is left of a load from scratch
+    tree_time = best_of(runs, lambda: None, lambda _: ConfigLoader(filepath, warm_cache).load())
+    load_time = best_of(runs, lambda: None, lambda _: ConfigLoader(filepath, ParseCache()).load())
+
+    engine = ScanEngine(get_signatures())
+    timings = {
+        'parse': max(load_time - tree_time, 0.0),
+        'tree': tree_time,
+        'load:mapped': best_of(runs, lambda: None, lambda _: NginxConfig(filepath, low_memory=True)),
+        # Fresh configs, so that position lookups are not served from a
+        # previous run's locators
+        'match': best_of(runs, lambda: NginxConfig(filepath), engine.run),
+        # Parsing and every signature at once, see streaming.py
+        'scan:stream': best_of(runs, lambda: None, lambda _: list(StreamingScan(filepath, engine.signatures))),
+    }
+
+    config = NginxConfig(filepath)
+    signatures = engine.run(config)
+    result = ScanResult(filepath=filepath, signatures=signatures)
+
+    for backend in backends:
+        if backend in WRITERS:
+            def write(stream: io.StringIO, backend: str = backend):
+                writer = get_writer(backend, stream)
+                writer.write(result)
+                writer.close()
+            timings[f'report:{backend}'] = best_of(runs, io.StringIO, write)
+        elif backend == 'html':
+            from unginxed.report import ReportGenerator
+            report_generator = ReportGenerator(output_format='html')
+            report_generator.render_html(config, signatures)
+            timings['report:html'] = best_of(runs, lambda: None,
+                                             lambda _: report_generator.render_html(config, signatures))
+        elif backend == 'pdf':
+            from unginxed.report import ReportGenerator
+            source_html = ReportGenerator().render_html(config, signatures)
+            timings['report:pdf'] = best_of(runs, io.BytesIO,
+                                            lambda stream: ReportGenerator.write_pdf(source_html, stream))
+
+    return {
+        'directives': generated.num_directives,
+        'files': generated.num_files,
+        'findings': result.get_total_flagged(),
+        'timings': timings,
+        'peak_rss_mb': {
+            'default': measure_peak_rss(filepath, low_memory=False),
+            'low_memory': measure_peak_rss(filepath, low_memory=True),
+        },
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float, min_delta: float) -> list[str]:
+    """
+    Print every timing next to its baseline.
+
+    Args:
+        baseline (dict): Results loaded from a baseline file
+        current (dict): Results of this run
+        tolerance (float): Allowed slowdown, e.g. 0.2 for 20%
+        min_delta (float): Slowdowns of fewer seconds than this are ignored as noise
+
+    Returns:
+        list[str]: Descriptions of the regressed timings
+    """
+    regressions = []
+    print(f'{"Size":>9}  {"Measurement":<14} {"Baseline ms":>12} {"Current ms":>12} {"Change":>8}')
+    for size, results in current['sizes'].items():
+        baseline_results = baseline['sizes'].get(size)
+        if baseline_results is None:
+            print(f'{size:>9}  not in the baseline')
+            continue
+
+        if baseline_results['findings'] != results['findings']:
+            print(f'{size:>9}  {results["findings"]} findings, baseline has {baseline_results["findings"]}')
+
+        for measurement, duration in results['timings'].items():
+            baseline_duration = baseline_results['timings'].get(measurement)
+            if baseline_duration is None:
+                continue
+            change = (duration - baseline_duration) / baseline_duration if baseline_duration else 0.0
+            regressed = change > tolerance and duration - baseline_duration > min_delta
+            print(f'{size:>9}  {measurement:<14} {baseline_duration * 1000:>12.2f} {duration * 1000:>12.2f} '
+                  f'{change:>+8.1%}{"  REGRESSED" if regressed else ""}')
+            if regressed:
+                regressions.append(f'{measurement} at {size} directives: {change:+.1%}')
+
+        # Memory is reported, but never counts as a regression
+        for mode, peak_rss in results.get('peak_rss_mb', {}).items():
+            baseline_peak_rss = baseline_results.get('peak_rss_mb', {}).get(mode)
+            if peak_rss is None or not baseline_peak_rss:
+                continue
+            change = (peak_rss - baseline_peak_rss) / baseline_peak_rss
+            print(f'{size:>9}  {"rss:" + mode:<14} {baseline_peak_rss:>9.1f} MiB {peak_rss:>8.1f} MiB {change:>+8.1%}')
+    return regressions
+
+
+def main():
+    argument_parser = ap.ArgumentParser()
+    argument_parser.add_argument('--sizes', type=str, default='1k,10k,100k',
+                                 help='Comma-separated config sizes in directives, e.g. 1k,10k,100k,1M')
+    argument_parser.add_argument('--runs', type=int, default=3, help='Number of timed runs per measurement')
+    argument_parser.add_argument('--backends', type=str, default=','.join(DEFAULT_BACKENDS),
+                                 help=f'Comma-separated report backends to time, out of {",".join(REPORT_BACKENDS)}')
+    argument_parser.add_argument('--save', type=str, metavar='FILE', help='Write the results to FILE as a baseline')
+    argument_parser.add_argument('--check', type=str, metavar='FILE',
+                                 help='Compare against the baseline in FILE, exiting with status 1 on regressions')
+    argument_parser.add_argument('--tolerance', type=float, default=0.2,
+                                 help='Allowed slowdown against the baseline. Defaults to 0.2 (20%%)')
+    argument_parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                                 help='Slowdowns below this many milliseconds are never regressions')
+    args = argument_parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    backends = [backend for backend in args.backends.split(',') if backend]
+    unknown_backends = set(backends) - set(REPORT_BACKENDS)
+    if unknown_backends:
+        argument_parser.error(f'Unknown report backends: {", ".join(sorted(unknown_backends))}')
+
+    current = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'runs': args.runs,
+        'sizes': {},
+    }
+    for num_directives in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            results = benchmark_size(folder, num_directives, args.runs, backends)
+        current['sizes'][str(num_directives)] = results
+        timings = ', '.join(f'{measurement} {duration * 1000:.1f} ms'
+                            for measurement, duration in results['timings'].items())
+        peak_rss = ', '.join(f'{mode} {peak:.1f} MiB' for mode, peak in results['peak_rss_mb'].items()
+                             if peak is not None)
+        print(f'{results["directives"]} directives, {results["findings"]} findings: {timings}'
+              + (f'; peak RSS: {peak_rss}' if peak_rss else ''))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f'\nBaseline written to {path.abspath(args.save)}')
+
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(baseline, current, args.tolerance, args.min_delta_ms / 1000)
+        if regressions:
+            print(f'\n{len(regressions)} regressions past {args.tolerance:.0%}:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print(f'\nNo regressions past {args.tolerance:.0%}')
+
+
+if __name__ == '__main__':
+    main()
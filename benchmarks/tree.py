@@ -0,0 +1,55 @@
+"""
+Benchmarks building the directive tree of a large config.
+
+Parses a generated config once (so that crossplane is out of the way),
+then times building the directive tree from the parsed config and
+measures the memory held by the tree.
+
+    Example: poetry run python -m benchmarks.tree --lines 200000
+"""
+
+import argparse as ap
+import gc
+import tempfile
+import tracemalloc
+from os import path
+from time import perf_counter
+
+from unginxed.loader import ConfigLoader, ParseCache
+
+from .positions import generate_config
+
+
+def main():
+    argument_parser = ap.ArgumentParser()
+    argument_parser.add_argument('--lines', type=int, default=200000, help='Number of config lines')
+    args = argument_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = path.join(directory, 'bench.conf')
+        with open(filepath, 'w') as f:
+            f.write(generate_config(args.lines))
+
+        cache = ParseCache()
+        ConfigLoader(filepath, cache).load()
+
+        start = perf_counter()
+        ConfigLoader(filepath, cache).load()
+        build_time = perf_counter() - start
+
+        # Measured separately, as tracing slows allocations down
+        gc.collect()
+        tracemalloc.start()
+        directives = ConfigLoader(filepath, cache).load()
+        tree_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    num_directives = sum(len(entries) for entries in directives.index.by_name.values())
+    print(f'Config: {args.lines} lines, {num_directives} directives')
+    print(f'Tree build (from cached parse): {build_time:.3f}s ({build_time / num_directives * 1e6:.2f}us per directive)')
+    print(f'Tree memory (with index and source): {tree_bytes / 1024 / 1024:.1f} MiB '
+          f'({tree_bytes / num_directives:.0f} bytes per directive)')
+
+
+if __name__ == '__main__':
+    main()
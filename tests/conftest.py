@@ -0,0 +1,30 @@
+from typing import Callable
+
+import pytest
+
+from unginxed.nginx_config import NginxConfig
+
+
+@pytest.fixture
+def write_config(tmp_path) -> Callable[[str], str]:
+    """
+    Returns:
+        Callable[[str], str]: Writes the text of a config to nginx.conf in
+                              a temporary folder, and returns its path
+    """
+    def write(raw: str) -> str:
+        filepath = tmp_path / 'nginx.conf'
+        filepath.write_text(raw)
+        return str(filepath)
+
+    return write
+
+
+@pytest.fixture
+def load_config(write_config) -> Callable[[str], NginxConfig]:
+    """
+    Returns:
+        Callable[[str], NginxConfig]: Loads the text of a config, written
+                                      as by write_config
+    """
+    return lambda raw: NginxConfig(write_config(raw))
@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from unginxed import batch
+from unginxed.cache import ResultCache
+from unginxed.signature import Signature
+
+
+def matcher(config) -> Signature:
+    if config.filepath.endswith('bad.conf'):
+        raise KeyError('broken signature')
+    return Signature(name='Works')
+
+
+@pytest.fixture
+def config_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'get_signatures', lambda: [matcher])
+    # Workers of the other tests are left as they were
+    for name in ('_engine', '_cache', '_report_generator', '_low_memory'):
+        monkeypatch.setattr(batch, name, getattr(batch, name))
+    for name in ('a', 'bad', 'c'):
+        (tmp_path / f'{name}.conf').write_text('http { server { listen 80; } }\n')
+    (tmp_path / 'invalid.conf').write_text('http {\n')
+    return tmp_path
+
+
+def test_expand_config_paths(config_folder):
+    (config_folder / 'notes.txt').write_text('ignored\n')
+    filepaths = batch.expand_config_paths([str(config_folder), str(config_folder / 'a.conf'), 'missing.conf'])
+    assert filepaths == [str(config_folder / f'{name}.conf') for name in ('a', 'bad', 'c', 'invalid')] \
+        + ['missing.conf']
+
+
+def test_failures_do_not_abort_the_batch(config_folder):
+    filepaths = batch.expand_config_paths([str(config_folder)])
+    results = {result.filepath: result for result in batch.scan_many(filepaths, workers=1)}
+    assert len(results) == 4
+    assert results[str(config_folder / 'bad.conf')].error == "Scan failed: KeyError: 'broken signature'"
+    assert results[str(config_folder / 'invalid.conf')].error
+    for name in ('a', 'c'):
+        result = results[str(config_folder / f'{name}.conf')]
+        assert result.error is None
+        assert [signature.name for signature in result.signatures] == ['Works']
+
+
+def test_cache_write_failure(config_folder, monkeypatch):
+    cache = ResultCache(str(config_folder / 'results.sqlite3'))
+
+    def put(config, signatures):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(cache, 'put', put)
+    batch.initialize_worker(cache)
+    result = batch.scan_file(str(config_folder / 'a.conf'))
+    assert result.error == 'Could not write to the result cache: database is locked'
+    assert [signature.name for signature in result.signatures] == ['Works']
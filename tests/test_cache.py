@@ -0,0 +1,165 @@
+from itertools import count
+
+import pytest
+
+import unginxed
+from unginxed import cache as cache_module
+from unginxed.cache import ResultCache, get_package_fingerprint
+from unginxed.nginx_config import NginxConfig
+
+
+MAIN = """
+http {
+    include conf.d/*.conf;
+    server {
+        listen 80;
+        include snippets/headers.conf;
+    }
+}
+"""
+
+
+@pytest.fixture
+def config_folder(tmp_path):
+    (tmp_path / 'conf.d').mkdir()
+    (tmp_path / 'snippets').mkdir()
+    (tmp_path / 'nginx.conf').write_text(MAIN)
+    (tmp_path / 'conf.d' / 'a.conf').write_text('server { listen 8080; location / { } }\n')
+    (tmp_path / 'snippets' / 'headers.conf').write_text('add_header X-Frame-Options DENY;\n')
+    return tmp_path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'cache' / 'results.sqlite3'))
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Every access gets a later time, however fast the test runs
+    ticks = count(1)
+    monkeypatch.setattr(cache_module, 'time', lambda: next(ticks))
+
+
+def scan(filepath, cache: ResultCache) -> list[dict]:
+    return [result.to_dict() for result in unginxed.scan(str(filepath), cache=cache)]
+
+
+def get_cached(filepath, cache: ResultCache):
+    results = cache.get(str(filepath))
+    return [result.to_dict() for result in results] if results is not None else None
+
+
+def test_hit(config_folder, cache):
+    filepath = config_folder / 'nginx.conf'
+    assert get_cached(filepath, cache) is None
+    results = scan(filepath, cache)
+    assert get_cached(filepath, cache) == results
+
+
+def test_main_file_changed(config_folder, cache):
+    filepath = config_folder / 'nginx.conf'
+    scan(filepath, cache)
+    filepath.write_text(MAIN.replace('listen 80', 'listen 81'))
+    assert get_cached(filepath, cache) is None
+
+
+@pytest.mark.parametrize('included', ['snippets/headers.conf', 'conf.d/a.conf'])
+def test_included_file_changed(config_folder, cache, included):
+    filepath = config_folder / 'nginx.conf'
+    scan(filepath, cache)
+    with open(config_folder / included, 'a') as f:
+        f.write('# changed\n')
+    assert get_cached(filepath, cache) is None
+    # The stale entry is deleted
+    (config_folder / included).write_text((config_folder / included).read_text().replace('# changed\n', ''))
+    assert get_cached(filepath, cache) is None
+
+
+def test_included_file_removed(config_folder, cache):
+    filepath = config_folder / 'nginx.conf'
+    scan(filepath, cache)
+    (config_folder / 'snippets' / 'headers.conf').unlink()
+    assert get_cached(filepath, cache) is None
+
+
+def test_include_pattern_matches_new_file(config_folder, cache):
+    filepath = config_folder / 'nginx.conf'
+    scan(filepath, cache)
+    (config_folder / 'conf.d' / 'b.conf').write_text('server { listen 8081; }\n')
+    assert get_cached(filepath, cache) is None
+    results = scan(filepath, cache)
+    assert get_cached(filepath, cache) == results
+
+
+def test_fingerprint_changed(config_folder, cache):
+    filepath = config_folder / 'nginx.conf'
+    scan(filepath, cache)
+    other = ResultCache(cache.cache_path, fingerprint='0' * 64)
+    assert get_cached(filepath, other) is None
+    assert get_cached(filepath, ResultCache(cache.cache_path)) is not None
+
+
+def test_package_fingerprint(tmp_path):
+    (tmp_path / 'sigs').mkdir()
+    (tmp_path / '__pycache__').mkdir()
+    (tmp_path / 'parser.py').write_text('parse = None\n')
+    (tmp_path / 'sigs' / 'a.py').write_text('matcher = None\n')
+    (tmp_path / 'notes.txt').write_text('ignored\n')
+    fingerprint = get_package_fingerprint(str(tmp_path))
+    assert fingerprint == get_package_fingerprint(str(tmp_path))
+
+    (tmp_path / 'notes.txt').write_text('still ignored\n')
+    (tmp_path / '__pycache__' / 'parser.py').write_text('ignored\n')
+    assert get_package_fingerprint(str(tmp_path)) == fingerprint
+
+    fingerprints = {fingerprint}
+    for filepath, text in [('sigs/a.py', 'matcher = None  # changed\n'),
+                           ('sigs/b.py', 'matcher = None\n'),
+                           ('parser.py', 'parse = None  # changed\n'),
+                           ('engine.py', 'run = None\n')]:
+        (tmp_path / filepath).write_text(text)
+        fingerprints.add(get_package_fingerprint(str(tmp_path)))
+    assert len(fingerprints) == 5
+
+
+def test_old_cache_version(config_folder, cache, monkeypatch):
+    filepath = config_folder / 'nginx.conf'
+    scan(filepath, cache)
+    monkeypatch.setattr(cache_module, 'CACHE_VERSION', cache_module.CACHE_VERSION + 1)
+    assert get_cached(filepath, ResultCache(cache.cache_path)) is None
+
+
+def test_evict_least_recently_used(tmp_path, cache):
+    filepaths = []
+    for name in 'abc':
+        filepath = tmp_path / f'{name}.conf'
+        filepath.write_text('http { server { listen 80; add_header X a; location / { add_header Y b; } } }\n')
+        filepaths.append(filepath)
+    a, b, c = filepaths
+
+    scan(a, cache)
+    scan(b, cache)
+    sizes = [size for size, in cache.connection.execute('SELECT size FROM results')]
+    assert len(sizes) == 2 and sizes[0] == sizes[1]
+
+    # Room for two entries: a was used more recently than b, so b goes
+    cache.max_bytes = sum(sizes)
+    assert get_cached(a, cache) is not None
+    scan(c, cache)
+    assert get_cached(b, cache) is None
+    assert get_cached(a, cache) is not None
+    assert get_cached(c, cache) is not None
+
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 0
+
+
+def test_put_without_scan(tmp_path, cache):
+    filepath = tmp_path / 'nginx.conf'
+    filepath.write_text('http { server { listen 80; } }\n')
+    cache.put(NginxConfig(str(filepath)), [])
+    assert get_cached(filepath, cache) == []
+    cache.clear()
+    assert get_cached(filepath, cache) is None
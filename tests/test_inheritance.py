@@ -0,0 +1,186 @@
+import pytest
+
+from unginxed.inheritance import InheritanceResolver
+from unginxed.nginx_config import NginxConfig
+from unginxed.sigs.add_header_redefinition import matcher as add_header_redefinition
+from unginxed.sigs.raw_backend_response_reading import matcher as raw_backend_response_reading
+
+
+def get_flagged(matcher, config: NginxConfig) -> list[list[str]]:
+    result = matcher(config)
+    return [flagged["directive_and_args"] for flagged in result.flagged] if result is not None else []
+
+
+NESTED = """
+http {
+    add_header X-Http http;
+    server_tokens off;
+    root /http;
+    server {
+        listen 80;
+        location / {
+            root /location;
+            add_header X-Location-1 1;
+            add_header X-Location-2 2;
+            if ($request_method = POST) {
+                root /if;
+            }
+        }
+        location /api/ {
+            if ($request_method = POST) {
+                add_header X-If if;
+            }
+        }
+    }
+}
+"""
+
+
+def get_values(resolver: InheritanceResolver, block, directive_name: str) -> list[list[str]]:
+    return [directive.args for directive in resolver.get(block, directive_name)]
+
+
+def test_inheritance_through_blocks(load_config):
+    config = load_config(NESTED)
+    resolver = InheritanceResolver()
+    http = config.get_directives('http')[0]
+    server = config.get_directives('server')[0]
+    location, api = config.get_directives('location')
+    location_if, api_if = config.get_directives('if')
+
+    assert resolver.get(None, 'add_header') == ()
+    for block in (http, server, api):
+        assert get_values(resolver, block, 'add_header') == [['X-Http', 'http']]
+        assert resolver.get_value(block, 'root') == ['/http']
+        assert resolver.get_value(block, 'server_tokens') == ['off']
+
+    # Setting one add_header replaces every inherited one
+    assert get_values(resolver, location, 'add_header') == [['X-Location-1', '1'], ['X-Location-2', '2']]
+    assert get_values(resolver, location_if, 'add_header') == [['X-Location-1', '1'], ['X-Location-2', '2']]
+    assert get_values(resolver, api_if, 'add_header') == [['X-If', 'if']]
+    assert get_values(resolver, api_if, 'add_header') != get_values(resolver, api, 'add_header')
+
+    # Scalars set in a block only replace themselves
+    assert resolver.get_value(location, 'root') == ['/location']
+    assert resolver.get_value(location, 'server_tokens') == ['off']
+    assert resolver.get_value(location_if, 'root') == ['/if']
+    assert resolver.get_value(location_if, 'server_tokens') == ['off']
+    assert get_values(resolver, location_if, 'add_header') == [['X-Location-1', '1'], ['X-Location-2', '2']]
+    assert resolver.get_value(api_if, 'root') == ['/http']
+
+    assert [directive.args for directive in resolver.get_inherited(location, 'add_header')] == [['X-Http', 'http']]
+    assert resolver.get_value(location, 'proxy_intercept_errors') is None
+    # Only inherited directives are resolved
+    assert resolver.get(server, 'listen') == ()
+
+
+def test_blocks_share_results(load_config):
+    config = load_config(NESTED)
+    resolver = InheritanceResolver()
+    http = config.get_directives('http')[0]
+    server = config.get_directives('server')[0]
+    location, api = config.get_directives('location')
+    assert resolver.get_effective(server) is resolver.get_effective(http)
+    assert resolver.get_effective(api) is resolver.get_effective(http)
+    assert resolver.get_effective(location) is not resolver.get_effective(http)
+
+
+@pytest.mark.parametrize('raw, expected', [
+    # Flagged before as well: a server header is dropped by the location
+    ("""
+http {
+    server {
+        add_header X-Server server;
+        location / { add_header X-Location location; }
+    }
+}
+""", [['add_header', 'X-Location', 'location']]),
+    # Flagged before: the location sets the same headers again, so none is dropped
+    ("""
+http {
+    server {
+        add_header X-Server server;
+        location / { add_header x-server location; }
+    }
+}
+""", []),
+    # Not flagged before: headers of http are dropped in a location,
+    # or in an if block
+    ("""
+http {
+    add_header X-Http http;
+    server {
+        location / { add_header X-Location location; }
+        location /a/ {
+            if ($arg_a) { add_header X-If if; }
+        }
+    }
+}
+""", [['add_header', 'X-Location', 'location'], ['add_header', 'X-If', 'if']]),
+    ("""
+http {
+    server {
+        location / {
+            add_header X-Location location;
+            if ($arg_a) { add_header X-If if; add_header X-Location location; }
+        }
+    }
+}
+""", []),
+    # Nothing inherited
+    ("""
+http {
+    server {
+        location / { add_header X-Location location; }
+    }
+}
+""", []),
+])
+def test_add_header_redefinition(load_config, raw, expected):
+    assert get_flagged(add_header_redefinition, load_config(raw)) == expected
+
+
+@pytest.mark.parametrize('raw, expected', [
+    # Flagged before as well
+    ("""
+http {
+    server {
+        location / { proxy_intercept_errors on; proxy_hide_header X-Secret; }
+    }
+}
+""", [['proxy_hide_header', 'X-Secret']]),
+    # Flagged before: turned off
+    ("""
+http {
+    server {
+        location / { proxy_intercept_errors off; proxy_hide_header X-Secret; }
+    }
+}
+""", []),
+    # Not flagged before: turned on in an enclosing block
+    ("""
+http {
+    proxy_intercept_errors on;
+    server {
+        location / { proxy_hide_header X-Secret; }
+    }
+}
+""", [['proxy_hide_header', 'X-Secret']]),
+    ("""
+http {
+    proxy_intercept_errors on;
+    server {
+        location / { proxy_intercept_errors off; proxy_hide_header X-Secret; }
+    }
+}
+""", []),
+    ("""
+http {
+    server {
+        proxy_hide_header X-Secret;
+    }
+}
+""", []),
+])
+def test_raw_backend_response_reading(load_config, raw, expected):
+    assert get_flagged(raw_backend_response_reading, load_config(raw)) == expected
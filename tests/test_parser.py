@@ -0,0 +1,177 @@
+import crossplane
+import pytest
+
+from unginxed.parser import NativeParseError, Parser, parse
+
+
+def strip_spans(parsed: list[dict]) -> list[dict]:
+    stripped = []
+    for directive in parsed:
+        directive = {key: value for key, value in directive.items() if key != 'spans'}
+        if 'block' in directive:
+            directive['block'] = strip_spans(directive['block'])
+        stripped.append(directive)
+    return stripped
+
+
+@pytest.fixture
+def parse_both(write_config):
+    def parse_both(raw: str, check_ctx: bool = True) -> tuple[list[dict], list[dict]]:
+        filepath = write_config(raw)
+        expected = crossplane.parse(filepath, single=True, check_ctx=check_ctx)["config"][0]["parsed"]
+        return parse(raw, filepath, check_ctx), expected
+
+    return parse_both
+
+
+def walk(parsed: list[dict]):
+    for directive in parsed:
+        yield directive
+        yield from walk(directive.get('block', []))
+
+
+CONFIGS = {
+    'quoted': """
+http {
+    add_header X-Double "a \\"quoted\\" value" always;
+    add_header X-Single 'it\\'s "mixed"';
+    add_header X-Empty "";
+    log_format main '$remote_addr - "$request"'
+                    ' $status';
+}
+""",
+    'escaped': """
+http {
+    server {
+        location ~ \\.php$ { return 200 a\\;b; }
+        rewrite ^/a\\ b$ /c\\{d\\} last;
+        set $x ${var}text;
+        set $y ${a}b;
+    }
+}
+""",
+    'comments': """
+# leading comment
+http { # after brace
+    server_tokens off; # after directive
+    #no space
+    server {
+        add_header X "# not a comment";
+        return 200 a#b;
+    }
+}
+""",
+    'if': """
+http {
+    server {
+        if ($request_method = POST) { return 405; }
+        if ( $http_user_agent ~* "(bot|crawler)" ) {
+            return 403;
+        }
+        if ($host!=example.com){ return 444; }
+        if (-f $request_filename) { break; }
+    }
+}
+""",
+    'include': """
+events { worker_connections 1024; }
+http {
+    include mime.types;
+    map $uri $new {
+        default 0;
+        ~^/a 1;
+        "/b c" 2;
+    }
+}
+""",
+}
+
+
+@pytest.mark.parametrize('name', CONFIGS)
+@pytest.mark.parametrize('check_ctx', [True, False])
+def test_same_as_crossplane(parse_both, name, check_ctx):
+    parsed, expected = parse_both(CONFIGS[name], check_ctx)
+    assert strip_spans(parsed) == expected
+    # Parsed natively, not by the fallback
+    assert all('spans' in directive for directive in walk(parsed))
+
+
+def test_context_checked(parse_both):
+    raw = 'http { listen 80; if ($a) { return 404; } }\n'
+    parsed, expected = parse_both(raw)
+    assert strip_spans(parsed) == expected == [{'directive': 'http', 'line': 1, 'args': [], 'block': []}]
+    parsed, expected = parse_both(raw, check_ctx=False)
+    assert strip_spans(parsed) == expected
+    assert [directive['directive'] for directive in parsed[0]['block']] == ['listen', 'if']
+
+
+def test_unterminated_directive(parse_both):
+    # Dropped with the error caught, as crossplane does
+    parsed, expected = parse_both('http {\n    server_tokens off\n}\n')
+    assert strip_spans(parsed) == expected == [{'directive': 'http', 'line': 1, 'args': [], 'block': []}]
+
+
+def test_lua_block(parse_both):
+    raw = """
+http {
+    server {
+        location / {
+            content_by_lua_block {
+                ngx.say("}")
+            }
+        }
+    }
+}
+"""
+    with pytest.raises(NativeParseError):
+        Parser(raw).parse()
+    parsed, expected = parse_both(raw)
+    assert parsed == expected
+    assert parsed[0]['block'][0]['block'][0]['block'][0]['directive'] == 'content_by_lua_block'
+
+
+@pytest.mark.parametrize('raw', [
+    'http {\n    server {\n        listen 80;\n    }\n',
+    'http {\n    listen 80;\n}\n}\n',
+    'http {\n    server_tokens "off;\n}\n',
+    'http {\n    set $a ${b;\n}\n',
+    'http {\n    set $a ${b c}d;\n}\n',
+])
+def test_unterminated(parse_both, raw):
+    with pytest.raises(NativeParseError):
+        Parser(raw).parse()
+    # Falls back to crossplane, with its errors caught
+    parsed, expected = parse_both(raw)
+    assert parsed == expected
+
+
+@pytest.mark.parametrize('name', CONFIGS)
+def test_spans(name):
+    raw = CONFIGS[name]
+    for directive in walk(Parser(raw, check_ctx=False).parse()):
+        spans = directive['spans']
+        assert len(spans) == 2 * (len(directive['args']) + 1) + 1
+        assert raw.count('\n', 0, spans[0]) + 1 == directive['line']
+        for token_index, token in enumerate([directive['directive'], *directive['args']]):
+            text = raw[spans[token_index * 2]:spans[token_index * 2 + 1]]
+            if text[:1] in ('"', "'"):
+                text = text[1:-1]
+            if '\\' not in text:
+                assert text == token
+        assert raw[spans[-1]] == ('{' if 'block' in directive else ';')
+
+
+def test_if_spans():
+    raw = 'if ( $host = x ) { return 404; }'
+    directive = Parser(raw, check_ctx=False).parse()[0]
+    assert directive['args'] == ['$host', '=', 'x']
+    spans = directive['spans']
+    assert [raw[start:end] for start, end in zip(spans[2:-1:2], spans[3:-1:2])] == ['$host', '=', 'x']
+
+
+def test_bytes_spans():
+    raw = 'http { add_header X "é"; }\n'
+    parsed = Parser(raw.encode()).parse()
+    directive = parsed[0]['block'][0]
+    assert directive['args'] == ['X', 'é']
+    assert raw.encode()[directive['spans'][4]:directive['spans'][5]] == '"é"'.encode()
@@ -0,0 +1,66 @@
+import pytest
+
+from unginxed.directive import Directive
+from unginxed.nginx_config import NginxConfig
+from unginxed.predicates import (contains_any, get_variables, has_capture_groups, is_regex_location,
+                                 parse_location, references_variable)
+from unginxed.sigs.map_missing_default import matcher as map_missing_default
+from unginxed.sigs.ssrf import matcher as ssrf
+
+
+@pytest.mark.parametrize('args, expected', [
+    (['/'], (None, '/')),
+    (['=', '/exact'], ('=', '/exact')),
+    (['=/exact'], ('=', '/exact')),
+    (['^~', '/static/'], ('^~', '/static/')),
+    (['~', '\\.php$'], ('~', '\\.php$')),
+    (['~*', '\\.png$'], ('~*', '\\.png$')),
+    (['~*\\.png$'], ('~*', '\\.png$')),
+    (['~\\.php$'], ('~', '\\.php$')),
+    (['@named'], (None, '@named')),
+])
+def test_parse_location(args, expected):
+    location = Directive(directive='location', args=args)
+    assert parse_location(location) == expected
+    assert is_regex_location(location) == (expected[0] in ('~', '~*'))
+
+
+def test_has_capture_groups():
+    assert has_capture_groups('^/(.*)$')
+    assert not has_capture_groups('^/(?:a|b)$')
+    assert not has_capture_groups('(')
+
+
+def test_variables():
+    assert get_variables('http://$host${request_uri}x$1') == {'host', 'request_uri', '1'}
+    assert references_variable(['a', '$uri'], 'uri', 'document_uri')
+    assert not references_variable(['$uri_suffix'], 'uri')
+    assert contains_any('proxy_pass http://backend', ('https', 'http'))
+    assert not contains_any('anything', ())
+
+
+def get_flagged(matcher, config: NginxConfig) -> list[list[str]]:
+    result = matcher(config)
+    return [flagged["directive_and_args"] for flagged in result.flagged] if result is not None else []
+
+
+def test_ssrf(load_config):
+    assert get_flagged(ssrf, load_config("""
+http {
+    server {
+        location ~ ^/proxy/(.*)$ { proxy_pass http://$1; }
+        location /(prefix)/ { proxy_pass http://$host; }
+        location ~ ^/static/ { proxy_pass http://$host; }
+        location /internal/ { internal; proxy_pass http://$host; }
+    }
+}
+""")) == [['location', '~', '^/proxy/(.*)$'], ['proxy_pass', 'http://$host'], ['proxy_pass', 'http://$host']]
+
+
+def test_map_missing_default(load_config):
+    assert get_flagged(map_missing_default, load_config("""
+http {
+    map $uri $a { default 0; /a 1; }
+    map $uri $b { /a 1; /b 2; }
+}
+""")) == [['map', '$uri', '$b']]
@@ -0,0 +1,210 @@
+import pytest
+
+from unginxed.routing import Router, get_enclosing_block, get_reachable_findings, normalize_uri
+from unginxed.signature import SignatureBuilder
+
+
+def get_location_uri(route) -> str:
+    return route.location.args[-1] if route.location is not None else None
+
+
+LOCATIONS = """
+http {
+    server {
+        listen 80;
+        location = /exact { }
+        location / { }
+        location /static/ { }
+        location /static/images/ { }
+        location ^~ /assets/ { }
+        location ~ \\.php$ { }
+        location ~* \\.(png|jpg)$ { }
+        location ~ ^/static/.*\\.png$ { }
+        location /api/ {
+            location /api/v1/ { }
+            location ~ \\.json$ { }
+        }
+    }
+}
+"""
+
+
+@pytest.mark.parametrize('uri, expected', [
+    # = wins outright, even over regexes
+    ('/exact', '/exact'),
+    ('/exact/more', '/'),
+    # Longest prefix
+    ('/', '/'),
+    ('/static/style.css', '/static/'),
+    ('/static/images/logo.svg', '/static/images/'),
+    # Regexes win over the longest prefix, in the order they are defined
+    ('/index.php', '\\.php$'),
+    ('/static/images/logo.png', '\\.(png|jpg)$'),
+    ('/static/images/LOGO.PNG', '\\.(png|jpg)$'),
+    # ~ is case sensitive
+    ('/INDEX.PHP', '/'),
+    # ^~ prefixes skip the regexes
+    ('/assets/logo.png', '/assets/'),
+    # Nested locations are searched within the location that matched
+    ('/api/v1/users', '/api/v1/'),
+    ('/api/v1/users.json', '\\.json$'),
+    ('/api/users', '/api/'),
+    # Query strings are ignored, and URIs normalized before matching
+    ('/exact?x=/static/', '/exact'),
+    ('/static/../exact', '/exact'),
+    ('/%65xact', '/exact'),
+])
+def test_location_precedence(load_config, uri, expected):
+    router = Router(load_config(LOCATIONS))
+    assert get_location_uri(router.route(uri)) == expected
+
+
+@pytest.mark.parametrize('uri, expected', [
+    ('/a/b/c', '/a/b/c'),
+    ('/a/./b', '/a/b'),
+    ('/a/b/../c', '/a/c'),
+    ('/a/b/..', '/a/'),
+    ('/../../a', '/a'),
+    ('//a///b', '/a/b'),
+    ('/a%2Fb%20c', '/a/b c'),
+    ('/a?b=/../c#d', '/a'),
+    ('', '/'),
+])
+def test_normalize_uri(uri, expected):
+    assert normalize_uri(uri) == expected
+
+
+def test_normalize_uri_without_merging_slashes():
+    assert normalize_uri('//a//b', merge_slashes=False) == '//a//b'
+
+
+SERVER_NAMES = """
+http {
+    server {
+        listen 80;
+        server_name first.example.com;
+        location / { return 200 first; }
+    }
+    server {
+        listen 80 default_server;
+        server_name default.example.com;
+        location / { return 200 default; }
+    }
+    server {
+        listen 80;
+        server_name ~^www\\.(?<domain>\\S+)$;
+        location / { return 200 regex; }
+    }
+    server {
+        listen 80;
+        server_name www.*;
+        location / { return 200 trailing; }
+    }
+    server {
+        listen 80;
+        server_name *.example.com;
+        location / { return 200 leading; }
+    }
+    server {
+        listen 80;
+        server_name *.sub.example.com;
+        location / { return 200 longer; }
+    }
+    server {
+        listen 80;
+        server_name Exact.Example.com www.example.com;
+        location / { return 200 exact; }
+    }
+    server {
+        listen 8080;
+        server_name other.example.com;
+        location / { return 200 port; }
+    }
+}
+"""
+
+
+@pytest.mark.parametrize('host, port, expected', [
+    # Exact names first, case insensitive
+    ('www.example.com', None, 'exact'),
+    ('EXACT.example.com.', 80, 'exact'),
+    # Then the longest leading wildcard
+    ('a.example.com', 80, 'leading'),
+    ('a.sub.example.com', 80, 'longer'),
+    # Then the longest trailing wildcard
+    ('www.example.org', 80, 'trailing'),
+    # Then the first regex, which is not lowercased
+    ('www2.example.org', 80, 'default'),
+    ('www.example.org:8000', 80, 'trailing'),
+    # Then the default server of the port
+    ('unknown.org', 80, 'default'),
+    (None, 80, 'default'),
+    # Then the first server of the port
+    ('unknown.org', 8080, 'port'),
+])
+def test_server_name_order(load_config, host, port, expected):
+    router = Router(load_config(SERVER_NAMES))
+    server = router.select_server(host, port)
+    assert server.block[-1].block[0].args[-1] == expected
+
+
+def test_regex_server_name_is_not_lowercased(load_config):
+    router = Router(load_config("""
+http {
+    server {
+        listen 80 default_server;
+        location / { }
+    }
+    server {
+        listen 80;
+        server_name ~^www\\.(?<domain>\\S+)$;
+        location /w { }
+    }
+}
+"""))
+    route = router.route('/w', host='www.example.com')
+    assert get_location_uri(route) == '/w'
+    route = router.route('/w', host='WWW.EXAMPLE.COM')
+    assert get_location_uri(route) == '/w'
+
+
+def test_route_many(load_config):
+    router = Router(load_config(SERVER_NAMES))
+    routes = list(router.route_many(['/', 'a.example.com /x', 'http://www.example.org/y?z', ''], port=80))
+    assert [route.host for route in routes] == [None, 'a.example.com', 'www.example.org']
+    assert [route.server.block[-1].block[0].args[-1] for route in routes] == ['default', 'leading', 'trailing']
+
+
+REACHABLE = """
+http {
+    server_tokens on;
+    server {
+        listen 80;
+        add_header X-Server server;
+        location /a { add_header X-A a; } location /b { add_header X-B b; }
+    }
+}
+"""
+
+
+def test_reachable_findings(load_config):
+    config = load_config(REACHABLE)
+    builder = SignatureBuilder(config)
+    for directive in [*config.get_directives('add_header'), *config.get_directives('server_tokens')]:
+        builder.add_flagged(directive)
+    signature = builder.build()
+
+    router = Router(config)
+    routes = router.route_many(['/a', '/a/1', '/b', '/c'])
+    hits = {flagged["directive_and_args"][1]: count
+            for _, flagged, count in get_reachable_findings(config, [signature], routes)}
+    # Directives outside of server blocks are reached by every request
+    assert hits == {'on': 4, 'X-Server': 4, 'X-A': 2, 'X-B': 1}
+
+
+def test_enclosing_block_outside_of_servers(load_config):
+    config = load_config(REACHABLE)
+    server_tokens = config.get_directives('server_tokens')[0]
+    assert get_enclosing_block(server_tokens).directive == 'http'
+    add_header = config.get_directives('add_header')[1]
+    assert get_enclosing_block(add_header).args == ['/a']
@@ -0,0 +1,45 @@
+import os
+import signal
+
+import pytest
+
+from unginxed.server import ScanService
+
+
+CONFIG = 'http { server { location / { return 302 https://example.com$uri; } } }\n'
+
+
+@pytest.fixture
+def service():
+    service = ScanService(workers=1)
+    yield service
+    service.close()
+
+
+def kill_workers(service: ScanService) -> None:
+    for pid in list(service.executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    for process in list(service.executor._processes.values()):
+        process.join()
+
+
+def test_scan_body(service):
+    record = service.scan_body(CONFIG, 'example.conf')
+    assert record["config"] == 'example.conf'
+    assert record["findings"]
+    assert {finding["file"] for finding in record["findings"]} == {'example.conf'}
+
+
+def test_worker_died(service, tmp_path):
+    filepath = tmp_path / 'nginx.conf'
+    filepath.write_text(CONFIG)
+    service.warm_up()
+    broken = service.executor
+    kill_workers(service)
+
+    # The pool is replaced, and the request scanned on the new one
+    record = service.scan_paths([str(filepath)])[0]
+    assert service.executor is not broken
+    assert record["error"] is None and record["findings"]
+    assert service.scan_body(CONFIG)["findings"] == [
+        {**finding, "config": 'nginx.conf', "file": 'nginx.conf'} for finding in record["findings"]]
@@ -0,0 +1,65 @@
+from unginxed.engine import ScanEngine
+from unginxed.nginx_config import NginxConfig
+from unginxed.sharding import ShardedScanEngine, get_server_blocks, get_shards
+from unginxed.signature import get_signatures
+
+
+SERVER = """
+    server {{
+        listen {port};
+        server_name site{index}.example.com;
+        add_header X-Frame-Options DENY;
+        location / {{
+            add_header X-Content-Type-Options nosniff;
+            proxy_pass http://backend$uri;
+        }}
+        location /old/ {{
+            return 301 https://site{index}.example.com$document_uri;
+        }}
+        location /files/ {{
+            alias /srv/files{index}/;
+            more_set_headers "X-Multi: a
+                b";
+        }}
+        location /docs {{
+            rewrite ^ /new$uri;
+            add_header X-Multi "a
+                b";
+        }}
+    }}
+"""
+
+
+def generate_config(folder, num_servers: int) -> str:
+    servers = [SERVER.format(port=8000 + index, index=index) for index in range(num_servers)]
+    # Every other server in an included file, so that findings of several
+    # files are merged
+    (folder / 'sites').mkdir()
+    main = []
+    for index, server in enumerate(servers):
+        if index % 2:
+            (folder / 'sites' / f'{index:02}.conf').write_text(server)
+            main.append(f'    include sites/{index:02}.conf;\n')
+        else:
+            main.append(server)
+    filepath = folder / 'nginx.conf'
+    filepath.write_text('http {\n    server_tokens on;\n' + ''.join(main) + '}\n')
+    return str(filepath)
+
+
+def test_shards(tmp_path):
+    config = NginxConfig(generate_config(tmp_path, 10))
+    server_blocks = get_server_blocks(config)
+    assert len(server_blocks) == 10
+    shards = get_shards(server_blocks, 4)
+    assert [len(shard) for shard in shards] == [3, 3, 3, 1]
+    assert [server_block for shard in shards for server_block in shard] == server_blocks
+
+
+def test_same_as_serial(tmp_path):
+    config = NginxConfig(generate_config(tmp_path, 40))
+    serial = ScanEngine(get_signatures()).run(config)
+    sharded = ShardedScanEngine(get_signatures(), workers=2).run(config)
+    assert [result.to_dict() for result in sharded] == [result.to_dict() for result in serial]
+    crlf = next(result for result in serial if result.name == 'CRLF Injection')
+    assert len(crlf.flagged) == 120
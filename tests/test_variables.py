@@ -0,0 +1,43 @@
+from unginxed.sigs.crlf_injection import matcher as crlf_injection
+
+
+CONFIG = """
+http {
+    server {
+        return 301 https://example.com$document_uri;
+        location / {
+            proxy_pass http://backend$uri;
+            add_header X-Uri "$uri $document_uri";
+            rewrite ^ /a$document_uri;
+            return 302 $uri;
+        }
+    }
+}
+"""
+
+
+def test_get_directives_in_document_order(load_config):
+    variables = load_config(CONFIG).variables
+
+    def get_lines(*names, **kwargs) -> list[int]:
+        return [directive.line for directive in variables.get_directives(*names, **kwargs)]
+
+    assert get_lines('uri') == [6, 7, 9]
+    assert get_lines('document_uri') == [4, 7, 8]
+    assert get_lines('uri', 'document_uri') == [4, 6, 7, 8, 9]
+    assert get_lines('document_uri', 'uri', directive_names=['return', 'rewrite']) == [4, 8, 9]
+
+
+def test_get_references(load_config):
+    variables = load_config(CONFIG).variables
+    add_header = variables.get_directives('uri', directive_names=['add_header'])[0]
+    assert sorted((reference.arg_index, reference.variable)
+                  for reference in variables.get_directive_references(add_header)) == [(1, 'document_uri'), (1, 'uri')]
+    assert variables.get_variables(add_header) == {'uri', 'document_uri'}
+
+
+def test_crlf_injection_order(load_config):
+    result = crlf_injection(load_config(CONFIG))
+    # Grouped by directive name, in document order within each group
+    assert [(flagged["directive_and_args"][0], flagged["line"]) for flagged in result.flagged] == [
+        ('rewrite', 8), ('return', 4), ('return', 9), ('add_header', 7), ('proxy_pass', 6)]
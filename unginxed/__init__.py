@@ -1,9 +1,26 @@
+from typing import Optional
+
+from .batch import ScanResult, scan_many
+from .cache import ResultCache
+from .engine import ScanEngine, Visitor
 from .nginx_config import NginxConfig
 from .signature import get_signatures, Signature
 
 
-def scan(filepath) -> list[Signature]:
+def scan(filepath, cache: Optional[ResultCache] = None, workers: Optional[int] = None) -> list[Signature]:
+    if cache is not None:
+        results = cache.get(filepath)
+        if results is not None:
+            return results
+
     config = NginxConfig(filepath)
-    signatures = get_signatures()
-    results = [signature(config) for signature in signatures]
+    if workers is not None and workers > 1:
+        # Split a single large config by server block, see ShardedScanEngine
+        from .sharding import ShardedScanEngine
+        results = ShardedScanEngine(get_signatures(), workers=workers).run(config)
+    else:
+        results = ScanEngine(get_signatures()).run(config)
+
+    if cache is not None:
+        cache.put(config, results)
     return results
@@ -1,10 +1,17 @@
 import argparse as ap
+from dataclasses import replace
+from glob import has_magic
+from os import path
 from pathlib import Path
-from rich import print as rprint
-from sys import argv
+from sys import argv, stderr, stdout
+from time import perf_counter
 
+from .batch import ScanResult, expand_config_paths, read_file_list, scan_many
+from .cache import ResultCache
+from .engine import ScanEngine
+from .formats import WRITERS, get_writer
 from .nginx_config import NginxConfig
-from .report import generate_pdf_report, report_summary_cli, report_verbose_cli
+from .profiling import profile
 from .signature import get_signatures
 
 
@@ -21,13 +28,43 @@ A static vulnerability scanner for NGINX Configuration
 
 
 def main():
+    if argv[1:2] == ['serve']:
+        serve_main(argv[2:])
+        return
+
     argument_parser = ap.ArgumentParser(
         prog=UNGINXED_LOGO,
         description="A tool to detect misconfigurations in NGINX configuration files",
-        epilog="Example: poetry run python unginxed /etc/nginx/nginx.conf",
+        epilog="Example: poetry run python unginxed /etc/nginx/nginx.conf. "
+               "Run \"python -m unginxed serve -h\" for the long-running scan server",
+    )
+    argument_parser.add_argument(
+        "file", type=str, nargs="*",
+        help="Path to NGINX configuration file. Multiple files, directories "
+             "(searched for *.conf files) and glob patterns are scanned in batch mode"
+    )
+    argument_parser.add_argument(
+        "-l",
+        "--file-list",
+        type=str,
+        help="File containing one configuration path, directory or glob pattern per line. Implies batch mode",
+    )
+    argument_parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help="Number of worker processes used in batch mode or with --shard. Defaults to the number of CPUs",
+    )
+    argument_parser.add_argument(
+        "--shard",
+        action="store_true",
+        help="Scan a single large config in parallel, splitting it by top-level server block across -j workers",
     )
     argument_parser.add_argument(
-        "file", type=str, help="Path to NGINX configuration file"
+        "--low-memory",
+        action="store_true",
+        help="Memory-map config files and read directive arguments from the mapping instead of keeping them "
+             "in memory, for very large configs. Scans are slower. Not supported in watch mode",
     )
     argument_parser.add_argument(
         "-V",
@@ -39,7 +76,13 @@ def main():
         "-o",
         "--pdf-output",
         type=str,
-        help="Optional PDF report output directory",
+        help="Optional PDF report output directory. In batch mode, one report per file is rendered in parallel",
+    )
+    argument_parser.add_argument(
+        "--report-format",
+        choices=["pdf", "html"],
+        default="pdf",
+        help="Format of reports written to the -o/--pdf-output directory. HTML skips the PDF conversion. Defaults to pdf",
     )
     argument_parser.add_argument(
         "-v",
@@ -53,14 +96,211 @@ def main():
         action="store_true",
         help="Prints summary report",
     )
+    argument_parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Print the inherited directives in effect (add_header, root, proxy_set_header, ...) in every "
+             "server and location block, and where each is set, instead of scanning",
+    )
+    argument_parser.add_argument(
+        "--routes",
+        type=str,
+        metavar="FILE",
+        help="Route the requests in FILE (one URI, \"<host> <URI>\" or URL per line, - for stdin) through the "
+             "config, and print how many requests reach the block of each finding",
+    )
+    argument_parser.add_argument(
+        "-f",
+        "--format",
+        choices=list(WRITERS),
+        help="Stream findings to stdout in a machine-readable format as each file finishes, "
+             "instead of printing reports",
+    )
+    argument_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="With -f/--format and a single config, scan the config while it is parsed and write each finding "
+             "as soon as it is made. Signatures that need the whole config are run at the end",
+    )
+    argument_parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="Watch the given files or directories, re-scanning configs incrementally as their files change",
+    )
+    argument_parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds between checks for changes in watch mode. Defaults to 1",
+    )
+    argument_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the result cache, scanning every file and leaving the cache untouched",
+    )
+    argument_parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Delete all cached results before scanning",
+    )
+    argument_parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="table",
+        choices=["table", "json"],
+        help="Print the wall time and allocations of each scan phase and signature to stderr, as a table "
+             "(default) or JSON. Implies --no-cache and -j 1",
+    )
+    argument_parser.add_argument(
+        "--cprofile",
+        type=str,
+        metavar="FILE",
+        help="Dump cProfile statistics of the scan to FILE, e.g. for snakeviz. Implies --no-cache and -j 1",
+    )
 
     if len(argv) == 1:
         argument_parser.print_usage()
         exit(1)
 
     args = argument_parser.parse_args()
-    filepath = args.file
+
+    if not (args.profile or args.cprofile):
+        run(argument_parser, args)
+        return
+
+    if args.watch or args.shard:
+        argument_parser.error('--profile and --cprofile cannot be combined with -w or --shard')
+    # Cached results would skip the phases being measured, and the phases
+    # run by worker processes are not collected
+    args.no_cache = True
+    args.workers = 1
+
+    from .profiling import start_profiling, stop_profiling
+
+    start_profiling(track_allocations=bool(args.profile), cprofile_path=args.cprofile)
+    try:
+        run(argument_parser, args)
+    finally:
+        profiler = stop_profiling()
+        if args.profile == 'json':
+            print(profiler.to_json(), file=stderr)
+        elif args.profile:
+            print(profiler.format_table(), file=stderr)
+
+
+def serve_main(arguments: list[str]):
+    """
+    Runs the long-running scan server (see server.py) until interrupted.
+
+    Args:
+        arguments (list[str]): Command line arguments following "serve"
+    """
+    argument_parser = ap.ArgumentParser(
+        prog="unginxed serve",
+        description="Serve scans over localhost HTTP or a Unix socket, keeping signatures loaded and parse "
+                    "caches warm between requests. POST {\"paths\": [...]} or {\"config\": \"...\"} to /scan "
+                    "for JSON findings, GET /stats for latency and cache hit-rate counters",
+    )
+    address_group = argument_parser.add_mutually_exclusive_group()
+    address_group.add_argument(
+        "--port",
+        type=int,
+        help="Port to listen on, on 127.0.0.1. Defaults to 8765",
+    )
+    address_group.add_argument(
+        "--socket",
+        type=str,
+        metavar="PATH",
+        help="Unix socket to listen on instead of a port",
+    )
+    argument_parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help="Number of worker processes scanning concurrent requests. Defaults to the number of CPUs",
+    )
+    argument_parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        help="Load configs in low memory mode, see unginxed -h",
+    )
+    argument_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the result cache, scanning every config",
+    )
+    args = argument_parser.parse_args(arguments)
+
+    from .server import serve
+
+    serve(port=args.port, socket_path=args.socket, workers=args.workers,
+          cache=None if args.no_cache else ResultCache(), low_memory=args.low_memory)
+
+
+def run(argument_parser: ap.ArgumentParser, args: ap.Namespace):
+    """
+    Runs the scan, watch or batch mode selected by the command line arguments.
+
+    Args:
+        argument_parser (ap.ArgumentParser): Parser of the arguments, to report usage errors
+        args (ap.Namespace): Parsed command line arguments
+    """
+    targets = args.file + (read_file_list(args.file_list) if args.file_list else [])
     pdf_output_path = args.pdf_output
+    cache = None if args.no_cache else ResultCache()
+
+    if args.clear_cache:
+        (cache or ResultCache()).clear()
+        print('Result cache cleared.')
+        if not targets:
+            return
+
+    if not targets:
+        argument_parser.print_usage()
+        exit(1)
+
+    # The summary is written in the requested format instead of as a table
+    if args.format:
+        if args.verbose or pdf_output_path or args.watch or args.shard or args.explain or args.routes:
+            argument_parser.error('-f/--format cannot be combined with -v, -o, -w, --shard, --explain or --routes')
+        if args.stream:
+            filepaths = expand_config_paths(targets)
+            if len(filepaths) != 1:
+                argument_parser.error('--stream only supports a single file')
+            stream_findings(filepaths[0], args)
+            return
+        stream_scan(targets, args, cache)
+        return
+
+    if args.stream:
+        argument_parser.error('--stream requires -f/--format')
+
+    if args.watch:
+        if args.verbose or pdf_output_path or args.shard or args.explain or args.routes or args.low_memory:
+            argument_parser.error('-v/--verbose, -o/--pdf-output, --shard, --explain, --routes and --low-memory '
+                                  'are not supported in watch mode')
+        watch(targets, args)
+        return
+
+    # Scan many configs over a process pool when more than a single file is given
+    if args.file_list or len(targets) > 1 or any(path.isdir(target) or has_magic(target) for target in targets):
+        if args.verbose or args.shard or args.explain or args.routes:
+            argument_parser.error('-v/--verbose, --shard, --explain and --routes only support a single file')
+        batch_scan(targets, args, cache)
+        return
+
+    filepath = targets[0]
+
+    if args.explain:
+        explain_config(filepath, args.low_memory)
+        return
+
+    if args.routes:
+        route_requests(filepath, args.routes, args.low_memory)
+        return
+
+    from .report import ReportGenerator, report_summary_cli, report_verbose_cli
 
     # Use _print function for the rest of the program, in place of
     # python's built-in print() and rich's print().
@@ -73,26 +313,40 @@ def main():
     else:
         def _print(*args, **kwargs):
             if kwargs.get('rich'):
+                from rich import print as rprint
                 rprint(*args)
             else:
                 print(*args)
 
+    # Reports other than the summary need the parsed config, otherwise
+    # unchanged configs are served from the result cache without parsing
+    results = cache.get(filepath) if cache and not (args.verbose or pdf_output_path) else None
+
     # Attempt to parse the config file, exit the program if failed
-    try:
-        config = NginxConfig(filepath)
-    except (RuntimeError, IsADirectoryError):
-        print('Invalid NGINX config given!')
-        exit(1)
+    if results is None:
+        try:
+            config = NginxConfig(filepath, low_memory=args.low_memory)
+        except (RuntimeError, IsADirectoryError):
+            print('Invalid NGINX config given!')
+            exit(1)
 
     # Print ASCII art
     _print(UNGINXED_LOGO)
 
     # Run signatures on the configuration file
-    signatures = get_signatures()
-    results = [signature(config) for signature in signatures]
+    if results is None:
+        if args.shard:
+            from .sharding import ShardedScanEngine
+            engine = ShardedScanEngine(get_signatures(), workers=args.workers)
+        else:
+            engine = ScanEngine(get_signatures())
+        results = engine.run(config)
+        if cache:
+            cache.put(config, results)
 
     # If PDF output path is provided, generate the report and retrieve path
-    report_path = generate_pdf_report(config, results, output_folder=pdf_output_path) if pdf_output_path is not None else None
+    report_path = ReportGenerator(pdf_output_path, args.report_format).write_report(config, results) \
+        if pdf_output_path is not None else None
 
     if report_path is None and not args.summary and not args.verbose:
         _print('''
@@ -102,11 +356,12 @@ Specify either one of the following flags to get started:
 -v/--verbose: For print verbose analysis to stdout
               '''.strip())
 
-    if args.summary:
-        report_summary_cli(results)
+    with profile('report:cli'):
+        if args.summary:
+            report_summary_cli(results, filepath)
 
-    if args.verbose:
-        report_verbose_cli(config, results)
+        if args.verbose:
+            report_verbose_cli(config, results)
 
     if args.summary or args.verbose:
         total_flagged = sum(len(result.flagged) for result in results)
@@ -119,5 +374,202 @@ Specify either one of the following flags to get started:
     if report_path:
         report_path = Path(report_path)
 
+
+def explain_config(filepath: str, low_memory: bool = False):
+    """
+    Prints the effective inherited directives of every server and location
+    block of a config.
+
+    Args:
+        filepath (str): Path to the config file
+        low_memory (bool, optional): Load the config in low memory mode
+    """
+    from .directive import DirectiveUtil
+    from .inheritance import explain
+
+    try:
+        config = NginxConfig(filepath, low_memory=low_memory)
+    except (RuntimeError, IsADirectoryError):
+        print('Invalid NGINX config given!')
+        exit(1)
+
+    blocks = []
+
+    def collect_block(directive):
+        if directive.directive in ('server', 'location') and directive.block:
+            blocks.append(directive)
+
+    DirectiveUtil.traverse(config.directives, collect_block)
+    for line in explain(config.inheritance, blocks, filepath):
+        print(line)
+
+
+def route_requests(filepath: str, requests_path: str, low_memory: bool = False):
+    """
+    Routes every request listed in a file through a config, and prints the
+    number of requests reaching the server or location block of each finding.
+
+    Args:
+        filepath (str): Path to the config file
+        requests_path (str): File listing one request per line, - for stdin
+        low_memory (bool, optional): Load the config in low memory mode
+    """
+    from sys import stdin
+
+    from .routing import Router, get_reachable_findings
+    from .signature import SignatureUtil
+
+    try:
+        config = NginxConfig(filepath, low_memory=low_memory)
+    except (RuntimeError, IsADirectoryError):
+        print('Invalid NGINX config given!')
+        exit(1)
+
+    results = ScanEngine(get_signatures()).run(config)
+    router = Router(config)
+
+    start = perf_counter()
+    requests = stdin if requests_path == '-' else open(requests_path, errors='replace')
+    try:
+        routes = list(router.route_many(requests))
+    finally:
+        if requests is not stdin:
+            requests.close()
+    duration = perf_counter() - start
+
+    reachable = get_reachable_findings(config, results, routes)
+    for signature, flagged, num_requests in reachable:
+        print(f'{num_requests:>10}  {SignatureUtil.get_qualified_line(flagged, filepath):<24} '
+              f'{signature.name}: {" ".join(flagged["directive_and_args"])}')
+
+    num_reachable = sum(1 for _, _, num_requests in reachable if num_requests)
+    print(f'\n{num_reachable} of {len(reachable)} findings reachable by {len(routes)} requests '
+          f'(routed in {duration:.2f}s)')
+
+
+def batch_scan(targets: list[str], args: ap.Namespace, cache: ResultCache = None):
+    """
+    Scans every config matched by targets, printing each file's result
+    as soon as it finishes, followed by the aggregate throughput.
+
+    Args:
+        targets (list[str]): File paths, directories or glob patterns
+        args (ap.Namespace): Parsed command line arguments
+        cache (ResultCache, optional): Result cache to read from and write to
+    """
+    from .report import ReportGenerator, report_summary_cli
+
+    filepaths = expand_config_paths(targets)
+    report_generator = ReportGenerator(args.pdf_output, args.report_format) if args.pdf_output else None
+    total_flagged = 0
+    num_failed = 0
+    num_cached = 0
+
+    start = perf_counter()
+    for result in scan_many(filepaths, workers=args.workers, cache=cache, report_generator=report_generator,
+                            low_memory=args.low_memory):
+        if result.error:
+            num_failed += 1
+            print(f"{result.filepath}: {result.error}")
+            continue
+
+        flagged = result.get_total_flagged()
+        total_flagged += flagged
+        num_cached += result.cached
+        cached = ", cached" if result.cached else ""
+        report = f", report: {result.report_path}" if result.report_path else ""
+        print(f"{result.filepath}: {flagged} directive flagged ({result.duration * 1000:.1f} ms{cached}){report}")
+
+        if args.summary:
+            report_summary_cli(result.signatures, result.filepath)
+    elapsed = perf_counter() - start
+
+    files_per_second = len(filepaths) / elapsed if elapsed > 0 else 0.0
+    print(f"\nScanned {len(filepaths)} files ({num_failed} invalid, {num_cached} cached) in {elapsed:.2f}s "
+          f"({files_per_second:.1f} files/sec), {total_flagged} directive flagged")
+
+
+def stream_scan(targets: list[str], args: ap.Namespace, cache: ResultCache = None):
+    """
+    Scans every config matched by targets, writing findings to stdout in
+    the requested machine-readable format as soon as each file finishes.
+    Does not load the rich/PDF reporting stack.
+
+    Args:
+        targets (list[str]): File paths, directories or glob patterns
+        args (ap.Namespace): Parsed command line arguments
+        cache (ResultCache, optional): Result cache to read from and write to
+    """
+    filepaths = expand_config_paths(targets)
+    # A lone file is not worth starting a process pool for
+    workers = 1 if len(filepaths) == 1 else args.workers
+
+    writer = get_writer(args.format, stdout)
+    try:
+        for result in scan_many(filepaths, workers=workers, cache=cache, low_memory=args.low_memory):
+            writer.write(result)
+    finally:
+        writer.close()
+
+
+def stream_findings(filepath: str, args: ap.Namespace):
+    """
+    Scans a single config while it is parsed (see streaming.py), writing
+    each finding to stdout in the requested machine-readable format as
+    soon as it is made. Results are not cached.
+
+    Args:
+        filepath (str): Path to the config file
+        args (ap.Namespace): Parsed command line arguments
+    """
+    from .streaming import StreamingScan
+
+    writer = get_writer(args.format, stdout)
+    try:
+        try:
+            for finding in StreamingScan(filepath, get_signatures()):
+                # Written as a result holding the single finding
+                signature = replace(finding.signature, flagged=[finding.flagged])
+                writer.write(ScanResult(filepath=filepath, signatures=[signature]))
+        except BrokenPipeError:
+            # Raised by the writer rather than the scan
+            raise
+        except (OSError, RuntimeError, ValueError) as e:
+            writer.write(ScanResult(filepath=filepath, error=str(e) or 'Invalid NGINX config!'))
+    finally:
+        writer.close()
+
+
+def watch(targets: list[str], args: ap.Namespace):
+    """
+    Watches the configs matched by targets until interrupted, printing
+    each config's result whenever it is re-scanned.
+
+    Args:
+        targets (list[str]): File paths, directories or glob patterns
+        args (ap.Namespace): Parsed command line arguments
+    """
+    from .report import report_summary_cli
+    from .watch import ConfigWatcher, WatchSession
+
+    def on_update(session: WatchSession, num_rerun: int, elapsed: float):
+        results = session.get_results()
+        total_flagged = sum(len(result.flagged) for result in results)
+        print(f"{session.filepath}: {total_flagged} directive flagged "
+              f"(ran {num_rerun}/{len(session.signatures)} signatures in {elapsed * 1000:.1f} ms)")
+        if args.summary:
+            report_summary_cli(results, session.filepath)
+
+    def on_error(filepath: str, e: Exception):
+        print(f"{filepath}: {e or 'Invalid NGINX config!'}")
+
+    watcher = ConfigWatcher(targets, on_update, on_error, interval=args.interval)
+    print(f"Watching {', '.join(targets)} for changes. Press Ctrl+C to stop.")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
 if __name__ == "__main__":
     main()
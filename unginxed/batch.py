@@ -0,0 +1,205 @@
+import sqlite3
+from dataclasses import dataclass, field
+from glob import glob, has_magic
+from os import path, walk
+from time import perf_counter
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+from .cache import ResultCache
+from .engine import ScanEngine
+from .nginx_config import NginxConfig
+from .signature import Signature, get_signatures
+
+if TYPE_CHECKING:
+    # Not imported at runtime, as the reporting stack is slow to import
+    from .report import ReportGenerator
+
+
+CONFIG_EXTENSION = '.conf'
+
+
+@dataclass
+class ScanResult:
+    """
+    Data class that represents the outcome of scanning one config file
+    """
+    filepath: str = None
+    signatures: list[Signature] = field(default_factory=list)
+    error: Optional[str] = None
+    duration: float = 0.0
+    cached: bool = False
+    report_path: Optional[str] = None
+
+    def get_total_flagged(self) -> int:
+        """
+        Returns:
+            int: Number of directives flagged across all signatures
+        """
+        return sum(len(signature.flagged) for signature in self.signatures)
+
+
+def expand_config_paths(targets: Iterable[str]) -> list[str]:
+    """
+    Expand scan targets into a list of config file paths.
+    Directories are searched recursively for *.conf files, and glob
+    patterns are expanded. Duplicates are removed, keeping the first
+    occurrence.
+
+    Args:
+        targets (Iterable[str]): File paths, directories or glob patterns
+
+    Returns:
+        list[str]: Config file paths
+    """
+    filepaths: dict[str, None] = {}
+
+    for target in targets:
+        if path.isdir(target):
+            for directory, _, filenames in sorted(walk(target)):
+                for filename in sorted(filenames):
+                    if filename.endswith(CONFIG_EXTENSION):
+                        filepaths[path.join(directory, filename)] = None
+        elif has_magic(target):
+            for filepath in sorted(glob(target, recursive=True)):
+                if path.isfile(filepath):
+                    filepaths[filepath] = None
+        else:
+            filepaths[target] = None
+
+    return list(filepaths)
+
+
+def read_file_list(file_list: str) -> list[str]:
+    """
+    Args:
+        file_list (str): Path to a file containing one scan target per line
+
+    Returns:
+        list[str]: Non-empty lines of the file
+    """
+    with open(file_list) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+# Signatures, the result cache connection and the report template are
+# set up once per worker process rather than once per file
+_engine: ScanEngine = None
+_cache: Optional[ResultCache] = None
+_report_generator: Optional['ReportGenerator'] = None
+_low_memory: bool = False
+
+
+def initialize_worker(cache: Optional[ResultCache] = None,
+                      report_generator: Optional['ReportGenerator'] = None,
+                      low_memory: bool = False) -> None:
+    """
+    Set up the current process to scan files with scan_file, e.g. as the
+    initializer of a process pool.
+
+    Args:
+        cache (ResultCache, optional): Result cache to read from and write to
+        report_generator (ReportGenerator, optional): Generator rendering a
+                                                      report of each file
+        low_memory (bool, optional): Load configs in low memory mode (see NginxConfig)
+    """
+    global _engine, _cache, _report_generator, _low_memory
+    _engine = ScanEngine(get_signatures())
+    _cache = cache
+    _report_generator = report_generator
+    _low_memory = low_memory
+
+
+def scan_file(filepath: str) -> ScanResult:
+    """
+    Parse a config file and run all signatures on it, unless its results
+    are in the result cache given to the worker. If the worker was given
+    a report generator, a report is written as well (which needs the
+    config to be parsed, so the cache is not read).
+    Parse failures, and failures of the signatures or of the result cache,
+    are reported in the result instead of being raised.
+
+    Args:
+        filepath (str): Path to the config file
+
+    Returns:
+        ScanResult
+    """
+    if _engine is None:
+        initialize_worker()
+
+    start = perf_counter()
+
+    if _cache is not None and _report_generator is None:
+        signatures = _cache.get(filepath)
+        if signatures is not None:
+            return ScanResult(filepath=filepath, signatures=signatures,
+                              duration=perf_counter() - start, cached=True)
+
+    try:
+        config = NginxConfig(filepath, low_memory=_low_memory)
+    except (OSError, RuntimeError, ValueError) as e:
+        return ScanResult(filepath=filepath, error=str(e) or 'Invalid NGINX config!',
+                          duration=perf_counter() - start)
+
+    # A signature failing on one config should not abort the other files
+    try:
+        signatures = _engine.run(config)
+    except Exception as e:
+        return ScanResult(filepath=filepath, error=f'Scan failed: {type(e).__name__}: {e}',
+                          duration=perf_counter() - start)
+
+    error = None
+    if _cache is not None:
+        try:
+            _cache.put(config, signatures)
+        except (OSError, sqlite3.Error) as e:
+            error = f'Could not write to the result cache: {e}'
+
+    report_path = None
+    if _report_generator is not None:
+        try:
+            report_path = _report_generator.write_report(config, signatures)
+        except OSError as e:
+            error = f'Could not write report: {e}'
+
+    return ScanResult(filepath=filepath, signatures=signatures, error=error,
+                      duration=perf_counter() - start, report_path=report_path)
+
+
+def scan_many(filepaths: Iterable[str], workers: Optional[int] = None,
+              cache: Optional[ResultCache] = None,
+              report_generator: Optional['ReportGenerator'] = None,
+              low_memory: bool = False) -> Iterator[ScanResult]:
+    """
+    Scan many config files, fanning the work out over a process pool.
+    Results are yielded as soon as each file finishes, so they are not
+    in the same order as filepaths.
+
+    Args:
+        filepaths (Iterable[str]): Config file paths
+        workers (int, optional): Number of worker processes. Defaults to the
+                                 number of CPUs. With 1 worker, files are
+                                 scanned in the current process.
+        cache (ResultCache, optional): Result cache to read from and write to
+        report_generator (ReportGenerator, optional): If given, a report of
+                                                      each file is rendered by
+                                                      the worker scanning it
+        low_memory (bool, optional): Load configs in low memory mode (see NginxConfig)
+
+    Yields:
+        ScanResult: Result of each file
+    """
+    if workers == 1:
+        initialize_worker(cache, report_generator, low_memory)
+        for filepath in filepaths:
+            yield scan_file(filepath)
+        return
+
+    # Imported here, as process pools are slow to import and not needed for a single worker
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker,
+                             initargs=(cache, report_generator, low_memory)) as executor:
+        futures = [executor.submit(scan_file, filepath) for filepath in filepaths]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,234 @@
+import json
+import sqlite3
+from hashlib import sha256
+from os import environ, path, walk
+from pathlib import Path
+from time import time
+from typing import Optional, Union
+
+from .loader import ConfigLoader
+from .mapped import MappedSource
+from .nginx_config import NginxConfig
+from .signature import Signature
+
+
+# Bump whenever the format of cached results changes
+# 2: Flagged entries have line_end
+CACHE_VERSION = 2
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def get_cache_folder() -> str:
+    """
+    Returns:
+        str: Folder for unginxed's cache files, under $XDG_CACHE_HOME
+             (defaults to ~/.cache)
+    """
+    cache_home = environ.get('XDG_CACHE_HOME') or path.join(Path.home(), '.cache')
+    return path.join(cache_home, 'unginxed')
+
+
+def get_default_cache_path() -> str:
+    """
+    Returns:
+        str: Path of the result cache database, in the cache folder
+    """
+    return path.join(get_cache_folder(), 'results.sqlite3')
+
+
+def get_package_fingerprint(package_folder: Optional[str] = None) -> str:
+    """
+    Get a fingerprint of the code producing signature results: the
+    signatures, and the parser, loader, engine and helpers they run on.
+    It changes whenever a module of the package is added, removed or
+    modified, e.g. when the package is upgraded.
+
+    Args:
+        package_folder (str, optional): Defaults to the unginxed package
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    if package_folder is None:
+        package_folder = str(Path(__file__).parent)
+
+    digest = sha256(f'{CACHE_VERSION}'.encode())
+    for folder, folder_names, filenames in walk(package_folder):
+        folder_names[:] = sorted(folder_name for folder_name in folder_names if folder_name != '__pycache__')
+        for filename in sorted(filenames):
+            if not filename.endswith('.py'):
+                continue
+            filepath = path.join(folder, filename)
+            digest.update(path.relpath(filepath, package_folder).encode() + b'\0')
+            with open(filepath, 'rb') as f:
+                digest.update(sha256(f.read()).digest())
+
+    return digest.hexdigest()
+
+
+def _read_file(filepath: str) -> Optional[str]:
+    # Read the same way the loader does, so that hashes are comparable
+    try:
+        with open(filepath) as f:
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+
+def _hash_file(filepath: str) -> Optional[str]:
+    raw = _read_file(filepath)
+    return _hash_source(raw) if raw is not None else None
+
+
+def _hash_source(raw: Union[str, MappedSource]) -> str:
+    # Mapped files hash the same as their text, unless they contain
+    # carriage returns (which only costs a cache miss)
+    return raw.digest() if isinstance(raw, MappedSource) else sha256(raw.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent cache of signature results, stored in a SQLite database.
+
+    Entries are keyed by the config file path, the SHA-256 of its contents
+    and the fingerprint of the package (see get_package_fingerprint). Each
+    entry also records the hash of every included file and the files
+    matched by every include pattern, so that a change anywhere in the
+    include graph invalidates it. The least recently used entries are
+    evicted once the total size of cached results exceeds max_bytes.
+    """
+    def __init__(self, cache_path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 fingerprint: Optional[str] = None):
+        """
+        Args:
+            cache_path (str, optional): Path to the database file. Defaults to
+                                        get_default_cache_path()
+            max_bytes (int, optional): Maximum total size of cached results
+            fingerprint (str, optional): Fingerprint of the code producing the
+                                         results. Defaults to the fingerprint
+                                         of the package
+        """
+        self.cache_path: str = cache_path or get_default_cache_path()
+        self.max_bytes: int = max_bytes
+        self.fingerprint: str = fingerprint or get_package_fingerprint()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __getstate__(self) -> dict:
+        # Connections cannot be shared across processes, each process opens its own
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.cache_path, timeout=30, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, '
+                'dependencies TEXT NOT NULL, '
+                'signatures TEXT NOT NULL, '
+                'size INTEGER NOT NULL, '
+                'last_access REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+        return self._connection
+
+    def get_key(self, filepath: str, raw: Union[str, MappedSource]) -> str:
+        """
+        Args:
+            filepath (str): Path to the config file
+            raw (str | MappedSource): Contents of the config file
+
+        Returns:
+            str: Cache key of the config
+        """
+        digest = sha256(self.fingerprint.encode())
+        digest.update(filepath.encode() + b'\0')
+        digest.update(raw.buffer if isinstance(raw, MappedSource) else raw.encode())
+        return digest.hexdigest()
+
+    def get(self, filepath: str) -> Optional[list[Signature]]:
+        """
+        Get the cached results of a config file, without parsing it.
+
+        Args:
+            filepath (str): Path to the config file
+
+        Returns:
+            list[Signature]: Cached results, or None if the config, any of
+                             its included files or the package changed
+        """
+        raw = _read_file(filepath)
+        if raw is None:
+            return None
+        key = self.get_key(filepath, raw)
+
+        row = self.connection.execute('SELECT dependencies, signatures FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        dependencies = json.loads(row[0])
+        if any(_hash_file(dependency) != digest for dependency, digest in dependencies['files'].items()) \
+                or any(ConfigLoader.expand_include(pattern) != matched
+                       for pattern, matched in dependencies['includes'].items()):
+            self.connection.execute('DELETE FROM results WHERE key = ?', (key,))
+            return None
+
+        self.connection.execute('UPDATE results SET last_access = ? WHERE key = ?', (time(), key))
+        return [Signature.from_dict(signature_dict) for signature_dict in json.loads(row[1])]
+
+    def put(self, config: NginxConfig, signature_results: list[Signature]) -> None:
+        """
+        Cache the results of a scanned config, evicting the least recently
+        used entries if the cache grows past its size limit.
+
+        Args:
+            config (NginxConfig): Scanned config
+            signature_results (list[Signature]): Signature results
+        """
+        key = self.get_key(config.filepath, config.raw)
+        dependencies = json.dumps({
+            'files': {
+                filepath: _hash_source(raw)
+                for filepath, raw in config.sources.items() if filepath != config.filepath
+            },
+            'includes': config.includes,
+        })
+        signatures = json.dumps([signature.to_dict() for signature in signature_results])
+        size = len(dependencies) + len(signatures)
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO results (key, dependencies, signatures, size, last_access) VALUES (?, ?, ?, ?, ?)',
+            (key, dependencies, signatures, size, time())
+        )
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used entries until the total size of
+        cached results is within max_bytes.
+        """
+        total_size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        rows = self.connection.execute('SELECT key, size FROM results ORDER BY last_access').fetchall()
+        evicted_keys = []
+        for key, size in rows:
+            if total_size <= self.max_bytes:
+                break
+            evicted_keys.append((key,))
+            total_size -= size
+
+        self.connection.executemany('DELETE FROM results WHERE key = ?', evicted_keys)
+
+    def clear(self) -> None:
+        """
+        Delete every cached result.
+        """
+        self.connection.execute('DELETE FROM results')
+        self.connection.execute('VACUUM')
@@ -2,16 +2,17 @@ from dataclasses import dataclass, field
 import sys
 # add support for python<3.11
 if sys.version_info >= (3, 11):
-    from typing import Callable, Self, TypedDict
+    from typing import Callable, Iterable, Optional, Self, TypedDict
 else:
-    from typing import Callable, TypedDict
+    from typing import Callable, Iterable, Optional, TypedDict
     from typing_extensions import Self
 
 
 class DirectiveDict(TypedDict):
     """
     TypedDict for type hinting a dictionary that represents
-    a directive, retrieved from crossplane library
+    a directive, as parsed by the native parser or by crossplane.
+    Directives parsed natively also have "spans", see parser.Parser
     """
     directive: str
     line: int
@@ -19,16 +20,27 @@ class DirectiveDict(TypedDict):
     block: list[dict]
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Directive:
     """
-    Data class that represents a directive
+    Data class that represents a directive.
+
+    Slotted, as large configs hold millions of these. Directives compare
+    by identity, since comparing fields would walk the parent and block
+    references across the whole tree.
     """
     directive: str = None
     line: int = None
     parent: Self = None
     args: list[str] = field(default_factory=list)
     block: list[Self] = field(default_factory=list)
+    depth: int = 0
+    file: str = None
+    included_by: Self = None
+    # Offsets into the contents of file, recorded by the parser: start and
+    # end of the name and of each argument, then the offset of the ";", "{"
+    # or "}" ending the directive. None if the file was parsed by crossplane
+    spans: tuple[int, ...] = None
 
     def get_full_directive(self) -> str:
         """
@@ -48,6 +60,153 @@ class Directive:
         """
         return ' '.join(self.args)
 
+    def get_context(self) -> str:
+        """
+        Get the name of the block this directive is defined in.
+
+        Returns:
+            str -> Name of the parent directive, or "main" for top-level directives
+        """
+        return self.parent.directive if self.parent else 'main'
+
+
+class DirectiveIndex:
+    """
+    Lookup tables over a tree of directives, filled in while the tree
+    is being built so that no further traversal is needed to query it.
+    """
+    # Recorded in place of a name when the full set of names is queried
+    ALL_NAMES = '*'
+
+    def __init__(self):
+        self.by_name: dict[str, list[Directive]] = {}
+        self.contexts: dict[str, frozenset[str]] = {}
+        # Distinct sets of contexts, shared by every name found in the same
+        # contexts (e.g. the entries of a huge map block)
+        self.context_sets: dict[frozenset[str], frozenset[str]] = {}
+        self.recorded: Optional[set[str]] = None
+
+    def add(self, directive: Directive) -> None:
+        """
+        Register a directive. Directives must be added in document order
+        (pre-order), so that lookups return them in the same order as
+        DirectiveUtil.traverse would visit them.
+
+        Args:
+            directive (Directive): Directive to register
+        """
+        self.by_name.setdefault(directive.directive, []).append(directive)
+        context = directive.get_context()
+        contexts = self.contexts.get(directive.directive, frozenset())
+        if context not in contexts:
+            contexts = contexts | {context}
+            self.contexts[directive.directive] = self.context_sets.setdefault(contexts, contexts)
+
+    def get(self, directive_name: str) -> list[Directive]:
+        """
+        Args:
+            directive_name (str): Directive name to search for
+
+        Returns:
+            list[Directive]: All directives with the given name, in document order
+        """
+        if self.recorded is not None:
+            self.recorded.add(directive_name)
+        return list(self.by_name.get(directive_name, ()))
+
+    def names(self) -> set[str]:
+        """
+        Returns:
+            set[str]: Unique set of directive names in the tree
+        """
+        if self.recorded is not None:
+            self.recorded.add(self.ALL_NAMES)
+        return set(self.by_name)
+
+    def mark_looked_up(self, directive_names: Iterable[str]) -> None:
+        """
+        Record directive names as looked up, for lookups that bypass
+        the index (e.g. a walk over the whole tree).
+
+        Args:
+            directive_names (Iterable[str]): Names to record
+        """
+        if self.recorded is not None:
+            self.recorded.update(directive_names)
+
+    def record(self) -> set[str]:
+        """
+        Start recording the directive names looked up through this index,
+        e.g. to find out which directives a signature depends on.
+
+        Returns:
+            set[str]: Set that looked up names are added to, until
+                      recording is started again or stopped
+        """
+        self.recorded = set()
+        return self.recorded
+
+    def stop_recording(self) -> None:
+        self.recorded = None
+
+    def reindex(self, directives: list[Directive], directive_names: set[str]) -> None:
+        """
+        Rebuild the entries of the given directive names from the tree,
+        after directives with those names were added to or removed from it.
+        Entries of other names are left untouched.
+
+        Args:
+            directives (list[Directive]): Top-level directives of the tree
+            directive_names (set[str]): Names of the entries to rebuild
+        """
+        if not directive_names:
+            return
+
+        for directive_name in directive_names:
+            self.by_name.pop(directive_name, None)
+            self.contexts.pop(directive_name, None)
+
+        # Pre-order, so that entries stay in document order
+        stack = list(reversed(directives))
+        while stack:
+            directive = stack.pop()
+            if directive.directive in directive_names:
+                self.add(directive)
+            stack.extend(reversed(directive.block))
+
+
+class DirectiveList(list):
+    """
+    List of top-level directives which carries the index of the whole tree.
+    DirectiveUtil lookups on a DirectiveList are answered from the index.
+
+    A DirectiveList may also cover only part of a tree, e.g. a single server
+    block, or a tree with some of its blocks excluded (see subtree).
+    """
+    def __init__(self, *args, index: DirectiveIndex = None, excluded: frozenset[Directive] = frozenset()):
+        super().__init__(*args)
+        self.index: DirectiveIndex = index if index is not None else DirectiveIndex()
+        # Directives which, along with their blocks, are not part of this tree
+        self.excluded: frozenset[Directive] = excluded
+
+    @classmethod
+    def subtree(cls, directives: list[Directive], excluded: Iterable[Directive] = ()) -> Self:
+        """
+        Create an indexed view over part of an existing tree. The directives
+        are not copied, so their parent references still lead out of the view.
+
+        Args:
+            directives (list[Directive]): Root directives of the view
+            excluded (Iterable[Directive], optional): Directives to leave out,
+                                                      along with their blocks
+
+        Returns:
+            DirectiveList
+        """
+        directive_list = cls(directives, excluded=frozenset(excluded))
+        DirectiveUtil.traverse(directive_list, directive_list.index.add)
+        return directive_list
+
 
 class DirectiveUtil:
     """
@@ -59,14 +218,22 @@ class DirectiveUtil:
         """
         Given a list of directives, recursively traverse through the
         tree of directives and performs a callback on each directive.
+        Directives excluded from a DirectiveList are skipped.
 
         Args:
             directives (list[Directive]): list of Directive objects
             callback (Callable[[Directive], None]): Operation to perform
         """
-        for directive in directives:
+        excluded = getattr(directives, 'excluded', None)
+
+        # Pre-order with an explicit stack, so that deep nesting does not recurse
+        stack = list(reversed(directives))
+        while stack:
+            directive = stack.pop()
+            if excluded and directive in excluded:
+                continue
             callback(directive)
-            DirectiveUtil.traverse(directive.block, callback)
+            stack.extend(reversed(directive.block))
 
     @staticmethod
     def get_directives_set(directives: list[Directive]) -> set[str]:
@@ -79,6 +246,9 @@ class DirectiveUtil:
         Returns:
             set[str]
         """
+        if isinstance(directives, DirectiveList):
+            return directives.index.names()
+
         directive_set = set()
         DirectiveUtil.traverse(directives, lambda directive: directive_set.add(directive.directive))
         return directive_set
@@ -97,6 +267,9 @@ class DirectiveUtil:
         Returns:
             List of directives
         """
+        if isinstance(directives, DirectiveList):
+            return directives.index.get(directive_name)
+
         retrieved_directives: list[Directive] = []
 
         def traversal_callback(directive: Directive):
@@ -109,27 +282,34 @@ class DirectiveUtil:
 
     @staticmethod
     def recursive_initialize_directives(directive: Directive,
-                                        directive_dict: DirectiveDict) -> None:
+                                        directive_dict: DirectiveDict,
+                                        index: DirectiveIndex = None) -> None:
         """
         Use this method on a top-level Directive object. Each directive object
         will have its properties filled in using the provided corresponding
-        dictionary of values.
+        dictionary of values. Despite the name, nested blocks are initialized
+        iteratively.
 
         Args:
             directive (Directive): Top-level Directive object to initialize with values
             directive_dict (DirectiveDict): Dictionary to copy values from
+            index (DirectiveIndex, optional): Index to register every initialized
+                                              directive in
         """
-        directive.directive = directive_dict["directive"]
-        directive.line = directive_dict["line"]
-        directive.args = directive_dict["args"]
-        directive.block = []
-
-        if directive_dict.get("block") is not None:
-            for sub_directive_dict in directive_dict.get("block"):
-                sub_directive = Directive()
-                sub_directive.parent = directive
-                DirectiveUtil.recursive_initialize_directives(
-                    sub_directive,
-                    sub_directive_dict
-                )
-                directive.block.append(sub_directive)
+        stack = [(directive, directive_dict)]
+        while stack:
+            directive, directive_dict = stack.pop()
+            sub_directive_dicts = directive_dict.get("block") or []
+            directive.directive = sys.intern(directive_dict["directive"])
+            directive.line = directive_dict["line"]
+            directive.args = directive_dict["args"]
+            directive.spans = directive_dict.get("spans")
+            directive.block = [Directive(parent=directive) for _ in sub_directive_dicts]
+            directive.depth = directive.parent.depth + 1 if directive.parent else 0
+
+            if index is not None:
+                index.add(directive)
+
+            # Pushed in reverse, so that children are initialized (and indexed)
+            # in document order
+            stack.extend(reversed(list(zip(directive.block, sub_directive_dicts))))
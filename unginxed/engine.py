@@ -0,0 +1,271 @@
+from typing import Callable, Iterable, Optional
+
+from .directive import Directive, DirectiveUtil
+from .nginx_config import NginxConfig
+from .profiling import get_profiler, profile
+from .signature import Flagged, Signature, SignatureBuilder, inspects, is_applicable
+
+
+class Visitor:
+    """
+    Base class for signatures that inspect directives through callbacks
+    instead of looking them up themselves.
+
+    Subclasses define methods named on_<directive name>, which are called
+    with every directive of that name and its ancestors (outermost first),
+    in document order. on_directive, if defined, is called with every
+    directive. The ancestors list is reused during the walk, copy it if it
+    has to be kept.
+
+    Example:
+        class AliasTraversal(Visitor):
+            def __init__(self, config: NginxConfig):
+                super().__init__(config)
+                self.signature_builder.set_name('Alias traversal')
+
+            def on_alias(self, directive: Directive, ancestors: list[Directive]):
+                ...
+
+        matcher = AliasTraversal.as_matcher()
+    """
+    # Declaration passed on to @inspects. Directives default to the names
+    # of the callbacks, or to no declaration if on_directive is defined
+    directives: Optional[Iterable[str]] = None
+    triggers: Optional[Iterable[str]] = None
+    contexts: Optional[Iterable[str]] = None
+    local: bool = False
+    # Whether every finding depends only on the flagged directive and its
+    # ancestors, so that the visitor can be handed directives while the
+    # config is still being parsed (see streaming.py). The blocks of the
+    # ancestors are incomplete then, and config.variables only covers the
+    # directive being visited
+    streaming: bool = False
+
+    # Directive name -> callback method name, filled in for every subclass
+    callbacks: dict[str, str] = {}
+
+    CALLBACK_PREFIX = 'on_'
+    ALL_DIRECTIVES_CALLBACK = 'on_directive'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.callbacks = {
+            attribute[len(cls.CALLBACK_PREFIX):]: attribute
+            for attribute in dir(cls)
+            if attribute.startswith(cls.CALLBACK_PREFIX)
+            and attribute != cls.ALL_DIRECTIVES_CALLBACK
+            and callable(getattr(cls, attribute))
+        }
+
+    def __init__(self, config: NginxConfig):
+        """
+        Args:
+            config (NginxConfig): Config being scanned
+        """
+        self.config: NginxConfig = config
+        self.signature_builder: SignatureBuilder = SignatureBuilder(config)
+
+    def flag(self, directive: Directive) -> None:
+        """
+        Args:
+            directive (Directive): Directive to flag
+        """
+        self.signature_builder.add_flagged(directive, self.config)
+
+    def finish(self) -> Signature:
+        """
+        Called once every directive has been visited.
+
+        Returns:
+            Signature
+        """
+        signature = self.signature_builder.build()
+        self.sort_findings(signature.flagged)
+        return signature
+
+    @classmethod
+    def sort_findings(cls, flagged: list[Flagged]) -> None:
+        """
+        Put findings, flagged in document order, in the order the signature
+        reports them in. Also applied to the findings of a config scanned
+        in shards once they are merged (see sharding.py). Kept in document
+        order by default.
+
+        Args:
+            flagged (list[Flagged]): Findings of the visitor, sorted in place
+        """
+
+    @classmethod
+    def get_directives(cls) -> Optional[list[str]]:
+        """
+        Returns:
+            list[str]: Declared directives, None if the visitor looks at every directive
+        """
+        if cls.directives is not None:
+            return list(cls.directives)
+        if hasattr(cls, cls.ALL_DIRECTIVES_CALLBACK):
+            return None
+        return list(cls.callbacks)
+
+    @classmethod
+    def as_matcher(cls) -> Callable[[NginxConfig], Signature]:
+        """
+        Wrap the visitor into a matcher function, as expected in signature
+        files. The ScanEngine runs the visitor within its shared walk, while
+        calling the matcher directly walks the tree for this visitor alone.
+
+        Returns:
+            Callable[[NginxConfig], Signature]: Matcher function
+        """
+        directives = cls.get_directives()
+
+        def matcher(config: NginxConfig) -> Signature:
+            config.index.mark_looked_up(directives if directives is not None else [config.index.ALL_NAMES])
+            visitor = cls(config)
+            walk(config.directives, *get_dispatch([visitor]))
+            return visitor.finish()
+
+        matcher.visitor = cls
+        matcher.sort_findings = cls.sort_findings
+        matcher.local = cls.local
+        matcher.streaming = cls.streaming
+        if directives is None:
+            return matcher
+        return inspects(*directives, triggers=cls.triggers, contexts=cls.contexts, local=cls.local)(matcher)
+
+
+def get_dispatch(visitors: list[Visitor]) -> tuple[dict[str, list[Callable]], list[Callable]]:
+    """
+    Args:
+        visitors (list[Visitor]): Visitors to dispatch to
+
+    Returns:
+        tuple[dict[str, list[Callable]], list[Callable]]: Bound callbacks per
+            directive name, and bound callbacks for every directive
+    """
+    callbacks: dict[str, list[Callable]] = {}
+    all_directives_callbacks: list[Callable] = []
+    for visitor in visitors:
+        for directive_name, attribute in visitor.callbacks.items():
+            callbacks.setdefault(directive_name, []).append(getattr(visitor, attribute))
+        if hasattr(visitor, Visitor.ALL_DIRECTIVES_CALLBACK):
+            all_directives_callbacks.append(getattr(visitor, Visitor.ALL_DIRECTIVES_CALLBACK))
+    return callbacks, all_directives_callbacks
+
+
+def walk(directives: list[Directive],
+         callbacks: dict[str, list[Callable]],
+         all_directives_callbacks: list[Callable] = ()) -> None:
+    """
+    Visit every directive of the tree once, in document order, calling the
+    callbacks registered for its name with the directive and its ancestors.
+    Directives excluded from a DirectiveList are skipped along with their blocks.
+
+    Args:
+        directives (list[Directive]): Top-level directives of the tree, or the
+                                      roots of a part of it (e.g. a server block)
+        callbacks (dict[str, list[Callable]]): Callbacks per directive name
+        all_directives_callbacks (list[Callable], optional): Callbacks for every directive
+    """
+    excluded = getattr(directives, 'excluded', None)
+
+    # Roots of a part of the tree still have the ancestors outside of it
+    ancestors: list[Directive] = []
+    ancestor = directives[0].parent if directives else None
+    while ancestor is not None:
+        ancestors.insert(0, ancestor)
+        ancestor = ancestor.parent
+
+    # One iterator per open block, so that deep nesting does not recurse
+    stack = [iter(directives)]
+    while stack:
+        directive = next(stack[-1], None)
+        if directive is None:
+            stack.pop()
+            if stack:
+                ancestors.pop()
+            continue
+
+        if excluded and directive in excluded:
+            continue
+
+        for callback in callbacks.get(directive.directive, ()):
+            callback(directive, ancestors)
+        for callback in all_directives_callbacks:
+            callback(directive, ancestors)
+
+        if directive.block:
+            ancestors.append(directive)
+            stack.append(iter(directive.block))
+
+
+def get_signature_name(signature: Callable[[NginxConfig], Signature]) -> str:
+    """
+    Args:
+        signature (Callable): Matcher function
+
+    Returns:
+        str: Name of the signature module, e.g. "alias_lfi"
+    """
+    module_name = getattr(signature, 'module_name', None) or signature.__module__
+    return module_name.rsplit('.', 1)[-1]
+
+
+class ScanEngine:
+    """
+    Runs a set of signatures over configs. Visitor signatures share a
+    single walk over the directive tree, while plain matcher functions
+    are called as they are. Signatures that cannot match a config
+    (see @inspects) are skipped.
+
+    While profiling (see profiling.py), every signature is run on its own,
+    visitors included, so that its time can be told apart from the others.
+    """
+    def __init__(self, signatures: list[Callable[[NginxConfig], Signature]]):
+        """
+        Args:
+            signatures (list[Callable]): Matcher functions, e.g. from get_signatures()
+        """
+        self.signatures: list[Callable[[NginxConfig], Signature]] = signatures
+
+    def run(self, config: NginxConfig) -> list[Signature]:
+        """
+        Args:
+            config (NginxConfig): Config to scan
+
+        Returns:
+            list[Signature]: Results of the applicable signatures, in the
+                             order of the signatures
+        """
+        return [result for result in self.run_all(config) if result is not None]
+
+    def run_all(self, config: NginxConfig) -> list[Optional[Signature]]:
+        """
+        Args:
+            config (NginxConfig): Config to scan
+
+        Returns:
+            list[Optional[Signature]]: Result of each signature, None for
+                                       signatures that were skipped
+        """
+        directives_set = DirectiveUtil.get_directives_set(config.directives)
+        profiling = get_profiler() is not None
+
+        results: list[Optional[Signature]] = [None] * len(self.signatures)
+        visitors: dict[int, Visitor] = {}
+        for signature_index, signature in enumerate(self.signatures):
+            if not is_applicable(signature, config, directives_set):
+                continue
+            visitor_class = getattr(signature, 'visitor', None)
+            if visitor_class is not None and not profiling:
+                visitors[signature_index] = visitor_class(config)
+            else:
+                with profile(f'signature:{get_signature_name(signature)}'):
+                    results[signature_index] = signature(config)
+
+        if visitors:
+            walk(config.directives, *get_dispatch(list(visitors.values())))
+            for signature_index, visitor in visitors.items():
+                results[signature_index] = visitor.finish()
+
+        return results
@@ -0,0 +1,217 @@
+"""
+Machine-readable output of scan results, streamed as each file finishes.
+
+Kept free of the rich/jinja2/xhtml2pdf reporting stack, so that nothing
+beyond the scanner itself is imported when only these formats are used.
+"""
+
+import json
+import re
+from typing import Optional, TextIO
+
+from .batch import ScanResult
+from .signature import Flagged, Severity, Signature
+
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+SARIF_VERSION = '2.1.0'
+SARIF_LEVELS = {
+    Severity.INFORMATION: 'note',
+    Severity.WARNING: 'warning',
+    Severity.ERROR: 'error',
+}
+TOOL_NAME = 'uNGINXed'
+TOOL_URI = 'https://github.com/georgeneokq/uNGINXed'
+
+
+def get_rule_id(signature: Signature) -> str:
+    """
+    Args:
+        signature (Signature): Signature result
+
+    Returns:
+        str: Stable identifier derived from the signature name, e.g. "alias-traversal"
+    """
+    return re.sub(r'[^a-z0-9]+', '-', signature.name.lower()).strip('-')
+
+
+def get_finding(result: ScanResult, signature: Signature, flagged: Flagged) -> dict:
+    """
+    Args:
+        result (ScanResult): Result of the scanned config
+        signature (Signature): Signature that flagged the directive
+        flagged (Flagged): Flagged directive
+
+    Returns:
+        dict: Flat, JSON-serializable record of one finding
+    """
+    return {
+        "config": result.filepath,
+        "file": flagged.get("file") or result.filepath,
+        "line": flagged["line"],
+        "column_start": flagged["column_start"],
+        "column_end": flagged["column_end"],
+        "directive": ' '.join(flagged["directive_and_args"]),
+        "signature": signature.name,
+        "rule_id": get_rule_id(signature),
+        "severity": signature.severity.name.lower(),
+        "description": signature.description,
+        "reference_url": signature.reference_url,
+    }
+
+
+def get_error(result: ScanResult) -> dict:
+    """
+    Args:
+        result (ScanResult): Result of a config that could not be scanned
+
+    Returns:
+        dict: JSON-serializable record of the error
+    """
+    return {"config": result.filepath, "error": result.error}
+
+
+class ResultWriter:
+    """
+    Base class of streaming writers. write() is called with each file's
+    result as soon as it finishes, and close() once every file is done.
+    """
+    def __init__(self, stream: TextIO):
+        """
+        Args:
+            stream (TextIO): Stream to write to, e.g. sys.stdout
+        """
+        self.stream: TextIO = stream
+
+    def write(self, result: ScanResult) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class JsonLinesWriter(ResultWriter):
+    """
+    One JSON object per line for every finding, and for every config
+    that could not be scanned.
+    """
+    def write(self, result: ScanResult) -> None:
+        if result.error:
+            self.stream.write(json.dumps(get_error(result)) + '\n')
+        for signature in result.signatures:
+            for flagged in signature.flagged:
+                self.stream.write(json.dumps(get_finding(result, signature, flagged)) + '\n')
+        self.stream.flush()
+
+
+class JsonWriter(ResultWriter):
+    """
+    A single JSON array of the same records as JsonLinesWriter, written
+    element by element.
+    """
+    def __init__(self, stream: TextIO):
+        super().__init__(stream)
+        self.num_written: int = 0
+        self.stream.write('[')
+
+    def write(self, result: ScanResult) -> None:
+        records = [get_error(result)] if result.error else []
+        records.extend(get_finding(result, signature, flagged)
+                       for signature in result.signatures for flagged in signature.flagged)
+        for record in records:
+            self.stream.write(('\n' if self.num_written == 0 else ',\n') + json.dumps(record))
+            self.num_written += 1
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.stream.write('\n]\n' if self.num_written else ']\n')
+        super().close()
+
+
+class SarifWriter(ResultWriter):
+    """
+    SARIF 2.1.0 log with a single run. Results are streamed as they come,
+    while the rules they reference and the scan errors are written at the
+    end of the run object, once all of them are known.
+    """
+    def __init__(self, stream: TextIO):
+        super().__init__(stream)
+        self.rules: dict[str, dict] = {}
+        self.notifications: list[dict] = []
+        self.num_written: int = 0
+        self.stream.write(f'{{"$schema": {json.dumps(SARIF_SCHEMA)}, "version": "{SARIF_VERSION}", '
+                          f'"runs": [{{"results": [')
+
+    def write(self, result: ScanResult) -> None:
+        if result.error:
+            self.notifications.append({
+                "level": "error",
+                "message": {"text": result.error},
+                "locations": [{"physicalLocation": {"artifactLocation": {"uri": result.filepath}}}],
+            })
+
+        for signature in result.signatures:
+            for flagged in signature.flagged:
+                self.stream.write(('\n' if self.num_written == 0 else ',\n')
+                                  + json.dumps(self._get_result(result, signature, flagged)))
+                self.num_written += 1
+        self.stream.flush()
+
+    def close(self) -> None:
+        tool = {"driver": {"name": TOOL_NAME, "informationUri": TOOL_URI, "rules": list(self.rules.values())}}
+        invocation = {
+            "executionSuccessful": not self.notifications,
+            "toolExecutionNotifications": self.notifications,
+        }
+        self.stream.write(f'\n], "tool": {json.dumps(tool)}, "invocations": [{json.dumps(invocation)}]}}]}}\n')
+        super().close()
+
+    def _get_result(self, result: ScanResult, signature: Signature, flagged: Flagged) -> dict:
+        rule_id = get_rule_id(signature)
+        if rule_id not in self.rules:
+            self.rules[rule_id] = {
+                "id": rule_id,
+                "name": signature.name,
+                "shortDescription": {"text": signature.name},
+                "fullDescription": {"text": signature.description},
+                "helpUri": signature.reference_url,
+                "defaultConfiguration": {"level": SARIF_LEVELS[signature.severity]},
+            }
+
+        region = {"startLine": flagged["line"]}
+        if flagged["column_start"] is not None:
+            region["startColumn"] = flagged["column_start"]
+            region["endColumn"] = flagged["column_end"]
+
+        return {
+            "ruleId": rule_id,
+            "ruleIndex": list(self.rules).index(rule_id),
+            "level": SARIF_LEVELS[signature.severity],
+            "message": {"text": f'{signature.description} ({" ".join(flagged["directive_and_args"])})'},
+            "locations": [{
+                "physicalLocation": {
+                    "artifactLocation": {"uri": flagged.get("file") or result.filepath},
+                    "region": region,
+                },
+            }],
+        }
+
+
+WRITERS: dict[str, type[ResultWriter]] = {
+    'jsonl': JsonLinesWriter,
+    'json': JsonWriter,
+    'sarif': SarifWriter,
+}
+
+
+def get_writer(output_format: str, stream: TextIO) -> Optional[ResultWriter]:
+    """
+    Args:
+        output_format (str): One of the keys of WRITERS
+        stream (TextIO): Stream to write to
+
+    Returns:
+        ResultWriter: Writer for the format, None if the format is unknown
+    """
+    writer_class = WRITERS.get(output_format)
+    return writer_class(stream) if writer_class is not None else None
@@ -0,0 +1,214 @@
+"""
+Resolves the effective value of inherited directives in every block.
+
+NGINX copies most directives of a block into the blocks nested in it
+(http -> server -> location -> nested location or if), unless the nested
+block sets the directive itself. Directives that may be repeated, such as
+add_header, are inherited as a whole: a single add_header in a location
+drops every add_header of the enclosing server.
+"""
+
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+from .directive import Directive, DirectiveIndex
+
+
+# Directives that are inherited by nested blocks, and may be repeated
+# within a block. A block setting any of them replaces the inherited list
+ARRAY_DIRECTIVES = frozenset([
+    'add_header',
+    'add_trailer',
+    'proxy_set_header',
+    'proxy_hide_header',
+    'proxy_pass_header',
+    'fastcgi_param',
+    'uwsgi_param',
+    'scgi_param',
+    'grpc_set_header',
+    'error_page',
+    'allow',
+    'deny',
+])
+
+# Directives that are inherited by nested blocks, set once per block
+SCALAR_DIRECTIVES = frozenset([
+    'root',
+    'index',
+    'autoindex',
+    'merge_slashes',
+    'server_tokens',
+    'client_max_body_size',
+    'proxy_intercept_errors',
+    'proxy_redirect',
+    'proxy_buffering',
+    'ssl_protocols',
+    'ssl_ciphers',
+    'valid_referers',
+    'resolver',
+    'access_log',
+    'error_log',
+])
+
+INHERITED_DIRECTIVES = ARRAY_DIRECTIVES | SCALAR_DIRECTIVES
+
+# Effective directives of a block: directive name -> directives in effect,
+# in the block that defines them
+Effective = Mapping[str, tuple[Directive, ...]]
+
+_EMPTY: Effective = MappingProxyType({})
+
+
+class InheritanceResolver:
+    """
+    Computes the effective inherited directives of blocks. Each block's
+    result is cached, and derived from the cached result of the enclosing
+    block. Blocks that set none of the inherited directives share the
+    result of the enclosing block.
+    """
+    def __init__(self, index: Optional[DirectiveIndex] = None):
+        """
+        Args:
+            index (DirectiveIndex, optional): Index of the tree. Lookups are
+                                              recorded in it while it records
+        """
+        self.index: Optional[DirectiveIndex] = index
+        # Keyed by the directive owning the block, None for the main context
+        self.cache: dict[Optional[Directive], Effective] = {}
+
+    def get_effective(self, block: Optional[Directive]) -> Effective:
+        """
+        Args:
+            block (Directive): Directive owning the block (e.g. a location),
+                               None for the main context
+
+        Returns:
+            Effective: Read-only mapping of every inherited directive in
+                       effect in the block, to the directives setting it
+        """
+        if block in self.cache:
+            return self.cache[block]
+
+        # Resolve from the innermost cached ancestor down, so that deep
+        # nesting does not recurse
+        chain = []
+        ancestor = block
+        while ancestor is not None and ancestor not in self.cache:
+            chain.append(ancestor)
+            ancestor = ancestor.parent
+        if ancestor is None and None not in self.cache:
+            self.cache[None] = _EMPTY
+        effective = self.cache[ancestor]
+
+        for current in reversed(chain):
+            effective = self.cache[current] = self._derive(effective, current.block)
+
+        return effective
+
+    def get(self, block: Optional[Directive], directive_name: str) -> tuple[Directive, ...]:
+        """
+        Args:
+            block (Directive): Directive owning the block, None for the main context
+            directive_name (str): Inherited directive, e.g. "add_header"
+
+        Returns:
+            tuple[Directive, ...]: Directives in effect in the block, empty if not set
+        """
+        if self.index is not None:
+            self.index.mark_looked_up([directive_name])
+        return self.get_effective(block).get(directive_name, ())
+
+    def get_inherited(self, block: Directive, directive_name: str) -> tuple[Directive, ...]:
+        """
+        Args:
+            block (Directive): Directive owning the block
+            directive_name (str): Inherited directive, e.g. "add_header"
+
+        Returns:
+            tuple[Directive, ...]: Directives the block would inherit from
+                                   the enclosing block if it did not set
+                                   the directive itself
+        """
+        return self.get(block.parent, directive_name)
+
+    def get_value(self, block: Optional[Directive], directive_name: str) -> Optional[list[str]]:
+        """
+        Args:
+            block (Directive): Directive owning the block, None for the main context
+            directive_name (str): Inherited directive set once per block, e.g. "root"
+
+        Returns:
+            list[str]: Arguments of the directive in effect, None if not set
+        """
+        directives = self.get(block, directive_name)
+        return directives[-1].args if directives else None
+
+    @staticmethod
+    def _derive(inherited: Effective, block: Iterable[Directive]) -> Effective:
+        own: dict[str, list[Directive]] = {}
+        for directive in block:
+            if directive.directive in INHERITED_DIRECTIVES:
+                own.setdefault(directive.directive, []).append(directive)
+        if not own:
+            return inherited
+
+        effective = dict(inherited)
+        for directive_name, directives in own.items():
+            effective[directive_name] = tuple(directives)
+        return MappingProxyType(effective)
+
+
+def describe_block(block: Directive) -> str:
+    """
+    Args:
+        block (Directive): Directive owning a block
+
+    Returns:
+        str: e.g. "http > server example.com > location /api/"
+    """
+    names = []
+    ancestor = block
+    while ancestor is not None:
+        if ancestor.directive == 'server':
+            server_names = next((directive.args for directive in ancestor.block
+                                 if directive.directive == 'server_name'), [])
+            names.append(' '.join(['server', *server_names[:1]]))
+        else:
+            names.append(ancestor.get_full_directive())
+        ancestor = ancestor.parent
+    return ' > '.join(reversed(names))
+
+
+def explain(resolver: InheritanceResolver, blocks: Iterable[Directive],
+            filepath: Optional[str] = None) -> Iterable[str]:
+    """
+    Describe the effective inherited directives of blocks, and where each
+    is defined.
+
+    Args:
+        resolver (InheritanceResolver): Resolver of the config
+        blocks (Iterable[Directive]): Directives owning the blocks to describe,
+                                      e.g. every server and location
+        filepath (str, optional): Path of the main config. Directives from
+                                  other files are prefixed with their file
+
+    Yields:
+        str: Lines of the description
+    """
+    for block in blocks:
+        yield f'{describe_block(block)}  ({_get_location(block, filepath)})'
+        effective = resolver.get_effective(block)
+        if not effective:
+            yield '    (nothing inherited or set)'
+        for directive_name in sorted(effective):
+            for directive in effective[directive_name]:
+                origin = 'set here' if directive.parent is block \
+                    else f'inherited from {describe_block(directive.parent) or "main"}'
+                yield f'    {directive.get_full_directive()};  ({origin}, {_get_location(directive, filepath)})'
+        yield ''
+
+
+def _get_location(directive: Directive, filepath: Optional[str]) -> str:
+    if directive.file in (None, filepath):
+        return f'line {directive.line}'
+    return f'{directive.file}:{directive.line}'
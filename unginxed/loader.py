@@ -0,0 +1,313 @@
+from collections import OrderedDict
+from glob import glob, has_magic
+from hashlib import sha256
+from os import path
+from sys import intern
+from typing import Optional
+
+from .directive import Directive, DirectiveDict, DirectiveIndex, DirectiveList, DirectiveUtil
+from .parser import parse
+from .profiling import profile
+
+
+class ParseCache:
+    """
+    Bounded LRU cache of parsed config files, keyed by the SHA-256 of
+    their contents. Files with identical contents (e.g. a snippet copied
+    across vhosts) share one entry, and unchanged files are not re-parsed
+    across NginxConfig instances.
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize: int = maxsize
+        self.entries: OrderedDict[tuple[str, bool], list[DirectiveDict]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: tuple[str, bool]) -> Optional[list[DirectiveDict]]:
+        parsed = self.entries.get(key)
+        if parsed is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return parsed
+
+    def put(self, key: tuple[str, bool], parsed: list[DirectiveDict]) -> None:
+        self.entries[key] = parsed
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by every NginxConfig in the process
+parse_cache = ParseCache()
+
+
+class ConfigLoader:
+    """
+    Loads an NGINX config file along with every file it pulls in through
+    include directives, merging them into a single tree of directives.
+
+    Included directives are spliced into the including block right after
+    the include directive, as NGINX does. Each directive records the file
+    it was defined in, so that line numbers stay file-qualified.
+    """
+    def __init__(self, filepath: str, cache: ParseCache = parse_cache):
+        """
+        Args:
+            filepath (str): Path to the main config file
+            cache (ParseCache, optional): Cache of parsed files.
+                                          Defaults to the shared cache.
+        """
+        self.filepath: str = filepath
+        self.config_dir: str = path.dirname(filepath)
+        self.cache: ParseCache = cache
+        self.sources: dict[str, str] = {}
+        self.parsed: dict[str, list[DirectiveDict]] = {}
+        self.includes: dict[str, list[str]] = {}
+        self.directives: DirectiveList = None
+
+    def load(self) -> DirectiveList:
+        """
+        Parse the main config and all of its includes.
+
+        Returns:
+            DirectiveList: Top-level directives, carrying the index of the merged tree
+        """
+        self.directives = DirectiveList()
+        directive_dicts = self.parse_file(self.filepath, root=True)
+        # Included files are parsed while the tree is built
+        with profile('tree'):
+            self._initialize_directives(directive_dicts, self.directives, None, self.filepath, None,
+                                        [path.normpath(self.filepath)], self.directives.index)
+        return self.directives
+
+    def reload(self, filepath: str) -> set[str]:
+        """
+        Re-parse an included file and replace, in place, the directives it
+        contributed at every include site. Only the index entries of the
+        affected directive names are rebuilt.
+        The main config file cannot be reloaded this way, load it again instead.
+
+        Args:
+            filepath (str): Path of an included file. If the file no longer
+                            exists, its directives are removed.
+
+        Returns:
+            set[str]: Names of the directives that were removed or added, along
+                      with the names of the directives sharing a block with
+                      each include site and of the blocks enclosing it.
+                      Empty if the contents of the file did not change.
+        """
+        previous_raw = self.sources.pop(filepath, None)
+        self.parsed.pop(filepath, None)
+        try:
+            directive_dicts = self.parse_file(filepath)
+        except (OSError, UnicodeDecodeError):
+            directive_dicts = []
+
+        if self.sources.get(filepath) == previous_raw:
+            return set()
+
+        changed_names: set[str] = set()
+
+        for include_directive in self.directives.index.get('include'):
+            matched = self.resolve_include(include_directive.args[0]) if include_directive.args else []
+            if filepath not in matched:
+                continue
+            file_order = {included_filepath: order for order, included_filepath in enumerate(matched)}
+
+            block = include_directive.parent.block if include_directive.parent else self.directives
+            include_stack = [filepath]
+            ancestor = include_directive
+            while ancestor is not None:
+                include_stack.append(path.normpath(ancestor.file))
+                ancestor = ancestor.included_by
+            if filepath in include_stack[1:]:
+                continue
+
+            # Split the block into the directives spliced in from this file
+            # (directly, or through its own includes) and everything else
+            kept: list[Directive] = []
+            removed: list[Directive] = []
+            position = None
+            spliced_from: dict[int, str] = {id(include_directive): None}
+            for directive in block:
+                if directive is include_directive:
+                    kept.append(directive)
+                    position = len(kept)
+                    continue
+
+                if id(directive.included_by) not in spliced_from:
+                    kept.append(directive)
+                    continue
+
+                # File of the include site's match this directive came from
+                origin = directive.file if directive.included_by is include_directive \
+                    else spliced_from[id(directive.included_by)]
+                if directive.directive == 'include':
+                    spliced_from[id(directive)] = origin
+
+                if origin == filepath:
+                    removed.append(directive)
+                    continue
+
+                kept.append(directive)
+                if file_order.get(origin, -1) < file_order[filepath]:
+                    position = len(kept)
+
+            added: list[Directive] = []
+            self._initialize_directives(directive_dicts, added, include_directive.parent, filepath,
+                                        include_directive, include_stack[::-1])
+            block[:] = [*kept[:position], *added, *kept[position:]]
+
+            # Signatures may relate a directive to its siblings or ancestors,
+            # so those count as affected as well
+            changed_names |= DirectiveUtil.get_directives_set(removed)
+            changed_names |= DirectiveUtil.get_directives_set(added)
+            changed_names.update(directive.directive for directive in block)
+            ancestor = include_directive.parent
+            while ancestor is not None:
+                changed_names.add(ancestor.directive)
+                ancestor = ancestor.parent
+
+        self.directives.index.reindex(self.directives, changed_names)
+        return changed_names
+
+    def parse_file(self, filepath: str, root: bool = False) -> list[DirectiveDict]:
+        """
+        Parse a single file, without following its includes. Each file is
+        parsed at most once per load, and not at all if a file with the
+        same contents is in the cache.
+
+        Args:
+            filepath (str): Path to the file
+            root (bool): Whether this is the main config file. Included
+                         files are parsed without context checks, as the
+                         context depends on where they are included.
+
+        Returns:
+            list[DirectiveDict]: Parsed directives
+        """
+        if filepath in self.parsed:
+            return self.parsed[filepath]
+
+        with profile('parse'):
+            with open(filepath) as f:
+                raw = f.read()
+            self.sources[filepath] = raw
+
+            key = (sha256(raw.encode()).hexdigest(), root)
+            parsed = self.cache.get(key)
+            if parsed is None:
+                # From the contents already read, see parser.parse
+                parsed = parse(raw, filepath, check_ctx=root)
+                self.cache.put(key, parsed)
+
+        self.parsed[filepath] = parsed
+        return parsed
+
+    def resolve_include(self, pattern: str) -> list[str]:
+        """
+        Get the files matched by the argument of an include directive.
+        Relative paths are resolved against the main config's folder.
+
+        Args:
+            pattern (str): Include argument, which may be a glob pattern
+
+        Returns:
+            list[str]: Paths of existing files, in the order NGINX includes them
+        """
+        if not path.isabs(pattern):
+            pattern = path.join(self.config_dir, pattern)
+
+        if pattern not in self.includes:
+            self.includes[pattern] = ConfigLoader.expand_include(pattern)
+
+        return self.includes[pattern]
+
+    @staticmethod
+    def expand_include(pattern: str) -> list[str]:
+        """
+        Args:
+            pattern (str): Include path or glob pattern, already resolved
+                           against the main config's folder
+
+        Returns:
+            list[str]: Paths of existing files, in the order NGINX includes them
+        """
+        if has_magic(pattern):
+            return sorted(path.normpath(filepath) for filepath in glob(pattern) if path.isfile(filepath))
+
+        return [path.normpath(pattern)] if path.isfile(pattern) else []
+
+    def _initialize_directives(self,
+                               directive_dicts: list[DirectiveDict],
+                               block: list[Directive],
+                               parent: Optional[Directive],
+                               filepath: str,
+                               included_by: Optional[Directive],
+                               include_stack: list[str],
+                               index: Optional[DirectiveIndex] = None) -> None:
+        """
+        Initialize Directive objects from parsed dictionaries and append them
+        to block, splicing in the directives of included files.
+
+        Args:
+            directive_dicts (list[DirectiveDict]): Parsed directives
+            block (list[Directive]): Block to append the directives to
+            parent (Directive): Directive owning the block, None at top level
+            filepath (str): File the directives were parsed from
+            included_by (Directive): Include directive that pulled in the file
+            include_stack (list[str]): Files currently being included, to
+                                       break include cycles
+            index (DirectiveIndex, optional): Index to register the directives in
+        """
+        # Each frame fills a block, either from parsed directives or, for an
+        # include directive, from the files it matches (parsed one at a time,
+        # in include order). The top frame is always the innermost one.
+        stack = [(iter(directive_dicts), block, parent, filepath, included_by, include_stack)]
+        while stack:
+            items, block, parent, filepath, included_by, include_stack = stack[-1]
+            item = next(items, None)
+            if item is None:
+                stack.pop()
+                continue
+
+            if isinstance(item, str):
+                if item in include_stack:
+                    continue
+                try:
+                    included_dicts = self.parse_file(item)
+                except (OSError, UnicodeDecodeError):
+                    continue
+                stack.append((iter(included_dicts), block, parent, item, included_by, [*include_stack, item]))
+                continue
+
+            directive = Directive(
+                directive=intern(item["directive"]),
+                line=item["line"],
+                parent=parent,
+                args=list(item["args"]),
+                depth=parent.depth + 1 if parent else 0,
+                file=filepath,
+                included_by=included_by,
+                spans=item.get("spans"),
+            )
+            block.append(directive)
+            if index is not None:
+                index.add(directive)
+
+            # Included directives are spliced in after the directive's own block
+            if directive.directive == 'include' and directive.args:
+                stack.append((iter(self.resolve_include(directive.args[0])), block, parent,
+                              filepath, directive, include_stack))
+
+            if item.get("block") is not None:
+                stack.append((iter(item["block"]), directive.block, directive, filepath, included_by, include_stack))
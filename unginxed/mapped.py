@@ -0,0 +1,416 @@
+"""
+Low-memory loading of very large configs, e.g. generated configs with
+huge map blocks.
+
+Files are memory-mapped instead of read into strings, and parsed from the
+mapping straight into directives, without the parsed dictionaries or the
+parse cache. The arguments and spans of those directives are not held in
+memory, but read from the mapping whenever they are accessed. Mapped files
+must not be truncated while the config is loaded.
+"""
+
+import codecs
+import re
+from hashlib import sha256
+from mmap import ACCESS_READ, mmap
+from os import fstat, path
+from sys import intern
+from typing import Any, Iterator, Optional, Union
+
+from .directive import Directive, DirectiveDict, DirectiveList, DirectiveUtil
+from .loader import ConfigLoader
+from .parser import BYTES_TOKEN_PATTERN, NativeParseError, Parser, parse, parse_with_crossplane, unquote
+from .profiling import profile
+
+
+# Size of the parts a mapped file is validated in
+CHUNK_SIZE = 1 << 20
+
+LONE_CARRIAGE_RETURN = re.compile(rb'\r(?!\n)')
+
+
+class MappedSource:
+    """
+    Contents of a config file, memory-mapped and decoded on demand.
+    Offsets are byte offsets into the file, and decoded text has its line
+    breaks translated as when the file is read in text mode.
+    """
+    def __init__(self, filepath: str):
+        """
+        Args:
+            filepath (str): Path to the file
+
+        Raises:
+            OSError: If the file cannot be opened
+            UnicodeDecodeError: If the file is not valid UTF-8, as reading it would raise
+        """
+        self.filepath: str = filepath
+        with open(filepath, 'rb') as f:
+            # Empty files cannot be mapped
+            self.buffer: Union[mmap, bytes] = mmap(f.fileno(), 0, access=ACCESS_READ) \
+                if fstat(f.fileno()).st_size else b''
+        self.num_lines: int = self._validate()
+        self._digest: Optional[str] = None
+
+    def _validate(self) -> int:
+        # Decode the whole file once, a part at a time, counting its lines
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        num_lines = 1
+        for offset in range(0, len(self.buffer), CHUNK_SIZE):
+            chunk = self.buffer[offset:offset + CHUNK_SIZE]
+            decoder.decode(chunk)
+            num_lines += chunk.count(b'\n')
+        decoder.decode(b'', final=True)
+
+        if self.buffer.find(b'\r') != -1:
+            num_lines += sum(1 for _ in LONE_CARRIAGE_RETURN.finditer(self.buffer))
+        return num_lines
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def __getitem__(self, key: slice) -> str:
+        return self._decode(self.buffer[key])
+
+    def find(self, sub: str, start: int = 0, end: Optional[int] = None) -> int:
+        return self.buffer.find(sub.encode(), start, len(self.buffer) if end is None else end)
+
+    def rfind(self, sub: str, start: int = 0, end: Optional[int] = None) -> int:
+        return self.buffer.rfind(sub.encode(), start, len(self.buffer) if end is None else end)
+
+    def count(self, sub: str, start: int = 0, end: Optional[int] = None) -> int:
+        return self.buffer[start:end].count(sub.encode())
+
+    def splitlines(self, keepends: bool = False) -> Iterator[str]:
+        """
+        Read the lines of the file one at a time, as str.splitlines would
+        split the text of the file.
+
+        Args:
+            keepends (bool, optional): Keep the line breaks
+
+        Yields:
+            str: Lines of the file
+        """
+        buffer = self.buffer
+        start = 0
+        while start < len(buffer):
+            end = buffer.find(b'\n', start)
+            end = len(buffer) if end == -1 else end + 1
+            # Other line breaks within the line (e.g. \x0c) are split on as well
+            yield from self._decode(buffer[start:end]).splitlines(keepends)
+            start = end
+
+    def digest(self) -> str:
+        """
+        Returns:
+            str: SHA-256 of the contents, as a hex string
+        """
+        if self._digest is None:
+            self._digest = sha256(self.buffer).hexdigest()
+        return self._digest
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap):
+            self.buffer.close()
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, MappedSource):
+            return NotImplemented
+        return len(self) == len(other) and self.digest() == other.digest()
+
+    __hash__ = None
+
+    def __str__(self) -> str:
+        return self[:]
+
+    @staticmethod
+    def _decode(data: bytes) -> str:
+        text = data.decode()
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+
+def read_tokens(buffer: Union[mmap, bytes], start: int, end: int) -> tuple[list[str], tuple[int, ...]]:
+    """
+    Read a directive back from a mapped file, as the parser read it.
+
+    Args:
+        buffer (mmap | bytes): Contents of the file
+        start (int): Offset of the directive name
+        end (int): Offset of the ";", "{" or "}" ending the directive
+
+    Returns:
+        tuple[list[str], tuple[int, ...]]: Arguments and spans of the directive
+    """
+    args: list[str] = []
+    spans: list[int] = []
+    for match in BYTES_TOKEN_PATTERN.finditer(buffer, start, end):
+        kind = match.lastgroup
+        if kind is None:
+            break
+        if kind == 'comment':
+            continue
+        token = match.group(kind).decode()
+        args.append(unquote(token) if kind == 'quoted' else token)
+        spans += match.span(kind)
+    spans.append(end)
+    return args[1:], tuple(spans)
+
+
+# Slots of the base class, which MappedDirective hides behind properties
+_ARGS = Directive.args
+_SPANS = Directive.spans
+
+
+class MappedDirective(Directive):
+    """
+    Directive whose arguments and spans are read from its mapped file on
+    access, and only held in memory if they are set. Each access to the
+    arguments returns a new list.
+    """
+    __slots__ = ('source', 'start', 'length')
+
+    def __init__(self, source: MappedSource, start: int, length: int, **kwargs):
+        """
+        Args:
+            source (MappedSource): File the directive was parsed from
+            start (int): Offset of the directive name
+            length (int): Offset of the ";", "{" or "}" ending the directive,
+                          relative to start
+            **kwargs: Fields of Directive, other than args and spans
+        """
+        Directive.__init__(self, args=None, spans=None, **kwargs)
+        self.source: MappedSource = source
+        self.start: int = start
+        self.length: int = length
+
+    @property
+    def args(self) -> list[str]:
+        args = _ARGS.__get__(self)
+        return self.read()[0] if args is None else args
+
+    @args.setter
+    def args(self, args: Optional[list[str]]) -> None:
+        _ARGS.__set__(self, args)
+
+    @property
+    def spans(self) -> tuple[int, ...]:
+        spans = _SPANS.__get__(self)
+        return self.read()[1] if spans is None else spans
+
+    @spans.setter
+    def spans(self, spans: Optional[tuple[int, ...]]) -> None:
+        _SPANS.__set__(self, spans)
+
+    def read(self) -> tuple[list[str], tuple[int, ...]]:
+        """
+        Returns:
+            tuple[list[str], tuple[int, ...]]: Arguments and spans, as read from the file
+        """
+        return read_tokens(self.source.buffer, self.start, self.start + self.length)
+
+
+class TreeBuilder(Parser):
+    """
+    Parser building the directives of a mapped file as it goes, splicing in
+    the directives of included files right after each include directive.
+    Blocks are identified by the directive owning them, None for the block
+    the file's top-level directives go in.
+    """
+    def __init__(self, loader: 'MappedConfigLoader', source: MappedSource, block: list[Directive],
+                 included_by: Optional[Directive], include_stack: list[str], check_ctx: bool = True,
+                 keep_tree: bool = True):
+        """
+        Args:
+            loader (MappedConfigLoader): Loader resolving include directives
+            source (MappedSource): File to parse
+            block (list[Directive]): Block to add the file's top-level directives to
+            included_by (Directive): Include directive that pulled in the file
+            include_stack (list[str]): Files currently being included
+            check_ctx (bool, optional): See Parser
+            keep_tree (bool, optional): Add directives to the blocks they are
+                                        in. Otherwise only the directives
+                                        enclosing the one being parsed are
+                                        kept, through their parent links
+        """
+        super().__init__(source.buffer, check_ctx)
+        self.loader: MappedConfigLoader = loader
+        self.source: MappedSource = source
+        self.block: list[Directive] = block
+        self.included_by: Optional[Directive] = included_by
+        self.include_stack: list[str] = include_stack
+        self.keep_tree: bool = keep_tree
+
+    def run(self, root: Optional[Directive]) -> Iterator[Directive]:
+        for directive in super().run(root):
+            yield directive
+
+            # Included directives are spliced in after the include directive
+            if directive.directive == 'include':
+                args = directive.args
+                if not args:
+                    continue
+                parent = directive.parent
+                block = parent.block if parent is not None else self.block
+                for filepath in self.loader.resolve_include(args[0]):
+                    if filepath not in self.include_stack:
+                        yield from self.loader.build_file(filepath, block, parent, directive,
+                                                          [*self.include_stack, filepath], self.keep_tree)
+
+    def append(self, parent: Optional[Directive], directive_dict: DirectiveDict) -> Directive:
+        name = intern(directive_dict['directive'])
+        spans = directive_dict.get('spans')
+        # Comments have no spans, and the arguments of an if directive are
+        # stripped of their parentheses, so those are kept as parsed
+        if spans is None or name == 'if':
+            directive = Directive(directive=name, line=directive_dict['line'], parent=parent,
+                                  args=directive_dict['args'], depth=parent.depth + 1 if parent else 0,
+                                  file=self.source.filepath, included_by=self.included_by, spans=spans)
+        else:
+            directive = MappedDirective(self.source, spans[0], spans[-1] - spans[0],
+                                        directive=name, line=directive_dict['line'], parent=parent,
+                                        depth=parent.depth + 1 if parent else 0,
+                                        file=self.source.filepath, included_by=self.included_by)
+        if self.keep_tree:
+            (parent.block if parent is not None else self.block).append(directive)
+        return directive
+
+    def open_block(self, node: Directive) -> Directive:
+        return node
+
+
+class MappedConfigLoader(ConfigLoader):
+    """
+    ConfigLoader for configs too large to hold in memory several times over.
+    Files are memory-mapped and parsed straight into directives which keep
+    their arguments in the mapping (see MappedDirective), and are not cached.
+    Sources are MappedSource objects rather than strings.
+    """
+    def __init__(self, filepath: str):
+        """
+        Args:
+            filepath (str): Path to the main config file
+        """
+        super().__init__(filepath)
+        self.sources: dict[str, MappedSource] = {}
+
+    def load(self) -> DirectiveList:
+        """
+        Parse the main config and all of its includes.
+
+        Returns:
+            DirectiveList: Top-level directives, carrying the index of the merged tree
+        """
+        # Included files are parsed while the tree is built
+        with profile('parse'):
+            for _ in self.iter_load():
+                pass
+        return self.index_tree()
+
+    def iter_load(self, keep_tree: bool = True) -> Iterator[Directive]:
+        """
+        Parse the main config and all of its includes, yielding each
+        directive as soon as it is parsed, before the directives within it.
+        Directives are yielded in document order, with included files
+        spliced in, and have their enclosing directives as parents.
+
+        Args:
+            keep_tree (bool, optional): Build the tree in self.directives.
+                                        Otherwise each block is released
+                                        once it is closed
+
+        Yields:
+            Directive: Every directive and comment of the config
+        """
+        self.directives = DirectiveList()
+        yield from self.build_file(self.filepath, self.directives, None, None, [path.normpath(self.filepath)],
+                                   keep_tree, root=True)
+
+    def index_tree(self) -> DirectiveList:
+        """
+        Index the tree built by iter_load. Done once the whole tree is
+        built, as files the native parser fails on part way are built again
+        from crossplane's output.
+
+        Returns:
+            DirectiveList: Top-level directives, carrying the index of the merged tree
+        """
+        with profile('tree'):
+            DirectiveUtil.traverse(self.directives, self.directives.index.add)
+        return self.directives
+
+    def build_file(self, filepath: str, block: list[Directive], parent: Optional[Directive],
+                   included_by: Optional[Directive], include_stack: list[str], keep_tree: bool = True,
+                   root: bool = False) -> Iterator[Directive]:
+        """
+        Parse a file and append its directives to block, yielding each one
+        as it is parsed. Included files that cannot be read are skipped.
+
+        If the native parser fails part way through the file, the file is
+        built again from crossplane's output, and its directives yielded
+        again.
+
+        Args:
+            filepath (str): Path to the file
+            block (list[Directive]): Block to append the directives to
+            parent (Directive): Directive owning the block, None at top level
+            included_by (Directive): Include directive that pulled in the file
+            include_stack (list[str]): Files currently being included, to
+                                       break include cycles
+            keep_tree (bool, optional): See iter_load
+            root (bool): Whether this is the main config file
+
+        Yields:
+            Directive: Directives of the file and of the files it includes
+        """
+        try:
+            source = self.open_source(filepath)
+        except (OSError, UnicodeDecodeError):
+            if root:
+                raise
+            return
+
+        num_directives = len(block)
+        try:
+            yield from TreeBuilder(self, source, block, included_by, include_stack,
+                                   check_ctx=root, keep_tree=keep_tree).run(parent)
+        except NativeParseError:
+            del block[num_directives:]
+            built: list[Directive] = []
+            directive_dicts = parse_with_crossplane(filepath, check_ctx=root)
+            self._initialize_directives(directive_dicts, built, parent, filepath, included_by, include_stack)
+            if keep_tree:
+                block.extend(built)
+            directives: list[Directive] = []
+            DirectiveUtil.traverse(built, directives.append)
+            yield from directives
+
+    def open_source(self, filepath: str) -> MappedSource:
+        """
+        Args:
+            filepath (str): Path to the file
+
+        Returns:
+            MappedSource: Mapping of the file, shared by every include site
+        """
+        if filepath not in self.sources:
+            self.sources[filepath] = MappedSource(filepath)
+        return self.sources[filepath]
+
+    def parse_file(self, filepath: str, root: bool = False) -> list[DirectiveDict]:
+        """
+        Parse a single file from a new mapping of it, without following its
+        includes, e.g. to reload it. Parsed files are not cached.
+
+        Args:
+            filepath (str): Path to the file
+            root (bool): Whether this is the main config file
+
+        Returns:
+            list[DirectiveDict]: Parsed directives
+        """
+        with profile('parse'):
+            self.sources[filepath] = MappedSource(filepath)
+            return parse(self.sources[filepath].buffer, filepath, check_ctx=root)
@@ -1,55 +1,348 @@
 import re
+from copy import copy
+from functools import lru_cache
 from os import path
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 
-import crossplane
-
-from .directive import Directive, DirectiveDict, DirectiveUtil
+from .directive import Directive, DirectiveIndex, DirectiveList
+from .inheritance import InheritanceResolver
+from .loader import ConfigLoader
+from .mapped import MappedConfigLoader, MappedSource
+from .variables import VariableIndex
 
 
 class NginxConfig:
     """Represents an NGINX config file"""
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, low_memory: bool = False):
         """Instantiate an NginxConfig object.
 
         Args:
             filepath (str): Absolute or relative path to the config file
+            low_memory (bool, optional): Memory-map the config files instead
+                                         of reading them, and keep directive
+                                         arguments in the mapping (see
+                                         mapped.py). Slower to scan, for
+                                         very large configs.
 
         Properties:
             filepath: File path to the config
-            raw: Contents of the config file, unparsed
-            config: Parsed tree of directives
+            raw: Contents of the config file, unparsed. A MappedSource
+                 in low memory mode
+            sources: Contents of the config file and of every included
+                     file, keyed by file path
+            includes: Files matched by each include pattern
+            directives: Parsed tree of directives, with included files
+                        merged in
+            index: Lookup tables from directive name to directives, built
+                   while the tree is initialized
+            variables: Lookup tables from variable name to the directives
+                       referencing it, built on first use
+            inheritance: Effective inherited directives of each block,
+                         resolved on first use
+            locators: Resolve the position of directives without spans
+                      within each file, created on first use
         """
+        self._set_up(filepath, MappedConfigLoader(filepath) if low_memory else ConfigLoader(filepath))
+        self._set_directives(self.loader.load())
 
+    def _set_up(self, filepath: str, loader: ConfigLoader) -> None:
         if not path.exists(filepath):
             raise IOError(f'Invalid file path "{filepath}" provided.')
         
         self.filepath: str = filepath
         self.filename: str = Path(filepath).stem
 
-        with open(filepath) as f:
-            self.raw: str = f.read()
+        self.loader: ConfigLoader = loader
+        self.sources: dict[str, Union[str, MappedSource]] = self.loader.sources
+        self.includes: dict[str, list[str]] = self.loader.includes
+
+        self.locators: dict[str, PositionLocator] = {}
+        self._variables: Optional[VariableIndex] = None
+        self._inheritance: Optional[InheritanceResolver] = None
 
-        self.directives: list[Directive] = []
+    def _set_directives(self, directives: DirectiveList) -> None:
+        self.directives: list[Directive] = directives
+        self.index: DirectiveIndex = self.directives.index
+        self.raw: Union[str, MappedSource] = self.sources[self.filepath]
 
-        config: list[DirectiveDict] = crossplane.parse(filepath)["config"][0]["parsed"]
-        if not config:
+        if not self.directives:
             raise RuntimeError('Invalid NGINX config!')
 
-        for directive_dict in config:
-            directive = Directive()
-            self.directives.append(directive)
-            DirectiveUtil.recursive_initialize_directives(
-                directive,
-                directive_dict
-            )
+    @property
+    def variables(self) -> VariableIndex:
+        if self._variables is None:
+            self._variables = VariableIndex(self.directives, self.index)
+        return self._variables
+
+    @property
+    def inheritance(self) -> InheritanceResolver:
+        if self._inheritance is None:
+            self._inheritance = InheritanceResolver(self.index)
+        return self._inheritance
+
+    def get_directives(self, directive_name: str) -> list[Directive]:
+        """
+        Args:
+            directive_name (str): Directive name to search for
+
+        Returns:
+            list[Directive]: All directives in the config with the given name
+        """
+        return self.index.get(directive_name)
+
+    def reload_file(self, filepath: str) -> set[str]:
+        """
+        Re-parse an included file, replacing the directives it contributed
+        in place. See ConfigLoader.reload.
+
+        Args:
+            filepath (str): Path of an included file, as found in sources
+
+        Returns:
+            set[str]: Names of the directives affected by the change
+        """
+        if filepath == self.filepath:
+            raise ValueError('The main config file cannot be reloaded in place, create a new NginxConfig instead.')
+
+        self.locators.pop(filepath, None)
+        self._variables = None
+        self._inheritance = None
+        return self.loader.reload(filepath)
+
+    def has_include_changes(self) -> bool:
+        """
+        Returns:
+            bool: Whether any include pattern now matches a different set of
+                  files than when the config was loaded
+        """
+        return any(ConfigLoader.expand_include(pattern) != matched for pattern, matched in self.includes.items())
+
+    @property
+    def locator(self) -> 'PositionLocator':
+        return self.get_locator()
+
+    def get_locator(self, filepath: Optional[str] = None) -> 'PositionLocator':
+        """
+        Args:
+            filepath (str, optional): Path of the main config file or of an
+                                      included file. Defaults to the main file.
+
+        Returns:
+            PositionLocator: Locator for the contents of the given file. The
+                             contents of a mapped file are decoded whole
+        """
+        filepath = filepath or self.filepath
+        if filepath not in self.locators:
+            self.locators[filepath] = PositionLocator(str(self.sources[filepath]))
+
+        return self.locators[filepath]
+
+    def get_num_lines(self, filepath: Optional[str] = None) -> int:
+        """
+        Args:
+            filepath (str, optional): Path of the main config file or of an
+                                      included file. Defaults to the main file.
+
+        Returns:
+            int: Number of lines of the file, one more than its number of newlines
+        """
+        source = self.sources[filepath or self.filepath]
+        if isinstance(source, MappedSource):
+            return source.num_lines
+        return len(self.get_locator(filepath).line_starts)
+
+    def get_position(self, directive: Directive) -> Optional[tuple[int, int]]:
+        """
+        Get the start and end index of a directive, relative to the start of
+        the line it is defined on (see PositionLocator.locate). Directives
+        with spans are located by offset, others are searched for on their line.
+
+        Args:
+            directive (Directive): Directive of this config
+
+        Returns:
+            tuple[int, int]: Start and end index of the directive, one-indexed.
+                             None if the directive could not be found
+        """
+        raw = self.sources.get(directive.file) if directive.file is not None else self.raw
+        spans = directive.spans
+        if spans is None or raw is None:
+            locator = self.get_locator(directive.file if directive.file in self.sources else None)
+            return locator.locate([directive.directive, *directive.args], directive.line)
+
+        start, end = spans[0], spans[-2]
+        line_start = raw.rfind('\n', 0, start) + 1
+        if isinstance(raw, MappedSource):
+            # Spans into a mapped file are byte offsets
+            return (len(raw[line_start:start]) + 1, len(raw[line_start:end]) + 1)
+        return (start - line_start + 1, end - line_start + 1)
+
+    def get_last_line(self, directive: Directive) -> Optional[int]:
+        """
+        Args:
+            directive (Directive): Directive of this config
+
+        Returns:
+            int: One-based line number of the ";" or "{" ending the directive,
+                 None if the directive has no spans
+        """
+        raw = self.sources.get(directive.file) if directive.file is not None else self.raw
+        spans = directive.spans
+        if spans is None or raw is None:
+            return None
+        return directive.line + raw.count('\n', spans[1], spans[-1])
+
+    def get_view(self, directives: DirectiveList) -> 'NginxConfig':
+        """
+        Get a view of this config in which lookups only see part of the
+        directive tree, e.g. a single server block. Sources and position
+        locators are shared with this config.
+
+        Args:
+            directives (DirectiveList): Part of the tree, see DirectiveList.subtree
+
+        Returns:
+            NginxConfig
+        """
+        view = copy(self)
+        view.directives = directives
+        view.index = directives.index
+        view._variables = None
+        view._inheritance = None
+        return view
 
     def __repr__(self) -> str:
         return str(self.raw)
 
 
+class PositionLocator:
+    """
+    Resolves the position of directives within a raw config.
+    The offset of every line start is computed once, so that each lookup
+    only has to scan the directive itself instead of the whole file.
+    """
+    QUOTES = '\'"'
+    DELIMITERS = ';{}'
+
+    def __init__(self, raw: str):
+        """
+        Args:
+            raw (str): Raw config file contents
+        """
+        self.raw: str = raw
+        self.line_starts: list[int] = [0]
+
+        newline_index = raw.find('\n')
+        while newline_index != -1:
+            self.line_starts.append(newline_index + 1)
+            newline_index = raw.find('\n', newline_index + 1)
+
+    def locate(self, directive_and_args: list[str], line_number: int) -> Optional[tuple[int, int]]:
+        """
+        Get the start and end index of a directive, relative to the start
+        of the line it is defined on. The end index may go past the end
+        of the line if the directive spans multiple lines.
+
+        Args:
+            directive_and_args (list[str]): Directive and its arguments
+            line_number (int): One-based line number of the directive. If not
+                               given, the first match in the file is returned
+
+        Returns:
+            tuple[int, int]: Start and end index of the directive, one-indexed.
+                             None if the directive could not be found
+        """
+        if line_number is None or not 1 <= line_number <= len(self.line_starts):
+            line_start = 0
+            line_end = len(self.raw)
+        else:
+            line_start = self.line_starts[line_number - 1]
+            line_end = self.raw.find('\n', line_start)
+            if line_end == -1:
+                line_end = len(self.raw)
+
+        # Walk the tokens of each occurrence of the directive name on the line
+        directive_name, args = directive_and_args[0], directive_and_args[1:]
+        name_index = self.raw.find(directive_name, line_start, line_end)
+        while name_index != -1:
+            if self._is_token_start(name_index):
+                end_index = self._match_args(name_index + len(directive_name), args)
+                if end_index is not None:
+                    return (name_index - line_start + 1, end_index - line_start + 1)
+            name_index = self.raw.find(directive_name, name_index + 1, line_end)
+
+        # Arguments were written in a form that cannot be compared literally
+        # (e.g. escaped quotes), fall back to a regex search
+        match = self._get_pattern(tuple(directive_and_args)).search(self.raw, line_start)
+        if match:
+            [start_index, end_index] = match.span()
+            return (start_index - line_start + 1, end_index - line_start + 1)
+
+        return None
+
+    def _is_token_start(self, index: int) -> bool:
+        return index == 0 or self.raw[index - 1].isspace() or self.raw[index - 1] in self.DELIMITERS
+
+    def _match_args(self, index: int, args: list[str]) -> Optional[int]:
+        """
+        Match arguments one by one starting from index, allowing for
+        irregular whitespace and quotes around each argument.
+
+        Returns:
+            int: Index right after the last argument, or None if not matched
+        """
+        raw = self.raw
+        length = len(raw)
+
+        for arg in args:
+            # Closing quote of the previous token
+            if index < length and raw[index] in self.QUOTES:
+                index += 1
+
+            whitespace_start = index
+            while index < length and raw[index].isspace():
+                index += 1
+            if index == whitespace_start:
+                return None
+
+            # Opening quote of the current token
+            if index < length and raw[index] in self.QUOTES:
+                index += 1
+
+            if not raw.startswith(arg, index):
+                return None
+            index += len(arg)
+
+        if index < length and raw[index] in self.QUOTES:
+            index += 1
+
+        return index
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _get_pattern(directive_and_args: tuple[str, ...]) -> re.Pattern:
+        # Form a regex string to handle irregular number of spaces / newline.
+        # Also account for quotes around each arg.
+        return re.compile(r'\s+'.join(['[\'\"]?{}[\'\"]?'.format(re.escape(arg)) for arg in directive_and_args]))
+
+
 class NginxConfigUtil:
+    @staticmethod
+    @lru_cache(maxsize=4)
+    def get_locator(config: str) -> PositionLocator:
+        """
+        Get a PositionLocator for raw config contents. Locators are cached,
+        so repeated lookups on the same contents share one line offset table.
+
+        Args:
+            config (str): Raw config file contents
+
+        Returns:
+            PositionLocator
+        """
+        return PositionLocator(config)
+
     @staticmethod
     def get_directive_position(config: str,
                                directive_and_args: list[str],
@@ -72,18 +365,4 @@ class NginxConfigUtil:
         Returns:
             tuple[int, int]: Start and end index of the directive, one-indexed
         """
-
-        # Form a regex string to handle irregular number of spaces / newline.
-        # Also account for quotes around each arg.
-        pattern = r'\s+'.join(['[\'\"]?{}[\'\"]?'.format(re.escape(arg)) for arg in directive_and_args])
-
-        # Using the specified line, create a substring that starts from that line.
-        # The directive being searched for could span multiple lines.
-        config_trimmed = '\n'.join(config.splitlines()[line_number-1:])
-        match = re.search(pattern, config_trimmed)
-
-        if match:
-            [start_index, end_index] = match.span()
-            return (start_index + 1, end_index + 1)
-
-        return None
+        return NginxConfigUtil.get_locator(config).locate(directive_and_args, line_number)
@@ -0,0 +1,377 @@
+"""
+Native lexer and parser of NGINX config files.
+
+Parses the text of a file already read by the loader in a single pass,
+tokenizing with one compiled regular expression instead of crossplane
+reading the file again and lexing it one character at a time, and
+records the span of every token as it goes. Directives are checked with
+crossplane's analyzer and tokens are parsed the way crossplane parses
+them, so the parsed nodes are the same as crossplane's (with spans
+added). Text the native parser does not handle exactly like crossplane,
+such as syntax errors, is parsed by crossplane instead.
+
+The text may also be given as the bytes of the file (e.g. a memory
+mapping, see mapped.py), in which case spans are byte offsets and tokens
+are decoded one at a time.
+"""
+
+import re
+from mmap import mmap
+from typing import Any, Iterator, Optional, Union
+
+import crossplane
+from crossplane.analyzer import CONTEXTS, DIRECTIVES, analyze, enter_block_ctx
+from crossplane.errors import NgxParserDirectiveError
+
+from .directive import DirectiveDict
+
+
+# Tokens as crossplane's lexer splits them, each with the whitespace
+# before it. Backslashes escape the next character everywhere, and a "${"
+# within a word starts a parameter expansion which may contain any
+# character up to the closing brace (and takes in the character after it,
+# even whitespace, as crossplane does)
+TOKEN_PATTERN = re.compile(r'''\s*(?:
+    (?P<word>(?:\\.|[^\s{};\\"'\#])(?:(?<=\$)\{(?:\\[^}]|[^\\}\s])*\\?\}\s?|\\.|[^\s{};\\])*)
+  | (?P<special>[{};])
+  | (?P<quoted>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<comment>\#(?P<comment_text>(?:\\[^\n]|[^\\\n])*)\\?\n?)
+  | \Z
+)''', re.VERBOSE | re.DOTALL)
+
+ESCAPED_CHARACTER = re.compile(r'\\(.)', re.DOTALL)
+
+BYTES_TOKEN_PATTERN = re.compile(TOKEN_PATTERN.pattern.encode(), re.VERBOSE | re.DOTALL)
+
+# Bytes which read differently once the file is decoded and read in text
+# mode, as crossplane reads it: separators and Unicode spaces, which are
+# whitespace to the text pattern only, and carriage returns, which text
+# mode turns into newlines
+UNSUPPORTED_BYTES = re.compile(rb'''[\r\x1c-\x1f] | \xc2[\x85\xa0] | \xe1\x9a\x80 | \xe2\x80[\x80-\x8a\xa8\xa9\xaf]
+                               | \xe2\x81\x9f | \xe3\x80\x80''', re.VERBOSE)
+
+
+class NativeParseError(Exception):
+    """
+    Raised on text the native parser does not parse exactly like
+    crossplane, e.g. unbalanced braces or a truncated directive
+    """
+
+
+def unquote(token: str) -> str:
+    """
+    Args:
+        token (str): Quoted token, e.g. "a \\"b\\" c"
+
+    Returns:
+        str: Text within the quotes, with escaped quotes unescaped
+    """
+    quote = token[0]
+    text = token[1:-1]
+    if '\\' in text:
+        text = ESCAPED_CHARACTER.sub(lambda escaped: quote if escaped.group(1) == quote
+                                     else escaped.group(), text)
+    return text
+
+
+class Parser:
+    """
+    Builds the parsed directives of one file in a single pass over its
+    text, tokenizing and parsing as crossplane.parse does for a single
+    file (with errors caught).
+
+    Each directive also gets "spans": the start and end offsets of its
+    name and of each argument, then the offset of its terminating ";",
+    "{" or "}", flattened into a tuple of integers.
+
+    Parsed directives are added to their block through append and
+    open_block, which subclasses may override to build other nodes than
+    dictionaries (see mapped.TreeBuilder).
+    """
+    def __init__(self, raw: Union[str, bytes, mmap], check_ctx: bool = True):
+        """
+        Args:
+            raw (str | bytes | mmap): Contents of the file, as text or as bytes
+            check_ctx (bool, optional): Drop directives that are not allowed
+                                        in their context. Included files are
+                                        parsed without, as their context
+                                        depends on where they are included.
+        """
+        self.raw: Union[str, bytes, mmap] = raw
+        self.check_ctx: bool = check_ctx
+        # Outcome of the analyzer (error message, None if valid), keyed by
+        # everything it looks at
+        self.analyzed: dict[tuple, Optional[str]] = {}
+
+    def parse(self) -> list[DirectiveDict]:
+        """
+        Raises:
+            NativeParseError: If the file cannot be parsed like crossplane does
+
+        Returns:
+            list[DirectiveDict]: Parsed directives, with spans
+        """
+        parsed: list[DirectiveDict] = []
+        for _ in self.run(parsed):
+            pass
+        return parsed
+
+    def append(self, block: Any, directive: DirectiveDict) -> Any:
+        """
+        Add a parsed directive (or comment) to a block.
+
+        Args:
+            block (Any): Block being filled, as returned by open_block
+            directive (DirectiveDict): Parsed directive
+
+        Returns:
+            Any: Node of the directive, passed to open_block if it opens a block
+        """
+        block.append(directive)
+        return directive
+
+    def open_block(self, node: Any) -> Any:
+        """
+        Args:
+            node (Any): Node of a directive opening a block, as returned by append
+
+        Returns:
+            Any: Block the directives within are added to
+        """
+        node['block'] = []
+        return node['block']
+
+    def run(self, root: Any) -> Iterator[Any]:
+        """
+        Parse the file, adding its top-level directives to root.
+
+        Args:
+            root (Any): Block to add the top-level directives to
+
+        Yields:
+            Any: Node of each directive and comment, as returned by append,
+                 as soon as it is added and before the directives within it
+
+        Raises:
+            NativeParseError: If the file cannot be parsed like crossplane does
+        """
+        raw = self.raw
+        end = len(raw)
+        binary = not isinstance(raw, str)
+        if binary:
+            if UNSUPPORTED_BYTES.search(raw):
+                raise NativeParseError('carriage return or whitespace outside ASCII')
+            newline = b'\n'
+            # Memory mappings have no count method
+            count = lambda sub, start, stop: raw[start:stop].count(sub)
+        else:
+            newline = '\n'
+            count = raw.count
+        append = self.append
+        open_block = self.open_block
+        line = 1
+        line_offset = 0
+        position = 0
+
+        # Blocks being filled, innermost last, along with their contexts
+        blocks: list[tuple[Any, tuple]] = [(root, ())]
+        block, ctx = blocks[-1]
+        # Braces opened and not closed yet, counted like crossplane's lexer
+        # does, which may differ from the nesting of the blocks
+        depth = 0
+        # Depth of the blocks being skipped over, 0 if none
+        skipping = 0
+        # Directive whose arguments are being read, None between directives
+        directive: Optional[DirectiveDict] = None
+        args: list[str] = []
+        spans: list[int] = []
+        comments: list[str] = []
+
+        for match in (BYTES_TOKEN_PATTERN if binary else TOKEN_PATTERN).finditer(raw):
+            if match.start() != position:
+                # e.g. a lone backslash, or a quote never closed
+                raise NativeParseError(f'unexpected character at offset {position}')
+            kind = match.lastgroup
+            position = match.end()
+            if kind is None:
+                # Trailing whitespace
+                break
+
+            start = match.start(kind)
+            line += count(newline, line_offset, start)
+            line_offset = start
+            quoted = False
+
+            if kind == 'word':
+                if position == end:
+                    # crossplane drops a word cut off by the end of the file
+                    break
+                text = match.group(kind)
+                if binary:
+                    text = text.decode()
+                if text[-1] == '$' and raw[position:position + 1] in ('{', b'{'):
+                    raise NativeParseError(f'unterminated parameter expansion at line {line}')
+            elif kind == 'special':
+                text = match.group(kind)
+                if binary:
+                    text = text.decode()
+                if text == '{':
+                    depth += 1
+                elif text == '}':
+                    depth -= 1
+                    if depth < 0:
+                        raise NativeParseError(f'unexpected "}}" at line {line}')
+            elif kind == 'quoted':
+                quoted = True
+                text = match.group(kind)
+                text = unquote(text.decode() if binary else text)
+            else:
+                if raw[position - 1:position] != newline:
+                    # crossplane drops a comment cut off by the end of the file
+                    break
+                # Without the (possibly escaped) newline ending it
+                if directive is not None and not skipping:
+                    comment = match.group('comment_text')
+                    comments.append(comment.decode() if binary else comment)
+                continue
+
+            if skipping:
+                if kind == 'special':
+                    if text == '{':
+                        skipping += 1
+                    elif text == '}':
+                        skipping -= 1
+                continue
+
+            if directive is None:
+                if kind == 'special' and text == '}':
+                    if len(blocks) == 1:
+                        # Closes a block whose directive was dropped. At top
+                        # level, crossplane stops parsing the file there
+                        return
+                    blocks.pop()
+                    block, ctx = blocks[-1]
+                    continue
+                # crossplane counts the line of an escaped newline before
+                # the token it starts
+                directive = {'directive': text,
+                             'line': line + 1 if kind == 'word' and text.startswith('\\\n') else line,
+                             'args': []}
+                args = directive['args']
+                spans = [start, position]
+                continue
+
+            if kind != 'special':
+                args.append(text)
+                spans += (start, position)
+                continue
+
+            # The directive is complete
+            spans.append(start)
+            if directive['directive'] == 'if':
+                self._prepare_if_args(args, spans)
+
+            error = self._analyze(directive, text, ctx)
+            if error is not None:
+                # A block where a ";" was expected is skipped as a whole
+                if error.endswith(' is not terminated by ";"'):
+                    if text == '{':
+                        skipping = 1
+                    elif text == '}':
+                        if len(blocks) == 1:
+                            return
+                        blocks.pop()
+                        block, ctx = blocks[-1]
+            else:
+                directive['spans'] = tuple(spans)
+                node = append(block, directive)
+                yield node
+                # crossplane keeps comments found within arguments, after the directive
+                for comment in comments:
+                    yield append(block, {'directive': '#', 'line': directive['line'], 'args': [], 'comment': comment})
+                if text == '{':
+                    blocks.append((open_block(node), enter_block_ctx(directive, ctx)))
+                    block, ctx = blocks[-1]
+
+            directive = None
+            if comments:
+                comments = []
+
+        if position != end:
+            raise NativeParseError(f'unexpected character at offset {position}')
+        if directive is not None:
+            raise NativeParseError(f'unexpected end of file at line {line}')
+        if depth > 0:
+            raise NativeParseError('unexpected end of file, expecting "}"')
+
+    def _analyze(self, directive: DirectiveDict, terminator: str, ctx: tuple) -> Optional[str]:
+        # The analyzer leaves unknown directives and contexts alone
+        if directive['directive'] not in DIRECTIVES or ctx not in CONTEXTS:
+            return None
+
+        args = directive['args']
+        key = (directive['directive'], terminator, ctx, len(args),
+               args[0].lower() if len(args) == 1 else None)
+        if key not in self.analyzed:
+            try:
+                analyze(fname=None, stmt=directive, term=terminator, ctx=ctx, check_ctx=self.check_ctx)
+                self.analyzed[key] = None
+            except NgxParserDirectiveError as error:
+                self.analyzed[key] = error.strerror
+        return self.analyzed[key]
+
+    def _prepare_if_args(self, args: list[str], spans: list[int]) -> None:
+        # Remove the parentheses around the condition of an if directive,
+        # shrinking the spans of the first and last arguments to match
+        # (unless the parentheses are within quotes)
+        if not args or not args[0].startswith('(') or not args[-1].endswith(')'):
+            return
+
+        stripped = args[0][1:].lstrip()
+        if self.raw[spans[2]:spans[2] + 1] in ('(', b'('):
+            spans[2] += len(args[0]) - len(stripped)
+        args[0] = stripped
+
+        stripped = args[-1][:-1].rstrip()
+        if self.raw[spans[-2] - 1:spans[-2]] in (')', b')'):
+            spans[-2] -= len(args[-1]) - len(stripped)
+        args[-1] = stripped
+
+        first = int(not args[0])
+        last = len(args) - int(not args[-1])
+        spans[2:-1] = spans[2 + first * 2:2 + last * 2]
+        args[:] = args[first:last]
+
+
+def parse(raw: Union[str, bytes, mmap], filepath: str, check_ctx: bool = True) -> list[DirectiveDict]:
+    """
+    Parse a single file, without following its includes.
+
+    Args:
+        raw (str | bytes | mmap): Contents of the file
+        filepath (str): Path to the file, which crossplane reads again if
+                        the native parser cannot parse it
+        check_ctx (bool, optional): Drop directives that are not allowed in
+                                    their context
+
+    Returns:
+        list[DirectiveDict]: Parsed directives. Directives parsed natively
+                             have spans, those parsed by crossplane do not
+    """
+    try:
+        return Parser(raw, check_ctx).parse()
+    except NativeParseError:
+        return parse_with_crossplane(filepath, check_ctx)
+
+
+def parse_with_crossplane(filepath: str, check_ctx: bool = True) -> list[DirectiveDict]:
+    """
+    Args:
+        filepath (str): Path to a single file, read again by crossplane
+        check_ctx (bool, optional): Drop directives that are not allowed in
+                                    their context
+
+    Returns:
+        list[DirectiveDict]: Parsed directives, without spans
+    """
+    return crossplane.parse(filepath, single=True, check_ctx=check_ctx)["config"][0]["parsed"]
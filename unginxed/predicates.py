@@ -0,0 +1,119 @@
+"""
+Memoized predicates shared by signatures.
+
+Large configs repeat the same arguments over and over (e.g. the same regex
+location in every virtual host), so results are cached per argument in
+bounded LRU caches instead of being recomputed for every directive.
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from .directive import Directive
+
+
+# Longest first, so that "~*/path" is not read as "~" and "*/path"
+REGEX_LOCATION_MODIFIERS = ('~*', '~')
+LOCATION_MODIFIERS = ('=', '^~', *REGEX_LOCATION_MODIFIERS)
+
+# $name or ${name}, NGINX variable names being made of word characters
+VARIABLE_PATTERN = re.compile(r'\$(?:\{(\w+)\}|(\w+))')
+
+
+@lru_cache(maxsize=4096)
+def has_capture_groups(pattern: str) -> bool:
+    """
+    Args:
+        pattern (str): Regular expression, e.g. the arguments of a location
+
+    Returns:
+        bool: Whether the expression has capture groups. False if it is not
+              a valid (Python) regular expression
+    """
+    try:
+        return re.compile(pattern).groups != 0
+    except re.error:
+        return False
+
+
+def parse_location(location: Directive) -> tuple[Optional[str], str]:
+    """
+    Args:
+        location (Directive): location directive
+
+    Returns:
+        tuple[Optional[str], str]: Modifier (=, ^~, ~ or ~*, None for plain
+                                   prefix locations) and the URI or regex
+    """
+    args = location.args
+    if len(args) >= 2 and args[0] in LOCATION_MODIFIERS:
+        return args[0], args[1]
+    # The modifier may also be written without a space, e.g. "location =/"
+    for modifier in LOCATION_MODIFIERS:
+        if args and args[0].startswith(modifier) and len(args[0]) > len(modifier):
+            return modifier, args[0][len(modifier):]
+    return None, args[0] if args else ''
+
+
+def is_regex_location(location: Directive) -> bool:
+    """
+    Args:
+        location (Directive): location directive
+
+    Returns:
+        bool: Whether the location is matched by regular expression (~ or ~*)
+    """
+    return parse_location(location)[0] in REGEX_LOCATION_MODIFIERS
+
+
+@lru_cache(maxsize=8192)
+def get_variables(arg: str) -> frozenset[str]:
+    """
+    Args:
+        arg (str): Directive argument
+
+    Returns:
+        frozenset[str]: Names of the variables the argument references, without the $
+    """
+    if '$' not in arg:
+        return frozenset()
+    return frozenset(braced or plain for braced, plain in VARIABLE_PATTERN.findall(arg))
+
+
+def references_variable(args: Iterable[str], *variable_names: str) -> bool:
+    """
+    Args:
+        args (Iterable[str]): Directive arguments
+        *variable_names (str): Variable names, without the $
+
+    Returns:
+        bool: Whether any argument references any of the variables
+    """
+    return any(not get_variables(arg).isdisjoint(variable_names) for arg in args)
+
+
+@lru_cache(maxsize=256)
+def get_tokens_pattern(tokens: tuple[str, ...]) -> re.Pattern:
+    """
+    Args:
+        tokens (tuple[str, ...]): Literal substrings
+
+    Returns:
+        re.Pattern: Single pattern matching any of the tokens
+    """
+    return re.compile('|'.join(re.escape(token) for token in tokens))
+
+
+def contains_any(text: str, tokens: tuple[str, ...]) -> bool:
+    """
+    Args:
+        text (str): Text to search, e.g. the joined arguments of a directive
+        tokens (tuple[str, ...]): Literal substrings to search for
+
+    Returns:
+        bool: Whether the text contains any of the tokens
+    """
+    if not tokens:
+        return False
+    return get_tokens_pattern(tokens).search(text) is not None
@@ -0,0 +1,248 @@
+"""
+Opt-in instrumentation of the scan phases, enabled with --profile.
+
+The hot paths call profile(<phase name>) around their work, which does
+nothing unless a Profiler was started with start_profiling(). Phases
+nest: the time and allocations of a phase include those of the phases
+run within it (e.g. position resolution within a signature), while the
+"self" figures leave them out.
+"""
+
+import json
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from time import perf_counter
+from typing import ContextManager, Iterator, Optional
+
+
+@dataclass
+class PhaseStats:
+    """
+    Data class that represents the measurements of one phase, summed
+    over every time it ran
+    """
+    name: str
+    calls: int = 0
+    # Seconds
+    total_time: float = 0.0
+    self_time: float = 0.0
+    # Bytes still allocated at the end of the phase, and highest memory
+    # use during the phase, both relative to the start of the phase
+    allocated: int = 0
+    self_allocated: int = 0
+    peak: int = 0
+
+
+class _Frame:
+    """
+    A phase that is running
+    """
+    __slots__ = ('name', 'start_time', 'start_memory', 'peak_memory', 'child_time', 'child_allocated')
+
+    def __init__(self, name: str, start_time: float, start_memory: int):
+        self.name: str = name
+        self.start_time: float = start_time
+        self.start_memory: int = start_memory
+        self.peak_memory: int = start_memory
+        self.child_time: float = 0.0
+        self.child_allocated: int = 0
+
+
+class Profiler:
+    """
+    Records wall time and, through tracemalloc, allocations of the
+    phases of a scan. Optionally runs cProfile over the same span.
+    """
+    def __init__(self, track_allocations: bool = True, cprofile_path: Optional[str] = None):
+        """
+        Args:
+            track_allocations (bool, optional): Trace allocations, which slows
+                                                the scan down considerably
+            cprofile_path (str, optional): If given, cProfile statistics are
+                                           dumped to this file when stopped
+        """
+        self.track_allocations: bool = track_allocations
+        self.cprofile_path: Optional[str] = cprofile_path
+        self.stats: dict[str, PhaseStats] = {}
+        self.wall_time: float = 0.0
+        # Time spent in outermost phases
+        self.phase_time: float = 0.0
+        self._stack: list[_Frame] = []
+        self._start_time: float = 0.0
+        self._cprofile = None
+
+    def start(self) -> None:
+        if self.track_allocations:
+            # Imported here, as every CLI run imports this module
+            import tracemalloc
+            tracemalloc.start()
+        if self.cprofile_path:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._start_time = perf_counter()
+
+    def stop(self) -> None:
+        self.wall_time = perf_counter() - self._start_time
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_path)
+            self._cprofile = None
+        if self.track_allocations:
+            import tracemalloc
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Measure the enclosed block as one run of the named phase.
+
+        Args:
+            name (str): Phase name, e.g. "parse" or "signature:ssrf"
+        """
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def _get_memory(self) -> tuple[int, int]:
+        if not self.track_allocations:
+            return 0, 0
+        import tracemalloc
+        return tracemalloc.get_traced_memory()
+
+    def _reset_peak(self) -> None:
+        if self.track_allocations:
+            import tracemalloc
+            tracemalloc.reset_peak()
+
+    def _enter(self, name: str) -> None:
+        current, peak = self._get_memory()
+        # The peak is reset for every phase, so fold the peak reached so
+        # far into the enclosing phase first
+        if self._stack:
+            self._stack[-1].peak_memory = max(self._stack[-1].peak_memory, peak)
+        self._reset_peak()
+        self._stack.append(_Frame(name, perf_counter(), current))
+
+    def _exit(self) -> None:
+        end_time = perf_counter()
+        current, peak = self._get_memory()
+        frame = self._stack.pop()
+        frame.peak_memory = max(frame.peak_memory, peak)
+
+        elapsed = end_time - frame.start_time
+        allocated = current - frame.start_memory
+        stats = self.stats.setdefault(frame.name, PhaseStats(frame.name))
+        stats.calls += 1
+        stats.total_time += elapsed
+        stats.self_time += elapsed - frame.child_time
+        stats.allocated += allocated
+        stats.self_allocated += allocated - frame.child_allocated
+        stats.peak = max(stats.peak, frame.peak_memory - frame.start_memory)
+
+        if self._stack:
+            parent = self._stack[-1]
+            parent.child_time += elapsed
+            parent.child_allocated += allocated
+            parent.peak_memory = max(parent.peak_memory, frame.peak_memory)
+        else:
+            self.phase_time += elapsed
+        self._reset_peak()
+
+    def get_stats(self) -> list[PhaseStats]:
+        """
+        Returns:
+            list[PhaseStats]: Stats of every phase, by self time, slowest first
+        """
+        return sorted(self.stats.values(), key=lambda stats: stats.self_time, reverse=True)
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: JSON-serializable breakdown, times in seconds and memory in bytes
+        """
+        return {
+            "wall_time": self.wall_time,
+            "phase_time": self.phase_time,
+            "track_allocations": self.track_allocations,
+            "phases": [asdict(stats) for stats in self.get_stats()],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def format_table(self) -> str:
+        """
+        Returns:
+            str: Plain text table of the breakdown, slowest phase first
+        """
+        header = f'{"Phase":<40} {"Calls":>7} {"Total ms":>10} {"Self ms":>10} {"Self %":>7}'
+        if self.track_allocations:
+            header += f' {"Alloc KiB":>11} {"Peak KiB":>10}'
+        lines = [header, '-' * len(header)]
+
+        for stats in self.get_stats():
+            share = stats.self_time / self.wall_time * 100 if self.wall_time else 0.0
+            line = (f'{stats.name:<40} {stats.calls:>7} {stats.total_time * 1000:>10.2f} '
+                    f'{stats.self_time * 1000:>10.2f} {share:>6.1f}%')
+            if self.track_allocations:
+                line += f' {stats.self_allocated / 1024:>11.1f} {stats.peak / 1024:>10.1f}'
+            lines.append(line)
+
+        untracked = max(self.wall_time - self.phase_time, 0.0)
+        lines.append('-' * len(header))
+        lines.append(f'{"Outside of any phase":<40} {"":>7} {untracked * 1000:>10.2f}')
+        lines.append(f'{"Wall time":<40} {"":>7} {self.wall_time * 1000:>10.2f}')
+        return '\n'.join(lines)
+
+
+_profiler: Optional[Profiler] = None
+_not_profiling = nullcontext()
+
+
+def start_profiling(track_allocations: bool = True, cprofile_path: Optional[str] = None) -> Profiler:
+    """
+    Start a profiler that the phases of this process report to.
+
+    Args:
+        track_allocations (bool, optional): See Profiler
+        cprofile_path (str, optional): See Profiler
+
+    Returns:
+        Profiler: The started profiler
+    """
+    global _profiler
+    _profiler = Profiler(track_allocations, cprofile_path)
+    _profiler.start()
+    return _profiler
+
+
+def stop_profiling() -> Optional[Profiler]:
+    """
+    Returns:
+        Profiler: The stopped profiler, None if none was started
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def profile(name: str) -> ContextManager:
+    """
+    Args:
+        name (str): Phase name
+
+    Returns:
+        ContextManager: Measures the enclosed block if profiling, else does nothing
+    """
+    if _profiler is None:
+        return _not_profiling
+    return _profiler.phase(name)
@@ -1,19 +1,45 @@
 import re
 from base64 import b64encode
+from bisect import bisect_right
 from datetime import datetime
 from os import path
 from pathlib import Path
+from typing import Optional
 from rich.console import Console
 from rich.table import Table
 from rich.text import Text
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from xhtml2pdf import pisa
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
 
 from .nginx_config import NginxConfig
+from .profiling import profile
 from .signature import Signature, SignatureUtil, Severity
 
 
+_DIRECTIVE_END_PATTERN = re.compile(r".+?[\{;]", re.DOTALL)
+
+REPORT_FORMATS = ('pdf', 'html')
+
+# Passed in from python as these xhtml-specific styles
+# cause linting problems in the html template
+PDF_STYLES = """
+@page {
+    size: a4 portrait;
+
+    @frame content_frame {
+        left: 45pt; width: 512pt; top: 90pt; height: 632pt;
+    }
+
+    @frame footer_frame {
+        -pdf-frame-content: footer_content;
+        left: 0pt;
+        width: 512pt;
+        top: 772pt;
+        height: 20pt;
+    }
+}
+""".strip()
+
 severity_color_mapping: dict[Severity, str] = {
     Severity.INFORMATION: 'yellow1',
     Severity.WARNING: 'orange1',
@@ -21,157 +47,315 @@ severity_color_mapping: dict[Severity, str] = {
 }
 
 
-def generate_pdf_report(config: NginxConfig, signature_results: list[Signature], output_folder='reports') -> str:
+def annotate_config_lines(config: NginxConfig, signature_results: list[Signature],
+                          filepath: Optional[str] = None) -> list[Optional[Signature]]:
     """
-    Generates a PDF report of misconfigurations.
+    Computes, in one pass over the flagged directives, which signature
+    (if any) each line of the configuration file should be highlighted for.
+    A flagged directive spans from its line until the { or ; that ends it
+    (outside of quotes), so continuation lines of multi-line directives
+    are highlighted as well. The line of the { or ; is recorded when the
+    directive is flagged, and only searched for in results that lack it.
 
     Args:
         config (NginxConfig): NginxConfig object
         signature_results (list[Signature]): Signature results
-        output_folder (str, optional): Folder to write reports to. Defaults to 'reports'.
+        filepath (str, optional): Main config file or an included file to
+                                  annotate. Defaults to the main config file.
 
     Returns:
-        str: Absolute file path of report created
+        list[Optional[Signature]]: Signature for each line, indexed by
+                                   zero-indexed line number
     """
+    filepath = filepath or config.filepath
+    num_lines = config.get_num_lines(filepath)
+    line_signatures: list[Optional[Signature]] = [None] * num_lines
+    line_to_signature_mapping = SignatureUtil.get_line_to_signature_mapping(signature_results, filepath)
+
+    # Lines are visited in ascending order. Flagged lines take precedence
+    # over continuation lines of a previously flagged directive.
+    flagged_line_numbers = sorted(line_number for line_number in line_to_signature_mapping
+                                  if line_number is not None and 1 <= line_number <= num_lines)
+    flagged_line_number_set = set(flagged_line_numbers)
+
+    # Last line of the directives flagged on each line
+    line_ends: dict[int, int] = {}
+    for signature in signature_results:
+        for flagged in signature.flagged:
+            if flagged.get("line_end") is not None and SignatureUtil.is_flagged_in(flagged, filepath):
+                line_ends[flagged["line"]] = max(line_ends.get(flagged["line"], 0), flagged["line_end"])
+
+    for line_number in flagged_line_numbers:
+        signature = line_to_signature_mapping[line_number]
+        line_signatures[line_number - 1] = signature
+
+        if line_number in line_ends:
+            for continuation_line_number in range(line_number + 1, min(line_ends[line_number], num_lines) + 1):
+                if continuation_line_number in flagged_line_number_set:
+                    break
+                line_signatures[continuation_line_number - 1] = signature
+            continue
+
+        # Directives without spans are matched in the text of the file
+        locator = config.get_locator(filepath)
+        raw, line_starts = locator.raw, locator.line_starts
+        line_start = line_starts[line_number - 1]
+        line_end = line_starts[line_number] - 1 if line_number < len(line_starts) else len(raw)
+        quote_search_result = re.search(r'([\'\"])', raw[line_start:line_end])
+
+        if quote_search_result:
+            # Either single quote or double quote
+            quote_character = quote_search_result.group(1)
+            pattern = re.compile(f".+?{quote_character}\\s*[\\{{;]", re.DOTALL)
+        else:
+            pattern = _DIRECTIVE_END_PATTERN
+
+        # Match until { or ; that is not enclosed between quotes
+        match = pattern.match(raw, line_start)
+        if match is None:
+            continue
+        subconfig = match.group()
+        last_line_number = bisect_right(line_starts, match.end() - 1)
+
+        for continuation_line_number in range(line_number + 1, last_line_number + 1):
+            if continuation_line_number in flagged_line_number_set:
+                break
+            continuation_start = line_starts[continuation_line_number - 1]
+            continuation_end = line_starts[continuation_line_number] - 1 \
+                if continuation_line_number < len(line_starts) else len(raw)
+            # Check for overlap between the current line and the subconfig
+            continuation_line = raw[continuation_start:continuation_end].strip()
+            if continuation_line and continuation_line in subconfig:
+                line_signatures[continuation_line_number - 1] = signature
+
+    return line_signatures
+
+
+def split_line(line: str) -> tuple[str, str, str]:
+    """
+    Args:
+        line (str): A line of NGINX configuration
 
-    # Prepare to load HTML from jinja template
-    jinja_env = Environment(
-        loader=FileSystemLoader(path.join(Path(__file__).parent, 'templates')),
-        autoescape=select_autoescape()
-    )
+    Returns:
+        tuple[str, str, str]: Leading whitespace, content, trailing whitespace
+    """
+    content = line.strip()
+    indentation_length = len(line) - len(line.lstrip())
+    return line[:indentation_length], content, line[indentation_length + len(content):]
+
+
+class ReportGenerator:
+    """
+    Renders reports of scanned configs. The compiled template and the
+    cover page logo are loaded once per generator (and once per worker
+    process when the generator is handed to batch scans), rather than
+    once per report.
+    """
+    def __init__(self, output_folder: str = 'reports', output_format: str = 'pdf'):
+        """
+        Args:
+            output_folder (str, optional): Folder to write reports to. Defaults to 'reports'.
+            output_format (str, optional): 'pdf', or 'html' to skip the PDF conversion
+                                           (see ReportGenerator.convert_to_pdf to
+                                           convert HTML reports later on)
+        """
+        if output_format not in REPORT_FORMATS:
+            raise ValueError(f'Unknown report format "{output_format}"')
+        self.output_folder: str = output_folder
+        self.output_format: str = output_format
+        self._template: Optional[Template] = None
+        self._logo_url: Optional[str] = None
+
+    def __getstate__(self) -> dict:
+        # Compiled templates cannot be pickled, each process loads its own
+        state = self.__dict__.copy()
+        state['_template'] = None
+        return state
+
+    @property
+    def template(self) -> Template:
+        if self._template is None:
+            jinja_env = Environment(
+                loader=FileSystemLoader(path.join(Path(__file__).parent, 'templates')),
+                autoescape=select_autoescape()
+            )
+            self._template = jinja_env.get_template('report.html')
+        return self._template
 
-    template = jinja_env.get_template('report.html')
+    @property
+    def logo_url(self) -> str:
+        """
+        Returns:
+            str: Base64 data URL of the cover page logo
+        """
+        if self._logo_url is None:
+            with open(path.join(Path(__file__).parent, 'static', 'img', 'nginx.png'), 'rb') as f:
+                self._logo_url = f'data:image/png;base64,{b64encode(f.read()).decode()}'
+        return self._logo_url
 
-    # Pass in pdf styles from python as these xhtml-specific styles
-    # cause linting problems in the html template
-    pdf_styles = """
-    @page {
-        size: a4 portrait;
+    def render_html(self, config: NginxConfig, signature_results: list[Signature]) -> str:
+        """
+        Args:
+            config (NginxConfig): NginxConfig object
+            signature_results (list[Signature]): Signature results
 
-        @frame content_frame {
-            left: 45pt; width: 512pt; top: 90pt; height: 632pt;
+        Returns:
+            str: HTML source of the report
+        """
+        line_signatures_by_file = {
+            filepath: annotate_config_lines(config, signature_results, filepath)
+            for filepath in config.sources
         }
 
-        @frame footer_frame {
-            -pdf-frame-content: footer_content;
-            left: 0pt;
-            width: 512pt;
-            top: 772pt;
-            height: 20pt;
-        }
-    }
-    """.strip()
+        def process_config_line(line: str, line_number: int, filepath: Optional[str] = None) -> str:
+            """
+            Takes in a line from the configuration file.
+            The line could contain curly braces, whitespace, letters and numbers.
+
+            Args:
+                line (str): A line of NGINX configuration
+                line_number (int): one-indexed line number
+                filepath (str, optional): File the line belongs to. Defaults to
+                                          the main config file
+
+            Returns:
+                str: HTML string to be used in the template. Can be marked as safe
+            """
+            if len(line.strip()) == 0:
+                return ''
+
+            # Red text and link for flagged directives, including continuation
+            # lines of multi-line flagged directives
+            line_signatures = line_signatures_by_file[filepath or config.filepath]
+            signature = line_signatures[line_number - 1] if line_number <= len(line_signatures) else None
+
+            if signature is not None:
+                # Inject "flagged" css around the line, leaving its indentation out
+                indentation, content, rest = split_line(line)
+                modified_line = f'{indentation}<a href="{signature.reference_url}" ' \
+                                f'class="{severity_color_mapping[signature.severity]}">{content}</a>{rest}'
+            else:
+                # This line is a start of a directive, not a continuation
+                modified_line = re.sub(r'^(\s*)([a-z_]+)', r'\g<1><span class="directive">\g<2></span>', line, count=1)
 
-    # Load image base64 data url
-    with open(path.join(Path(__file__).parent, 'static', 'img', 'nginx.png'), 'rb') as f:
-        cover_page_logo_url = f'data:image/png;base64,{b64encode(f.read()).decode()}'
+            # Use regex to color comments (everything after a hash #)
+            modified_line = re.sub(r'(#.*)', r'<span class="comment">\g<1></span>', modified_line)
 
-    def process_config_line(line: str, line_number: int) -> str:
+            return modified_line or line
+
+        return self.template.render(
+            signatures=signature_results,
+            config=config,
+            pdf_styles=PDF_STYLES,
+            logo_url=self.logo_url,
+            process_config_line=process_config_line,
+            get_qualified_line=lambda flagged: SignatureUtil.get_qualified_line(flagged, config.filepath)
+        )
+
+    def write_report(self, config: NginxConfig, signature_results: list[Signature],
+                     output_folder: Optional[str] = None) -> str:
         """
-        Takes in a line from the configuration file.
-        The line could contain curly braces, whitespace, letters and numbers.
+        Render a report and write it to the output folder.
 
         Args:
-            line (str): A line of NGINX configuration
-            line_number (int): zero-indexed line number
+            config (NginxConfig): NginxConfig object
+            signature_results (list[Signature]): Signature results
+            output_folder (str, optional): Overrides the generator's output folder
 
         Returns:
-            str: HTML string to be used in the template. Can be marked as safe
+            str: Absolute file path of report created
         """
-        if len(line.strip()) == 0:
-            return ''
-
-        # Red text and link for flagged directives
-        line_to_signature_mapping = SignatureUtil.get_line_to_signature_mapping(signature_results)
-        line_to_flagged_mapping = SignatureUtil.get_line_to_flagged_mapping(signature_results) 
-        flagged = line_to_flagged_mapping.get(line_number)
-        signature = line_to_signature_mapping.get(line_number)
-
-        if flagged is not None and signature is not None:
-            # Form a regex pattern to inject "flagged" css
-            pattern = r'([^\s]*)' + '(' + re.escape(line.strip()) + ')'
-            modified_line = re.sub(pattern, r'\g<1><a href="{}" class="{}">\g<2></a>'.format(signature.reference_url, severity_color_mapping[signature.severity]), line, count=1)
-        else:
-            # If first attempt on retrieving flagged directive by line number fails,
-            # try to perform a regex search from nearest flagged line number.
-            # The current line may be a continuation of the previous line
-            # TODO: Check that a directive has been fully output to the report,
-            #       for optimization
-
-            # Copy line_to_flagged_mapping and sort it in ascending order
-            flagged_lines_sorted = list(line_to_flagged_mapping.keys())
-            flagged_lines_sorted.sort(reverse=True)
-
-            # Iterate through the list from end to start, until we get a
-            # line number smaller than the current line number
-            previously_flagged_line_number = -1
-
-            for i in range(len(flagged_lines_sorted)):
-                flagged_line_number = flagged_lines_sorted[i]
-                if flagged_line_number < line_number:
-                    previously_flagged_line_number = flagged_line_number
-                    break
-
-            # If previously_flagged_line_number > -1, get substring from
-            # that previously flagged line until the next semicolon
-            if previously_flagged_line_number > -1:
-                lines = config.raw.splitlines()
-                flagged_first_line = lines[previously_flagged_line_number - 1]
-                quote_search_result = re.search(r'([\'\"])', flagged_first_line)
-
-                pattern_with_quote = None
-                if quote_search_result:
-                    # Either single quote or double quote
-                    quote_character = quote_search_result.group(1)
-                    pattern_with_quote = f"^.+?{quote_character}\s*[\\{{;]"
-                
-                pattern = pattern_with_quote if pattern_with_quote else r"^.+?[\{;]"
-
-                # Match until { or ; that is not enclosed between quotes
-                subconfig = re.match(
-                    pattern,
-                    "\n".join(lines[previously_flagged_line_number - 1 :]),
-                    re.DOTALL,
-                ).group()
-
-                # Check for overlap between the current line and the subconfig
-                pattern = re.compile(r'([^\s]*)' + '(' + re.escape(line.strip()) + ')')
-                match = pattern.search(subconfig)
-                if match:
-                    # Inject "flagged" CSS
-                    signature = line_to_signature_mapping.get(previously_flagged_line_number)
-                    modified_line = re.sub(pattern, r'\g<1><a href="{}" class="{}">\g<2></a>'.format(signature.reference_url, severity_color_mapping[signature.severity]), line, count=1)
-                else:
-                    # This line is a start of a directive, not a continuation
-                    modified_line = re.sub(r'^(\s*)([a-z_]+)', r'\g<1><span class="directive">\g<2></span>', line, count=1)
+        with profile('report:html'):
+            source_html = self.render_html(config, signature_results)
+
+        output_folder = output_folder or self.output_folder
+        Path(output_folder).mkdir(parents=True, exist_ok=True)
+        output_stem = path.join(output_folder, f'{config.filename}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}')
+
+        # Reports of same-named configs may be written within the same second,
+        # possibly by other processes, so files are created exclusively
+        suffix = 0
+        while True:
+            output_path = f'{output_stem}{f"_{suffix}" if suffix else ""}.{self.output_format}'
+            try:
+                f = open(output_path, 'xb')
+                break
+            except FileExistsError:
+                suffix += 1
+
+        with f:
+            if self.output_format == 'html':
+                f.write(source_html.encode())
             else:
-                # This line is a start of a directive, not a continuation
-                modified_line = re.sub(r'^(\s*)([a-z_]+)', r'\g<1><span class="directive">\g<2></span>', line, count=1)
+                with profile('report:pdf'):
+                    ReportGenerator.write_pdf(source_html, f)
 
-        # Use regex to color comments (everything after a hash #)
-        modified_line = re.sub(r'(#.*)', r'<span class="comment">\g<1></span>', modified_line)
+        return path.abspath(output_path)
 
-        return modified_line or line
+    @staticmethod
+    def write_pdf(source_html: str, dest) -> None:
+        """
+        Args:
+            source_html (str): HTML source of a report
+            dest: Binary file object to write the PDF to
+        """
+        # Imported here, as xhtml2pdf is slow to import and not needed for HTML reports
+        from xhtml2pdf import pisa
+        pisa.CreatePDF(source_html, dest=dest)
 
-    source_html = template.render(
-        signatures=signature_results,
-        config=config,
-        pdf_styles=pdf_styles,
-        logo_url=cover_page_logo_url,
-        process_config_line=process_config_line
-    )
+    @staticmethod
+    def convert_to_pdf(html_path: str, pdf_path: Optional[str] = None) -> str:
+        """
+        Convert an HTML report into a PDF report, e.g. for reports written
+        with output_format='html' to defer the conversion.
+
+        Args:
+            html_path (str): Path of the HTML report
+            pdf_path (str, optional): Defaults to html_path with a .pdf extension
 
-    # Ensure output path exists
-    Path(output_folder).mkdir(parents=True, exist_ok=True)
+        Returns:
+            str: Absolute file path of the PDF report
+        """
+        pdf_path = pdf_path or f'{path.splitext(html_path)[0]}.pdf'
+        with open(html_path, 'rb') as f:
+            source_html = f.read().decode()
+        with open(pdf_path, 'w+b') as f:
+            ReportGenerator.write_pdf(source_html, f)
+        return path.abspath(pdf_path)
+
+
+# Shared by generate_pdf_report calls, so that the template is compiled once
+_report_generator: Optional[ReportGenerator] = None
+
+
+def generate_pdf_report(config: NginxConfig, signature_results: list[Signature], output_folder='reports') -> str:
+    """
+    Generates a PDF report of misconfigurations.
+
+    Args:
+        config (NginxConfig): NginxConfig object
+        signature_results (list[Signature]): Signature results
+        output_folder (str, optional): Folder to write reports to. Defaults to 'reports'.
 
-    output_path = path.join(output_folder, f'{config.filename}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.pdf')
+    Returns:
+        str: Absolute file path of report created
+    """
+    global _report_generator
+    if _report_generator is None:
+        _report_generator = ReportGenerator()
+    return _report_generator.write_report(config, signature_results, output_folder)
 
-    with open(output_path, 'w+b') as f:
-        pisa.CreatePDF(source_html, dest=f)
 
-    return path.abspath(output_path)
+def report_summary_cli(signature_results: list[Signature], filepath: Optional[str] = None):
+    """
+    Prints a table of flagged directives for each signature.
 
-def report_summary_cli(signature_results: list[Signature]):
+    Args:
+        signature_results (list[Signature]): Signature results
+        filepath (str, optional): Path of the scanned config. If given, lines
+                                  flagged in included files are prefixed
+                                  with their file path
+    """
     for result in signature_results:
         table = Table(
             title="Signature for {}\n{}".format(result.name, result.description),
@@ -188,7 +372,7 @@ def report_summary_cli(signature_results: list[Signature]):
                 severity = str(result.severity.value)
                 colour = severity_color_mapping[result.severity]
                 table.add_row(
-                    str(misconfig.get("line")),
+                    SignatureUtil.get_qualified_line(misconfig, filepath),
                     " ".join(misconfig.get("directive_and_args")),
                     Text(severity, style=colour),
                     str(misconfig.get("column_start")),
@@ -208,7 +392,7 @@ def report_verbose_cli(config: NginxConfig, signature_results: list[Signature]):
 
         Args:
             line (str): A line of NGINX configuration
-            line_number (int): zero-indexed line number
+            line_number (int): one-indexed line number
 
         Returns:
             str: rich formatted string that can be viewed in the terminal
@@ -216,99 +400,24 @@ def report_verbose_cli(config: NginxConfig, signature_results: list[Signature]):
         if len(line.strip()) == 0:
             return ""
 
-        # Red text and link for flagged directives
-        line_to_signature_mapping = SignatureUtil.get_line_to_signature_mapping(
-            signature_results
-        )
-        line_to_flagged_mapping = SignatureUtil.get_line_to_flagged_mapping(
-            signature_results
-        )
-        flagged = line_to_flagged_mapping.get(line_number)
-        signature = line_to_signature_mapping.get(line_number)
+        # Red text and link for flagged directives, including continuation
+        # lines of multi-line flagged directives
+        signature = line_signatures[line_number - 1] if line_number <= len(line_signatures) else None
 
-        if flagged is not None and signature is not None:
-            # Form a regex pattern to inject "flagged" css
-            pattern = r"([^\s]*)" + "(" + re.escape(line.strip()) + ")"
-            
+        if signature is not None:
+            # Underline the line, leaving its indentation out
+            indentation, content, rest = split_line(line)
+            color = severity_color_mapping[signature.severity]
+            modified_line = f'{indentation}[bold underline {color}][link={signature.reference_url}] ' \
+                            f'{content}[/link][/bold underline {color}]{rest}'
+        else:
+            # This line is a start of a directive, not a continuation
             modified_line = re.sub(
-                pattern,
-                f'[bold underline {severity_color_mapping[signature.severity]}][link={signature.reference_url}]\g<1> \g<2>[/link][/bold underline {severity_color_mapping[signature.severity]}]',  
+                r"^(\s*)([a-z_]+)",
+                r'\g<1>[blue]\g<2>[/blue]',
                 line,
                 count=1,
             )
-        else:
-            # If first attempt on retrieving flagged directive by line number fails,
-            # try to perform a regex search from nearest flagged line number.
-            # The current line may be a continuation of the previous line
-            # TODO: Check that a directive has been fully output to the report,
-            #       for optimization
-
-            # Copy line_to_flagged_mapping and sort it in ascending order
-            flagged_lines_sorted = list(line_to_flagged_mapping.keys())
-            flagged_lines_sorted.sort(reverse=True)
-
-            # Iterate through the list from end to start, until we get a
-            # line number smaller than the current line number
-            previously_flagged_line_number = -1
-
-            for i in range(len(flagged_lines_sorted)):
-                flagged_line_number = flagged_lines_sorted[i]
-                if flagged_line_number < line_number:
-                    previously_flagged_line_number = flagged_line_number
-                    break
-
-            # If previously_flagged_line_number > -1, get substring from
-            # that previously flagged line until the next semicolon
-            if previously_flagged_line_number > -1:
-                lines = config.raw.splitlines()
-                flagged_first_line = lines[previously_flagged_line_number - 1]
-                quote_search_result = re.search(r'([\'\"])', flagged_first_line)
-
-                pattern_with_quote = None
-                if quote_search_result:
-                    # Either single quote or double quote
-                    quote_character = quote_search_result.group(1)
-                    pattern_with_quote = f"^.+?{quote_character}\s*[\\{{;]"
-                
-                pattern = pattern_with_quote if pattern_with_quote else r"^.+?[\{;]"
-
-                # Match until { or ; that is not enclosed between quotes
-                subconfig = re.match(
-                    pattern,
-                    "\n".join(lines[previously_flagged_line_number - 1 :]),
-                    re.DOTALL,
-                ).group()
-
-                # Check for overlap between the current line and the subconfig
-                pattern = re.compile(r"([^\s]*)" + "(" + re.escape(line.strip()) + ")")
-                match = pattern.search(subconfig)
-                if match:
-                    # Inject "flagged" CSS
-                    signature = line_to_signature_mapping.get(
-                        previously_flagged_line_number
-                    )
-                    modified_line = re.sub(
-                        pattern,
-                        f'[bold underline {severity_color_mapping[signature.severity]}][link={ signature.reference_url}]\g<1> \g<2>[/link][/bold underline {severity_color_mapping[signature.severity]}]', 
-                        line,
-                        count=1,
-                    )
-                else:
-                    # This line is a start of a directive, not a continuation
-                    modified_line = re.sub(
-                        r"^(\s*)([a-z_]+)",
-                        r'\g<1>[blue]\g<2>[/blue]',
-                        line,
-                        count=1,
-                    )
-            else:
-                # This line is a start of a directive, not a continuation
-                modified_line = re.sub(
-                    r"^(\s*)([a-z_]+)",
-                    r'\g<1>[blue]\g<2>[/blue]',
-                    line,
-                    count=1,
-                )
 
         # Use regex to color comments (everything after a hash #)
         modified_line = re.sub(
@@ -317,16 +426,18 @@ def report_verbose_cli(config: NginxConfig, signature_results: list[Signature]):
 
         return modified_line or f"[white]{line}[/white]"
 
-    table = Table(title=f"{config.filepath}", caption=f"Filepath: {config.filepath}")
-    table.add_column("Line No.", style="cyan", no_wrap=True)
-    table.add_column("Configuration File", style="magenta")
-
     console = Console()
-    # read file line by line
-    with open(config.filepath, "r") as f:
-        lines = f.readlines()
-        for line_num, line in enumerate(lines, 1):
+
+    # One table for the main config file, followed by each included file
+    for filepath, raw in config.sources.items():
+        line_signatures = annotate_config_lines(config, signature_results, filepath)
+
+        table = Table(title=f"{filepath}", caption=f"Filepath: {filepath}")
+        table.add_column("Line No.", style="cyan", no_wrap=True)
+        table.add_column("Configuration File", style="magenta")
+
+        for line_num, line in enumerate(raw.splitlines(keepends=True), 1):
             line_out = process_config_line(line, line_num)
             table.add_row(f"[dim] {line_num} [/dim]", f"{line_out}")
 
-    console.print(table)
+        console.print(table)
@@ -0,0 +1,505 @@
+"""
+Simulates how NGINX routes a request to a server and a location block.
+
+Servers are selected by listen port and server_name, and locations with
+NGINX's precedence: an exact (=) match wins outright, then the longest
+prefix match is taken, and unless it is a ^~ location, the regex (~, ~*)
+locations are tried in the order they are defined, the first match
+winning over the prefix. Nested locations are searched the same way
+within the location that matched.
+
+Prefix locations are compiled into a trie and regex locations into an
+ordered list, once per block, so that large corpora of request URIs
+(e.g. from access logs) can be routed in bulk.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+from urllib.parse import unquote, urlsplit
+
+from .directive import Directive, DirectiveUtil
+from .nginx_config import NginxConfig
+from .predicates import is_regex_location, parse_location
+from .signature import Flagged, Signature
+
+
+DEFAULT_PORT = 80
+
+
+@dataclass
+class Route:
+    """
+    Data class that represents where a request is routed to
+    """
+    uri: str = None
+    host: Optional[str] = None
+    server: Optional[Directive] = None
+    location: Optional[Directive] = None
+
+
+# PCRE named groups, (?<name>...) and (?'name'...), which Python spells (?P<name>...)
+PCRE_NAMED_GROUP = re.compile(r"\(\?(?:<(?![=!])(\w+)>|'(\w+)')")
+
+
+MULTIPLE_SLASHES = re.compile('/{2,}')
+
+
+def compile_regex(pattern: str, flags: int = 0) -> re.Pattern:
+    """
+    Args:
+        pattern (str): PCRE regular expression, e.g. of a location or server_name
+        flags (int, optional): re flags
+
+    Raises:
+        re.error: If the expression is not supported by Python's re module
+
+    Returns:
+        re.Pattern
+    """
+    return re.compile(PCRE_NAMED_GROUP.sub(lambda match: f'(?P<{match.group(1) or match.group(2)}>', pattern), flags)
+
+
+def normalize_uri(uri: str, merge_slashes: bool = True) -> str:
+    """
+    Normalize a request URI the way NGINX does before matching locations.
+
+    Args:
+        uri (str): Request URI, possibly with a query string
+        merge_slashes (bool, optional): Merge runs of slashes into one
+
+    Returns:
+        str: Decoded path, with "." and ".." segments resolved
+    """
+    uri_path = uri.partition('?')[0].partition('#')[0]
+    if '%' in uri_path:
+        uri_path = unquote(uri_path)
+    if not uri_path:
+        return '/'
+    # Most URIs need nothing more
+    if '/.' not in uri_path and '//' not in uri_path:
+        return uri_path
+
+    if merge_slashes:
+        uri_path = MULTIPLE_SLASHES.sub('/', uri_path)
+
+    segments: list[str] = []
+    for segment in uri_path.split('/')[1:]:
+        if segment == '..':
+            if segments:
+                segments.pop()
+        elif segment != '.':
+            segments.append(segment)
+    normalized = '/' + '/'.join(segments)
+    # "/a/b/.." is the directory "/a/"
+    if uri_path.endswith(('/.', '/..')) and not normalized.endswith('/'):
+        normalized += '/'
+    return normalized
+
+
+class PrefixTrie:
+    """
+    Character trie of prefix locations, answering longest prefix matches
+    in time proportional to the length of the match.
+    """
+    # Key of the value stored in a node, distinct from any character
+    VALUE = None
+
+    def __init__(self):
+        self.root: dict = {}
+
+    def insert(self, prefix: str, value) -> None:
+        node = self.root
+        for character in prefix:
+            node = node.setdefault(character, {})
+        # The first definition wins, as NGINX rejects duplicates anyway
+        node.setdefault(self.VALUE, value)
+
+    def longest_match(self, text: str):
+        """
+        Args:
+            text (str): Text to match prefixes against
+
+        Returns:
+            Value of the longest prefix of text in the trie, None if there is none
+        """
+        node = self.root
+        match = node.get(self.VALUE)
+        for character in text:
+            node = node.get(character)
+            if node is None:
+                break
+            if self.VALUE in node:
+                match = node[self.VALUE]
+        return match
+
+
+class LocationTable:
+    """
+    Compiled locations defined directly within one block (a server, or a
+    location with nested locations).
+    """
+    def __init__(self, block: list[Directive]):
+        """
+        Args:
+            block (list[Directive]): Block of a server or location
+        """
+        self.exact: dict[str, Directive] = {}
+        self.prefixes: PrefixTrie = PrefixTrie()
+        self.regexes: list[tuple[re.Pattern, Directive]] = []
+        # Locations whose regex is not supported by Python's re module
+        self.invalid: list[Directive] = []
+        self.nested: dict[Directive, Optional[LocationTable]] = {}
+
+        for location in block:
+            if location.directive != 'location':
+                continue
+            modifier, pattern = parse_location(location)
+            if pattern.startswith('@'):
+                # Named locations are only reached through internal redirects
+                continue
+            if modifier == '=':
+                self.exact.setdefault(pattern, location)
+            elif is_regex_location(location):
+                try:
+                    self.regexes.append((compile_regex(pattern, re.IGNORECASE if modifier == '~*' else 0), location))
+                except re.error:
+                    self.invalid.append(location)
+            else:
+                self.prefixes.insert(pattern, (location, modifier == '^~'))
+
+        # Single pass over all regexes, so that URIs matching none of
+        # them (usually most) are rejected at once
+        self.any_regex: Optional[re.Pattern] = None
+        if len(self.regexes) > 1:
+            try:
+                self.any_regex = re.compile('|'.join(f'(?:{pattern.pattern})' if not pattern.flags & re.IGNORECASE
+                                                     else f'(?i:{pattern.pattern})'
+                                                     for pattern, _ in self.regexes))
+            except re.error:
+                # e.g. back references, which are numbered per pattern
+                self.any_regex = None
+
+    def get_nested(self, location: Directive) -> Optional['LocationTable']:
+        if location not in self.nested:
+            has_nested = any(directive.directive == 'location' for directive in location.block)
+            self.nested[location] = LocationTable(location.block) if has_nested else None
+        return self.nested[location]
+
+    def find(self, uri: str) -> tuple[Optional[Directive], bool]:
+        """
+        Args:
+            uri (str): Normalized request URI
+
+        Returns:
+            tuple[Optional[Directive], bool]: Selected location (None if no
+                location matched), and whether the selection is final, i.e.
+                no regex location of an enclosing block may override it
+        """
+        exact = self.exact.get(uri)
+        if exact is not None:
+            return exact, True
+
+        selected = None
+        no_regex = False
+        prefix_match = self.prefixes.longest_match(uri)
+        if prefix_match is not None:
+            selected, no_regex = prefix_match
+            nested_table = self.get_nested(selected)
+            if nested_table is not None:
+                nested, final = nested_table.find(uri)
+                if final:
+                    return nested, True
+                if nested is not None:
+                    selected = nested
+
+        if no_regex or not self.regexes:
+            return selected, False
+        if self.any_regex is not None and self.any_regex.search(uri) is None:
+            return selected, False
+
+        for pattern, location in self.regexes:
+            if pattern.search(uri):
+                nested_table = self.get_nested(location)
+                if nested_table is not None:
+                    nested, _ = nested_table.find(uri)
+                    if nested is not None:
+                        return nested, True
+                return location, True
+
+        return selected, False
+
+
+class ServerNames:
+    """
+    Compiled server_name entries of a server block
+    """
+    def __init__(self, server: Directive):
+        self.exact: set[str] = set()
+        self.leading_wildcards: list[str] = []
+        self.trailing_wildcards: list[str] = []
+        self.regexes: list[re.Pattern] = []
+
+        for directive in server.block:
+            if directive.directive != 'server_name':
+                continue
+            for name in directive.args:
+                if name.startswith('~'):
+                    # Not lowercased, as that would turn \S, \D, \W... into their opposites
+                    try:
+                        self.regexes.append(compile_regex(name[1:], re.IGNORECASE))
+                    except re.error:
+                        pass
+                    continue
+                name = name.lower()
+                if name.startswith('*.'):
+                    self.leading_wildcards.append(name[1:])
+                elif name.startswith('.'):
+                    # ".example.com" matches example.com and its subdomains
+                    self.exact.add(name[1:])
+                    self.leading_wildcards.append(name)
+                elif name.endswith('.*'):
+                    self.trailing_wildcards.append(name[:-1])
+                else:
+                    self.exact.add(name)
+
+
+class Router:
+    """
+    Routes requests to the server and location blocks of a config.
+
+    Example:
+        router = Router(config)
+        route = router.route('/static/../etc/passwd', host='example.com')
+        route.location  # -> location directive, None if no location matched
+    """
+    def __init__(self, config: NginxConfig, cache_size: int = 65536):
+        """
+        Args:
+            config (NginxConfig): Config to route requests through
+            cache_size (int, optional): Number of (server, URI) routes, and of
+                                        (host, port) server selections, to memoize
+        """
+        self.config: NginxConfig = config
+        self.servers: list[Directive] = [server for server in config.get_directives('server')
+                                         if server.block and server.parent is not None
+                                         and server.parent.directive == 'http']
+        self.server_names: dict[Directive, ServerNames] = {server: ServerNames(server) for server in self.servers}
+        self.listens: dict[Directive, list[tuple[int, bool]]] = {server: self._get_listens(server)
+                                                                  for server in self.servers}
+        self.tables: dict[Directive, LocationTable] = {}
+        self.merge_slashes: dict[Directive, bool] = {}
+        self._find_location = lru_cache(maxsize=cache_size)(self._find_location_uncached)
+        self.select_server = lru_cache(maxsize=cache_size)(self.select_server)
+
+    @staticmethod
+    def _get_listens(server: Directive) -> list[tuple[int, bool]]:
+        """
+        Returns:
+            list[tuple[int, bool]]: Port of each listen directive, and whether
+                                    it is the default server of the port
+        """
+        listens = []
+        for directive in server.block:
+            if directive.directive != 'listen' or not directive.args or directive.args[0].startswith('unix:'):
+                continue
+            address = directive.args[0]
+            port = address.rsplit(':', 1)[-1] if ':' in address and not address.endswith(']') else address
+            listens.append((int(port) if port.isdigit() else DEFAULT_PORT,
+                            'default_server' in directive.args or 'default' in directive.args))
+        return listens or [(DEFAULT_PORT, False)]
+
+    def select_server(self, host: Optional[str] = None, port: Optional[int] = None) -> Optional[Directive]:
+        """
+        Args:
+            host (str, optional): Host header of the request
+            port (int, optional): Port the request was received on. If not
+                                  given, servers of every port are considered
+
+        Returns:
+            Directive: Server block handling the request, None if the config has none
+        """
+        candidates = [server for server in self.servers
+                      if port is None or any(listen_port == port for listen_port, _ in self.listens[server])]
+        if not candidates:
+            return None
+
+        if host:
+            host = host.lower().rstrip('.')
+            if not host.startswith('['):
+                host = host.split(':', 1)[0]
+            server = self._select_by_name(candidates, host)
+            if server is not None:
+                return server
+
+        for server in candidates:
+            if any(default and (port is None or listen_port == port)
+                   for listen_port, default in self.listens[server]):
+                return server
+        return candidates[0]
+
+    def _select_by_name(self, candidates: list[Directive], host: str) -> Optional[Directive]:
+        # Exact names, then the longest leading wildcard, then the longest
+        # trailing wildcard, then the first regex
+        for server in candidates:
+            if host in self.server_names[server].exact:
+                return server
+
+        best, best_length = None, 0
+        for server in candidates:
+            for suffix in self.server_names[server].leading_wildcards:
+                if host.endswith(suffix) and len(suffix) > best_length:
+                    best, best_length = server, len(suffix)
+        if best is not None:
+            return best
+
+        for server in candidates:
+            for prefix in self.server_names[server].trailing_wildcards:
+                if host.startswith(prefix) and len(prefix) > best_length:
+                    best, best_length = server, len(prefix)
+        if best is not None:
+            return best
+
+        for server in candidates:
+            if any(regex.search(host) for regex in self.server_names[server].regexes):
+                return server
+        return None
+
+    def get_table(self, server: Directive) -> LocationTable:
+        if server not in self.tables:
+            self.tables[server] = LocationTable(server.block)
+        return self.tables[server]
+
+    def _find_location_uncached(self, server: Directive, uri: str) -> Optional[Directive]:
+        location, _ = self.get_table(server).find(uri)
+        return location
+
+    def route(self, uri: str, host: Optional[str] = None, port: Optional[int] = None) -> Route:
+        """
+        Args:
+            uri (str): Request URI, e.g. "/images/logo.png?size=2"
+            host (str, optional): Host header of the request
+            port (int, optional): Port the request was received on
+
+        Returns:
+            Route
+        """
+        server = self.select_server(host, port)
+        if server is None:
+            return Route(uri=uri, host=host)
+
+        if server not in self.merge_slashes:
+            self.merge_slashes[server] = self.config.inheritance.get_value(server, 'merge_slashes') != ['off']
+        location = self._find_location(server, normalize_uri(uri, self.merge_slashes[server]))
+        return Route(uri=uri, host=host, server=server, location=location)
+
+    def route_many(self, requests: Iterable[str], port: Optional[int] = None) -> Iterator[Route]:
+        """
+        Args:
+            requests (Iterable[str]): One request per item, either a URI
+                                      ("/path"), a host and a URI separated by
+                                      whitespace ("example.com /path"), or a URL
+                                      ("https://example.com/path")
+            port (int, optional): Port the requests were received on
+
+        Yields:
+            Route: Route of each request, in order
+        """
+        for request in requests:
+            request = request.strip()
+            if not request:
+                continue
+            host = None
+            if '://' in request:
+                url = urlsplit(request)
+                host = url.hostname
+                request = url.path + (f'?{url.query}' if url.query else '')
+            elif not request.startswith('/') and ' ' in request:
+                host, request = request.split(None, 1)
+            yield self.route(request or '/', host, port)
+
+
+def get_enclosing_block(directive: Directive) -> Directive:
+    """
+    Args:
+        directive (Directive): Any directive
+
+    Returns:
+        Directive: Innermost location or server block containing the directive
+                   (or the directive itself, if it is one). Outside of server
+                   blocks, its outermost ancestor, e.g. the http block
+    """
+    ancestor = directive
+    while ancestor.directive not in ('location', 'server') and ancestor.parent is not None:
+        ancestor = ancestor.parent
+    return ancestor
+
+
+def get_reachable_findings(config: NginxConfig, signatures: list[Signature],
+                           routes: Iterable[Route]) -> list[tuple[Signature, Flagged, int]]:
+    """
+    Count the requests reaching each finding, i.e. routed to the location or
+    server block a flagged directive is in (or to a location nested in it).
+    Directives outside of server blocks are reached by every request.
+
+    Args:
+        config (NginxConfig): Scanned config
+        signatures (list[Signature]): Scan results of the config
+        routes (Iterable[Route]): Routed requests, e.g. from Router.route_many
+
+    Returns:
+        list[tuple[Signature, Flagged, int]]: Every finding with its number of
+                                              requests, in the order of the results
+    """
+    # Flagged directives are identified by file, line and name, then by
+    # column if several directives of that name share the line
+    directives: dict[tuple[str, int, str], list[Directive]] = {}
+    DirectiveUtil.traverse(config.directives, lambda directive: directives.setdefault(
+        (directive.file, directive.line, directive.directive), []).append(directive))
+
+    num_routes = 0
+    hits: dict[Directive, int] = {}
+    for route in routes:
+        num_routes += 1
+        block = route.location or route.server
+        while block is not None:
+            hits[block] = hits.get(block, 0) + 1
+            block = block.parent
+
+    reachable = []
+    for signature in signatures:
+        for flagged in signature.flagged:
+            directive = get_flagged_directive(config, directives, flagged)
+            if directive is None:
+                reachable.append((signature, flagged, 0))
+                continue
+            block = get_enclosing_block(directive)
+            if block.parent is None and block.directive not in ('location', 'server'):
+                # Main context, or blocks such as http that every request passes through
+                reachable.append((signature, flagged, num_routes))
+            else:
+                reachable.append((signature, flagged, hits.get(block, 0)))
+    return reachable
+
+
+def get_flagged_directive(config: NginxConfig, directives: dict[tuple[str, int, str], list[Directive]],
+                          flagged: Flagged) -> Optional[Directive]:
+    """
+    Args:
+        config (NginxConfig): Scanned config
+        directives (dict): Directives of the config by file, line and name
+        flagged (Flagged): Flagged directive
+
+    Returns:
+        Directive: Directive of the config that was flagged, None if not found
+    """
+    candidates = directives.get((flagged.get("file"), flagged["line"], flagged["directive_and_args"][0]))
+    if not candidates:
+        return None
+    if len(candidates) > 1:
+        for candidate in candidates:
+            position = config.get_position(candidate)
+            if position is not None and position[0] == flagged.get("column_start"):
+                return candidate
+    return candidates[0]
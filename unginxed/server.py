@@ -0,0 +1,477 @@
+"""
+Long-running scan server, so that tools scanning configs many times over
+(e.g. on every deploy) do not pay for interpreter startup, imports and
+signature loading on each scan.
+
+Speaks HTTP on localhost, or over a Unix socket. Scans are handed to a pool
+of worker processes, which keep their signatures loaded and their parse
+caches warm from one request to the next.
+
+Endpoints:
+    POST /scan    {"paths": [...]} scans config files, directories or glob
+                  patterns (as given on the command line, relative to the
+                  server's working directory), {"config": "...", "name": "..."}
+                  scans the body of a config. Relative includes of a body are
+                  resolved against a temporary folder. Returns
+                  {"results": [...]}, one result per config
+    GET /stats    Request latency and cache hit-rate counters
+    GET /health   {"status": "ok"}
+"""
+
+import json
+import sys
+import tempfile
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import cpu_count, getpid, path, remove, stat
+from shutil import rmtree
+from signal import SIG_DFL, SIG_IGN, SIGINT, SIGTERM, signal
+from socketserver import ThreadingMixIn, UnixStreamServer
+from stat import S_ISSOCK
+from threading import Lock, current_thread, main_thread
+from time import perf_counter
+from typing import Iterator, Optional, Union
+
+from .batch import ScanResult, expand_config_paths, initialize_worker, scan_file
+from .cache import ResultCache
+from .formats import get_error, get_finding
+from .loader import parse_cache
+from .signature import get_signatures
+
+
+DEFAULT_PORT = 8765
+# Largest request body accepted, config bodies included
+MAX_REQUEST_BYTES = 64 << 20
+# Number of most recent requests latency percentiles are computed over
+LATENCY_WINDOW = 4096
+
+
+def _initialize_server_worker(cache: Optional[ResultCache], low_memory: bool) -> None:
+    # The server shuts the workers down, rather than the signals sent to it
+    # (or to its process group)
+    signal(SIGINT, SIG_IGN)
+    signal(SIGTERM, SIG_DFL)
+    initialize_worker(cache, None, low_memory)
+    # Signature modules are imported up front rather than by the first requests
+    for signature in get_signatures():
+        getattr(signature, 'matcher', None)
+
+
+def _warm_up() -> int:
+    return getpid()
+
+
+def _scan(filepath: str) -> tuple[ScanResult, int, tuple[int, int]]:
+    # Runs in a worker. The parse cache counters are totals of the worker
+    return scan_file(filepath), getpid(), (parse_cache.hits, parse_cache.misses)
+
+
+def _interrupt(signum, frame) -> None:
+    # A second signal stops the server without shutting down cleanly
+    signal(SIGTERM, SIG_DFL)
+    raise KeyboardInterrupt
+
+
+def get_rate(hits: int, misses: int) -> Optional[float]:
+    """
+    Returns:
+        float: Share of hits, None if there were no lookups
+    """
+    return hits / (hits + misses) if hits + misses else None
+
+
+class ServerStats:
+    """
+    Counters of a running server, updated by the threads handling requests.
+    """
+    def __init__(self, window: int = LATENCY_WINDOW):
+        """
+        Args:
+            window (int, optional): Number of most recent requests that
+                                    latency percentiles are computed over
+        """
+        self.lock: Lock = Lock()
+        self.started: float = perf_counter()
+        self.requests: int = 0
+        self.errors: int = 0
+        self.configs: int = 0
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.total_latency: float = 0.0
+        self.max_latency: float = 0.0
+        self.result_cache_hits: int = 0
+        self.result_cache_misses: int = 0
+        # Worker process id -> parse cache hits and misses of the worker
+        self.parse_cache: dict[int, tuple[int, int]] = {}
+
+    def record_request(self, latency: float, error: bool = False) -> None:
+        """
+        Args:
+            latency (float): Seconds taken to answer the request
+            error (bool, optional): Whether the request was answered with an error status
+        """
+        with self.lock:
+            self.requests += 1
+            self.errors += error
+            self.latencies.append(latency)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def record_result(self, result: ScanResult, caching: bool, pid: int, parse_cache_counts: tuple[int, int]) -> None:
+        """
+        Args:
+            result (ScanResult): Result of a scanned config
+            caching (bool): Whether the result cache was looked up
+            pid (int): Worker process that scanned the config
+            parse_cache_counts (tuple[int, int]): Parse cache hits and misses of the worker
+        """
+        with self.lock:
+            self.configs += 1
+            if caching:
+                if result.cached:
+                    self.result_cache_hits += 1
+                else:
+                    self.result_cache_misses += 1
+            self.parse_cache[pid] = parse_cache_counts
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: JSON-serializable snapshot of the counters, times in milliseconds
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            parse_cache_hits = sum(hits for hits, _ in self.parse_cache.values())
+            parse_cache_misses = sum(misses for _, misses in self.parse_cache.values())
+            return {
+                "uptime_s": round(perf_counter() - self.started, 3),
+                "requests": self.requests,
+                "errors": self.errors,
+                "configs": self.configs,
+                "latency_ms": {
+                    "mean": round(self.total_latency / self.requests * 1000, 3) if self.requests else None,
+                    "p50": self._get_percentile(latencies, 0.5),
+                    "p95": self._get_percentile(latencies, 0.95),
+                    "p99": self._get_percentile(latencies, 0.99),
+                    "max": round(self.max_latency * 1000, 3),
+                    "window": len(latencies),
+                },
+                "result_cache": {
+                    "hits": self.result_cache_hits,
+                    "misses": self.result_cache_misses,
+                    "hit_rate": get_rate(self.result_cache_hits, self.result_cache_misses),
+                },
+                "parse_cache": {
+                    "hits": parse_cache_hits,
+                    "misses": parse_cache_misses,
+                    "hit_rate": get_rate(parse_cache_hits, parse_cache_misses),
+                },
+            }
+
+    @staticmethod
+    def _get_percentile(latencies: list[float], percentile: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return round(latencies[round(percentile * (len(latencies) - 1))] * 1000, 3)
+
+
+class ScanService:
+    """
+    Scans configs on a pool of worker processes, each set up once with the
+    signatures and the result cache (see batch.scan_file). Config bodies are
+    written to a temporary folder, named after their contents so that
+    identical bodies hit the result cache, and removed once no request
+    scans them anymore.
+    """
+    def __init__(self, workers: Optional[int] = None, cache: Optional[ResultCache] = None,
+                 low_memory: bool = False):
+        """
+        Args:
+            workers (int, optional): Number of worker processes. Defaults to the number of CPUs
+            cache (ResultCache, optional): Result cache to read from and write to
+            low_memory (bool, optional): Load configs in low memory mode (see NginxConfig)
+        """
+        self.workers: int = workers or cpu_count() or 1
+        self.cache: Optional[ResultCache] = cache
+        self.low_memory: bool = low_memory
+        self.stats: ServerStats = ServerStats()
+        self.executor: ProcessPoolExecutor = self._create_executor()
+        self.executor_lock: Lock = Lock()
+        self.body_folder: str = tempfile.mkdtemp(prefix='unginxed-serve-')
+        # Path of each body being scanned -> number of requests scanning it
+        self.body_references: dict[str, int] = {}
+        self.body_lock: Lock = Lock()
+
+    def warm_up(self) -> None:
+        """
+        Start every worker process, rather than on the first requests.
+        """
+        futures = [self.executor.submit(_warm_up) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def scan_paths(self, targets: list[str]) -> list[dict]:
+        """
+        Args:
+            targets (list[str]): File paths, directories or glob patterns
+
+        Returns:
+            list[dict]: Result of each config, in the order of the paths
+        """
+        return [self._get_record(*scanned) for scanned in self._scan_files(list(expand_config_paths(targets)))]
+
+    def scan_body(self, body: str, name: Optional[str] = None) -> dict:
+        """
+        Args:
+            body (str): Contents of a config file
+            name (str, optional): Name reported in place of the temporary
+                                  path of the body
+
+        Returns:
+            dict: Result of the config
+        """
+        with self._write_body(body) as filepath:
+            record = self._get_record(*self._scan_files([filepath])[0])
+
+        name = name or 'nginx.conf'
+        record["config"] = name
+        for finding in record["findings"]:
+            if finding["file"] == filepath:
+                finding["file"] = name
+            finding["config"] = name
+        return record
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+        rmtree(self.body_folder, ignore_errors=True)
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_initialize_server_worker,
+                                   initargs=(self.cache, self.low_memory))
+
+    def _scan_files(self, filepaths: list[str]) -> list[tuple[ScanResult, int, tuple[int, int]]]:
+        """
+        Scan files on the pool. If a worker process dies (e.g. killed when
+        out of memory), the pool is broken for every request: it is replaced,
+        and the files are scanned again once. Should the pool break again,
+        only this request fails.
+
+        Args:
+            filepaths (list[str]): Paths to the config files
+
+        Returns:
+            list[tuple]: Result of each file, with the worker's pid and
+                         parse cache counters (see _scan)
+        """
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                futures = [executor.submit(_scan, filepath) for filepath in filepaths]
+                return [future.result() for future in futures]
+            except BrokenProcessPool:
+                self._replace_executor(executor)
+                if attempt:
+                    raise
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> None:
+        # Requests failing on the same pool replace it once
+        with self.executor_lock:
+            if self.executor is broken:
+                self.executor = self._create_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _get_record(self, result: ScanResult, pid: int, parse_cache_counts: tuple[int, int]) -> dict:
+        self.stats.record_result(result, self.cache is not None, pid, parse_cache_counts)
+        return {
+            **get_error(result),
+            "cached": result.cached,
+            "duration_ms": round(result.duration * 1000, 3),
+            "findings": [get_finding(result, signature, flagged)
+                         for signature in result.signatures for flagged in signature.flagged],
+        }
+
+    @contextmanager
+    def _write_body(self, body: str) -> Iterator[str]:
+        filepath = path.join(self.body_folder, f'{sha256(body.encode()).hexdigest()}.conf')
+        with self.body_lock:
+            if filepath not in self.body_references:
+                with open(filepath, 'w') as f:
+                    f.write(body)
+            self.body_references[filepath] = self.body_references.get(filepath, 0) + 1
+        try:
+            yield filepath
+        finally:
+            with self.body_lock:
+                self.body_references[filepath] -= 1
+                if not self.body_references[filepath]:
+                    del self.body_references[filepath]
+                    remove(filepath)
+
+
+class RequestError(Exception):
+    """
+    Request that cannot be served, answered with the given HTTP status
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status: int = status
+
+
+class ScanRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the endpoints listed in the module docstring. Every response
+    is a JSON object, errors included ({"error": "..."}).
+    """
+    server: Union['ScanHTTPServer', 'ScanUnixServer']
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        self._handle(self._get)
+
+    def do_POST(self) -> None:
+        self._handle(self._post)
+
+    def _get(self) -> dict:
+        if self.path == '/stats':
+            return {**self.server.service.stats.to_dict(), "workers": self.server.service.workers}
+        if self.path == '/health':
+            return {"status": "ok"}
+        raise RequestError(404, f'Unknown endpoint {self.path}')
+
+    def _post(self) -> dict:
+        if self.path != '/scan':
+            raise RequestError(404, f'Unknown endpoint {self.path}')
+
+        request = self._read_json()
+        service = self.server.service
+        if isinstance(request.get("config"), str):
+            name = request.get("name")
+            return {"results": [service.scan_body(request["config"], name if isinstance(name, str) else None)]}
+
+        targets = request.get("paths", [request["path"]] if "path" in request else None)
+        if not isinstance(targets, list) or not targets or not all(isinstance(target, str) for target in targets):
+            raise RequestError(400, 'Expected "paths" (a list of paths), "path" or "config"')
+        return {"results": service.scan_paths(targets)}
+
+    def _read_json(self) -> dict:
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            raise RequestError(400, 'Invalid Content-Length')
+        if length > MAX_REQUEST_BYTES:
+            raise RequestError(413, f'Request body larger than {MAX_REQUEST_BYTES} bytes')
+
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(400, 'Request body is not valid JSON')
+        if not isinstance(request, dict):
+            raise RequestError(400, 'Request body must be a JSON object')
+        return request
+
+    def _handle(self, handler) -> None:
+        start = perf_counter()
+        status = 200
+        try:
+            response = handler()
+        except RequestError as e:
+            status, response = e.status, {"error": str(e)}
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            status, response = 500, {"error": f'{type(e).__name__}: {e}'}
+
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.service.stats.record_request(perf_counter() - start, error=status >= 400)
+
+    def address_string(self) -> str:
+        # Peers of a Unix socket have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+
+class ScanHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, service: ScanService):
+        super().__init__(('127.0.0.1', port), ScanRequestHandler)
+        self.service: ScanService = service
+
+
+class ScanUnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: ScanService):
+        # A socket left behind by a server that did not shut down cleanly
+        try:
+            if S_ISSOCK(stat(socket_path).st_mode):
+                remove(socket_path)
+        except FileNotFoundError:
+            pass
+        super().__init__(socket_path, ScanRequestHandler)
+        self.service: ScanService = service
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            remove(self.server_address)
+        except OSError:
+            pass
+
+
+def create_server(service: ScanService, port: Optional[int] = None,
+                  socket_path: Optional[str] = None) -> Union[ScanHTTPServer, ScanUnixServer]:
+    """
+    Args:
+        service (ScanService): Service running the scans
+        port (int, optional): Port to listen on, on 127.0.0.1. Defaults to DEFAULT_PORT
+        socket_path (str, optional): Unix socket to listen on instead of a port
+
+    Returns:
+        ScanHTTPServer | ScanUnixServer: Server, bound and ready to serve_forever()
+    """
+    if socket_path is not None:
+        return ScanUnixServer(socket_path, service)
+    return ScanHTTPServer(DEFAULT_PORT if port is None else port, service)
+
+
+def serve(port: Optional[int] = None, socket_path: Optional[str] = None, workers: Optional[int] = None,
+          cache: Optional[ResultCache] = None, low_memory: bool = False) -> None:
+    """
+    Serve scans until interrupted. See the module docstring for the endpoints.
+
+    Args:
+        port (int, optional): Port to listen on, on 127.0.0.1. Defaults to DEFAULT_PORT
+        socket_path (str, optional): Unix socket to listen on instead of a port
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs
+        cache (ResultCache, optional): Result cache to read from and write to
+        low_memory (bool, optional): Load configs in low memory mode (see NginxConfig)
+    """
+    service = ScanService(workers, cache, low_memory)
+    try:
+        server = create_server(service, port, socket_path)
+    except BaseException:
+        service.close()
+        raise
+
+    # Stopped by a service manager, shut down as when interrupted
+    if current_thread() is main_thread():
+        signal(SIGTERM, _interrupt)
+
+    try:
+        service.warm_up()
+        address = socket_path or f'http://127.0.0.1:{server.server_address[1]}'
+        print(f'Serving scans on {address} with {service.workers} workers', file=sys.stderr)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
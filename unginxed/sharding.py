@@ -0,0 +1,212 @@
+import gc
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count
+from typing import Callable, Optional
+
+from .directive import Directive, DirectiveList, DirectiveUtil
+from .engine import ScanEngine
+from .nginx_config import NginxConfig
+from .signature import Signature
+
+
+def get_server_blocks(config: NginxConfig) -> list[Directive]:
+    """
+    Args:
+        config (NginxConfig): Config to shard
+
+    Returns:
+        list[Directive]: server blocks that are not nested in another server
+                         block, in document order
+    """
+    server_blocks = []
+    for directive in config.index.by_name.get('server', ()):
+        if not directive.block:
+            # e.g. server entries of an upstream block
+            continue
+        ancestor = directive.parent
+        while ancestor is not None and ancestor.directive != 'server':
+            ancestor = ancestor.parent
+        if ancestor is None:
+            server_blocks.append(directive)
+    return server_blocks
+
+
+def get_shards(server_blocks: list[Directive], num_shards: int) -> list[list[Directive]]:
+    """
+    Split the server blocks into runs of consecutive blocks of roughly equal
+    length. A run never spans two parent blocks (e.g. http and stream), so
+    that the directives of a shard share their ancestors.
+
+    Args:
+        server_blocks (list[Directive]): Result of get_server_blocks
+        num_shards (int): Number of shards to aim for
+
+    Returns:
+        list[list[Directive]]: Server blocks of each shard, in document order
+    """
+    shard_size = max(1, -(-len(server_blocks) // num_shards))
+    shards: list[list[Directive]] = []
+    for server_block in server_blocks:
+        if not shards or len(shards[-1]) == shard_size or shards[-1][0].parent is not server_block.parent:
+            shards.append([])
+        shards[-1].append(server_block)
+    return shards
+
+
+def get_shard_view(config: NginxConfig, shards: list[list[Directive]], shard_index: int) -> NginxConfig:
+    """
+    Args:
+        config (NginxConfig): Config to shard
+        shards (list[list[Directive]]): Result of get_shards
+        shard_index (int): Index of a shard, or len(shards) for the
+                           directives outside of every server block
+
+    Returns:
+        NginxConfig: View of the config covering only the shard
+    """
+    if shard_index < len(shards):
+        return config.get_view(DirectiveList.subtree(shards[shard_index]))
+    excluded = [server_block for shard in shards for server_block in shard]
+    return config.get_view(DirectiveList.subtree(config.directives, excluded=excluded))
+
+
+# Set in the parent process right before the workers are forked, so that
+# the workers inherit the parsed config instead of receiving it pickled
+_shared: Optional[tuple[NginxConfig, list[list[Directive]], ScanEngine]] = None
+
+
+def _run_shard(shard_index: int) -> list[Optional[Signature]]:
+    config, shards, engine = _shared
+    return engine.run_all(get_shard_view(config, shards, shard_index))
+
+
+class ShardedScanEngine(ScanEngine):
+    """
+    Scan engine for single, very large configs. The directive tree is split
+    into shards of consecutive top-level server blocks, a few per worker,
+    plus one for everything outside of server blocks. Local signatures (see @inspects) run on the
+    shards over a pool of forked worker processes, which inherit the parsed
+    config, while the remaining signatures run on the whole config in the
+    meantime. Findings of each signature are merged in the order a serial
+    scan reports them in.
+
+    Falls back to a serial scan where processes cannot be forked, or when
+    there is nothing to split.
+    """
+    SHARDS_PER_WORKER = 4
+
+    def __init__(self, signatures: list[Callable[[NginxConfig], Signature]], workers: Optional[int] = None):
+        """
+        Args:
+            signatures (list[Callable]): Matcher functions, e.g. from get_signatures()
+            workers (int, optional): Number of worker processes. Defaults to the number of CPUs
+        """
+        super().__init__(signatures)
+        self.workers: int = workers or cpu_count() or 1
+
+    def run_all(self, config: NginxConfig) -> list[Optional[Signature]]:
+        server_blocks = get_server_blocks(config)
+        local_indices = [signature_index for signature_index, signature in enumerate(self.signatures)
+                         if getattr(signature, 'local', False)]
+
+        if self.workers == 1 or len(server_blocks) < 2 or not local_indices \
+                or 'fork' not in get_all_start_methods():
+            return super().run_all(config)
+
+        local_engine = ScanEngine([self.signatures[signature_index] for signature_index in local_indices])
+        global_indices = [signature_index for signature_index, signature in enumerate(self.signatures)
+                          if not getattr(signature, 'local', False)]
+        global_engine = ScanEngine([self.signatures[signature_index] for signature_index in global_indices])
+
+        # Imported here, as process pools are slow to import and not needed for serial scans
+        from concurrent.futures import ProcessPoolExecutor
+
+        # A few shards per worker, so that server blocks of uneven size still balance out
+        shards = get_shards(server_blocks, self.workers * self.SHARDS_PER_WORKER)
+
+        global _shared
+        _shared = (config, shards, local_engine)
+        # Keep the garbage collector of the workers off the inherited tree,
+        # as every page of it that they touch gets copied
+        gc.freeze()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('fork')) as executor:
+                futures = [executor.submit(_run_shard, shard_index) for shard_index in range(len(shards) + 1)]
+                global_results = global_engine.run_all(config)
+                shard_results = [future.result() for future in futures]
+        finally:
+            gc.unfreeze()
+            _shared = None
+
+        results: list[Optional[Signature]] = [None] * len(self.signatures)
+        for signature_index, result in zip(global_indices, global_results):
+            results[signature_index] = result
+        ranks = get_document_ranks(config, {(flagged["file"], flagged["line"])
+                                            for shard in shard_results for result in shard if result is not None
+                                            for flagged in result.flagged})
+        for local_index, signature_index in enumerate(local_indices):
+            results[signature_index] = merge_results([shard[local_index] for shard in shard_results], ranks,
+                                                     self.signatures[signature_index])
+        return results
+
+
+def get_document_ranks(config: NginxConfig, positions: set[tuple[str, int]]) -> dict[tuple[str, int], int]:
+    """
+    Args:
+        config (NginxConfig): Config that was sharded
+        positions (set[tuple[str, int]]): (file, line) of directives to rank
+
+    Returns:
+        dict[tuple[str, int], int]: Position of the first directive at each of
+                                    the given locations in a pre-order walk of
+                                    the tree, i.e. in document order with
+                                    included files spliced in
+    """
+    ranks: dict[tuple[str, int], int] = {}
+
+    def rank(directive: Directive):
+        position = (directive.file, directive.line)
+        if position in positions:
+            ranks.setdefault(position, len(ranks))
+
+    DirectiveUtil.traverse(config.directives, rank)
+    return ranks
+
+
+def merge_results(shard_results: list[Optional[Signature]], ranks: dict[tuple[str, int], int],
+                  signature: Optional[Callable[[NginxConfig], Signature]] = None) -> Optional[Signature]:
+    """
+    Merge the results of one signature across shards.
+
+    Args:
+        shard_results (list[Optional[Signature]]): Result on each shard, None
+                                                   where the signature was skipped
+        ranks (dict[tuple[str, int], int]): Result of get_document_ranks for
+                                            the flagged directives
+        signature (Callable, optional): Matcher function of the signature. If
+                                        it has a sort_findings function (see
+                                        Visitor.sort_findings), the merged
+                                        findings are put in its order
+
+    Returns:
+        Signature: Signature with the findings of every shard, in the order
+                   a serial scan reports them in. None if the signature was
+                   skipped on every shard
+    """
+    shard_results = [result for result in shard_results if result is not None]
+    if not shard_results:
+        return None
+
+    merged = Signature(
+        name=shard_results[0].name,
+        reference_url=shard_results[0].reference_url,
+        description=shard_results[0].description,
+        severity=shard_results[0].severity,
+        flagged=[flagged for result in shard_results for flagged in result.flagged],
+    )
+    merged.flagged.sort(key=lambda flagged: (ranks.get((flagged["file"], flagged["line"]), len(ranks)),
+                                             flagged["column_start"] or 0))
+    sort_findings = getattr(signature, 'sort_findings', None)
+    if sort_findings is not None:
+        sort_findings(merged.flagged)
+    return merged
@@ -1,22 +1,27 @@
 from dataclasses import dataclass, field
 from importlib import import_module
-from os import listdir, path
+import json
+from os import getpid, listdir, makedirs, path, replace, stat
 from pathlib import Path
 from enum import Enum
 import sys
 # add support for python<3.11
 if sys.version_info >= (3, 11):
-    from typing import Callable, Optional, Self, TypedDict
+    from typing import Callable, Iterable, Optional, Self, TypedDict, Union
 else:
-    from typing import Callable, Optional, TypedDict
+    from typing import Callable, Iterable, Optional, TypedDict, Union
     from typing_extensions import Self
 
-from .directive import Directive
-from .nginx_config import NginxConfigUtil
+from .directive import Directive, DirectiveUtil
+from .nginx_config import NginxConfig, NginxConfigUtil
+from .profiling import profile
 
 
 class Flagged(TypedDict):
+    file: str
     line: int
+    # Line of the ; or { ending the directive, if known
+    line_end: Optional[int]
     column_start: int
     column_end: int
     directive_and_args: list[str]
@@ -36,6 +41,36 @@ class Signature:
     description: str = ''
     severity: Severity = Severity.INFORMATION
 
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: JSON-serializable representation of the signature result
+        """
+        return {
+            "name": self.name,
+            "flagged": [dict(flagged) for flagged in self.flagged],
+            "reference_url": self.reference_url,
+            "description": self.description,
+            "severity": self.severity.value,
+        }
+
+    @classmethod
+    def from_dict(cls, signature_dict: dict) -> Self:
+        """
+        Args:
+            signature_dict (dict): Dictionary created by Signature.to_dict
+
+        Returns:
+            Signature
+        """
+        return cls(
+            name=signature_dict["name"],
+            flagged=[Flagged(**flagged) for flagged in signature_dict["flagged"]],
+            reference_url=signature_dict["reference_url"],
+            description=signature_dict["description"],
+            severity=Severity(signature_dict["severity"]),
+        )
+
 
 class SignatureBuilder:
     """
@@ -74,12 +109,13 @@ class SignatureBuilder:
         self.signature.flagged = flagged_list
         return self
 
-    def add_flagged(self, directive: Directive, config: Optional[str] = None):
+    def add_flagged(self, directive: Directive, config: Optional[Union[NginxConfig, str]] = None):
         """
         Args:
             directive (Directive): Directive object to flag out
-            config (str): Raw config file contents. Used to pinpoint location
-                          of the directive.
+            config (NginxConfig | str): NginxConfig object or raw config file
+                                        contents. Used to pinpoint location
+                                        of the directive.
 
         Returns:
             SignatureBuilder: Current builder instance
@@ -87,14 +123,29 @@ class SignatureBuilder:
         _config = config if config else self.config
 
         directive_and_args = [directive.directive, *directive.args]
-
-        # If no config is passed, unable to pinpoint location of the directive
-        if _config:
-            [column_start, column_end] = NginxConfigUtil.get_directive_position(_config, directive_and_args, directive.line)
+        column_start, column_end = None, None
+        line_end = None
+
+        # If no config is passed, unable to pinpoint location of the directive.
+        # NginxConfig objects slice the spans recorded by the parser, raw
+        # strings go through the (cached) utility method
+        with profile('positions'):
+            if isinstance(_config, NginxConfig):
+                position = _config.get_position(directive)
+                line_end = _config.get_last_line(directive)
+            elif _config:
+                position = NginxConfigUtil.get_directive_position(_config, directive_and_args, directive.line)
+            else:
+                position = None
+
+        if position:
+            [column_start, column_end] = position
 
         self.signature.flagged.append({
+            "file": directive.file,
             "directive_and_args": directive_and_args,
             "line": directive.line,
+            "line_end": line_end,
             "column_start": column_start,
             "column_end": column_end
         })
@@ -115,31 +166,38 @@ class SignatureBuilder:
 
 class SignatureUtil:
     @staticmethod
-    def get_line_to_signature_mapping(signatures: list[Signature]) -> dict[int, Signature]:
+    def get_line_to_signature_mapping(signatures: list[Signature],
+                                      filepath: Optional[str] = None) -> dict[int, Signature]:
         """
-        Get a dictionary which maps line numbers to Flagged dicts.
+        Get a dictionary which maps line numbers to Signatures.
 
         Args:
             signatures (list[Signature]): Signatures to create mapping for
+            filepath (str, optional): Only map lines flagged in this file.
+                                      Defaults to mapping every line.
 
         Returns:
-            dict[int, Flagged]: Line-to-Flagged mapping
+            dict[int, Signature]: Line-to-Signature mapping
         """
         mapping: dict[int, Signature] = {}
 
         for signature in signatures:
             for flagged in signature.flagged:
-                mapping[flagged["line"]] = signature
+                if SignatureUtil.is_flagged_in(flagged, filepath):
+                    mapping[flagged["line"]] = signature
 
         return mapping
 
     @staticmethod
-    def get_line_to_flagged_mapping(signatures: list[Signature]) -> dict[int, Flagged]:
+    def get_line_to_flagged_mapping(signatures: list[Signature],
+                                    filepath: Optional[str] = None) -> dict[int, Flagged]:
         """
         Get a dictionary which maps line numbers to Flagged dicts.
 
         Args:
             signatures (list[Signature]): Signatures to create mapping for
+            filepath (str, optional): Only map lines flagged in this file.
+                                      Defaults to mapping every line.
 
         Returns:
             dict[int, Flagged]: Line-to-Flagged mapping
@@ -148,42 +206,280 @@ class SignatureUtil:
 
         for signature in signatures:
             for flagged in signature.flagged:
-                mapping[flagged["line"]] = flagged
+                if SignatureUtil.is_flagged_in(flagged, filepath):
+                    mapping[flagged["line"]] = flagged
 
         return mapping
 
+    @staticmethod
+    def is_flagged_in(flagged: Flagged, filepath: Optional[str]) -> bool:
+        """
+        Args:
+            flagged (Flagged): Flagged dict
+            filepath (str): File path to check against. None matches any file
 
-def get_signatures(signatures_folder=None) -> list[Callable[[list[Directive]], Signature]]:
+        Returns:
+            bool: Whether the flagged directive is defined in the given file.
+                  Directives flagged without a file are assumed to be in it.
+        """
+        return filepath is None or flagged.get("file") in (None, filepath)
+
+    @staticmethod
+    def get_qualified_line(flagged: Flagged, filepath: Optional[str] = None) -> str:
+        """
+        Get the line number of a flagged directive, prefixed with its file
+        if it was defined in a file other than the given main config file.
+
+        Args:
+            flagged (Flagged): Flagged dict
+            filepath (str, optional): File path of the main config
+
+        Returns:
+            str: e.g. "12" or "conf.d/site.conf:12"
+        """
+        if flagged.get("file") in (None, filepath):
+            return str(flagged["line"])
+
+        return f'{flagged["file"]}:{flagged["line"]}'
+
+
+def inspects(*directives: str,
+             triggers: Optional[Iterable[str]] = None,
+             contexts: Optional[Iterable[str]] = None,
+             local: bool = False) -> Callable:
     """
-    Retrieves a list of signatures.
-    Each signature should be a python file in the specified signatures folder,
-    containing a function named "matcher". Each matcher function takes in
-    a list of Directive objects as a parameter.
+    Decorator for matcher functions, declaring which directives the signature
+    looks at. Matchers without the declaration are always run.
+
+    Example:
+        @inspects('location', 'alias', triggers=['alias'], contexts=['location'])
+        def matcher(config: NginxConfig) -> Signature:
 
     Args:
-        signatures_folder: If not provided, defaults to 'sigs' folder.
+        *directives (str): Names of every directive the matcher inspects
+        triggers (Iterable[str], optional): Directives of which at least one must
+                                            be present for the matcher to flag
+                                            anything. Defaults to all of directives
+        contexts (Iterable[str], optional): Blocks a trigger directive must be
+                                            defined in (e.g. "location", or "main"
+                                            for top-level). Defaults to any block
+        local (bool, optional): Whether every finding depends only on the
+                                top-level server block it is in (if any) and
+                                on the directives outside of server blocks,
+                                so that the matcher can run on each server
+                                block separately (see sharding)
 
     Returns:
-        list[Callable[[list[Directive]], None]]: _description_
+        Callable: Decorator which attaches the declaration to the matcher
     """
-    signatures = []
+    def decorator(matcher: Callable) -> Callable:
+        matcher.directives = frozenset(directives)
+        matcher.triggers = frozenset(triggers) if triggers is not None else frozenset(directives)
+        matcher.contexts = frozenset(contexts) if contexts is not None else None
+        matcher.local = local
+        return matcher
+
+    return decorator
+
+
+def is_applicable(signature: Callable, config: NginxConfig, directives_set: Optional[set[str]] = None) -> bool:
+    """
+    Check whether a signature could flag anything in a config, based on
+    the directives it declared through @inspects.
+
+    Args:
+        signature (Callable): Matcher function
+        config (NginxConfig): Config to check
+        directives_set (set[str], optional): Directive names in the config,
+                                             if already computed
+
+    Returns:
+        bool: False if none of the signature's trigger directives are present
+              (in the declared contexts)
+    """
+    triggers = getattr(signature, 'triggers', None)
+    if not triggers:
+        return True
+
+    contexts = getattr(signature, 'contexts', None)
+    if contexts is None:
+        if directives_set is None:
+            directives_set = DirectiveUtil.get_directives_set(config.directives)
+        return not triggers.isdisjoint(directives_set)
 
+    return any(not contexts.isdisjoint(config.index.contexts.get(trigger, ())) for trigger in triggers)
+
+
+def get_applicable_signatures(signatures: list[Callable[[NginxConfig], Signature]],
+                              config: NginxConfig) -> list[Callable[[NginxConfig], Signature]]:
+    """
+    Args:
+        signatures (list[Callable]): Matcher functions
+        config (NginxConfig): Config to check
+
+    Returns:
+        list[Callable]: Signatures that could flag anything in the config, in
+                        the same order
+    """
+    directives_set = DirectiveUtil.get_directives_set(config.directives)
+    return [signature for signature in signatures if is_applicable(signature, config, directives_set)]
+
+
+# Bump whenever the format of the signature manifest changes
+MANIFEST_VERSION = 3
+
+
+class LazySignature:
+    """
+    Stands in for the matcher function of a signature module until it is
+    first needed. Carries the declaration the matcher was decorated with
+    (see @inspects), so that signatures which cannot match a config are
+    never imported.
+    """
+    def __init__(self, module_name: str,
+                 directives: Optional[Iterable[str]] = None,
+                 triggers: Optional[Iterable[str]] = None,
+                 contexts: Optional[Iterable[str]] = None,
+                 local: bool = False,
+                 streaming: bool = False):
+        """
+        Args:
+            module_name (str): Name of the module in the 'sigs' package
+            directives (Iterable[str], optional): Declared directives
+            triggers (Iterable[str], optional): Declared trigger directives
+            contexts (Iterable[str], optional): Declared contexts
+            local (bool, optional): Declared locality
+            streaming (bool, optional): Whether the signature is a visitor
+                                        that can run while the config is
+                                        parsed (see Visitor.streaming)
+        """
+        self.module_name: str = module_name
+        self.directives: Optional[frozenset[str]] = frozenset(directives) if directives is not None else None
+        self.triggers: Optional[frozenset[str]] = frozenset(triggers) if triggers is not None else None
+        self.contexts: Optional[frozenset[str]] = frozenset(contexts) if contexts is not None else None
+        self.local: bool = local
+        self.streaming: bool = streaming
+        self._matcher: Optional[Callable[[NginxConfig], Signature]] = None
+
+    @property
+    def matcher(self) -> Callable[[NginxConfig], Signature]:
+        if self._matcher is None:
+            with profile('signature import'):
+                self._matcher = import_module(f'.sigs.{self.module_name}', package=__package__).matcher
+        return self._matcher
+
+    def __call__(self, config: NginxConfig) -> Signature:
+        return self.matcher(config)
+
+    def __getattr__(self, name: str):
+        # Anything else (e.g. a visitor class) comes from the matcher itself
+        if name.startswith('__') or name == '_matcher':
+            raise AttributeError(name)
+        return getattr(self.matcher, name)
+
+
+def get_manifest_path() -> str:
+    """
+    Returns:
+        str: Path of the signature manifest, in the cache folder
+    """
+    from .cache import get_cache_folder
+    return path.join(get_cache_folder(), 'signatures.json')
+
+
+def get_signature_manifest(signatures_folder: Optional[str] = None) -> list[dict]:
+    """
+    Get the module name and declaration of every signature in a folder.
+    The manifest is cached on disk and only rebuilt (by importing every
+    signature module) when a signature file is added, removed or modified.
+
+    Args:
+        signatures_folder (str, optional): Defaults to the 'sigs' folder
+
+    Returns:
+        list[dict]: One entry per signature file
+    """
     if signatures_folder is None:
         signatures_folder = path.join(Path(__file__).parent, 'sigs')
 
-    filenames = list(filter(
-        lambda filename: filename.endswith('.py') and not filename.endswith('__'),
-        listdir(signatures_folder))
-    )
-
+    filenames = [filename for filename in listdir(signatures_folder)
+                 if filename.endswith('.py') and not filename.startswith('__')]
+    stamps = {}
     for filename in filenames:
+        stat_result = stat(path.join(signatures_folder, filename))
+        stamps[filename] = [stat_result.st_mtime_ns, stat_result.st_size]
+
+    manifest_path = get_manifest_path()
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['version'] == MANIFEST_VERSION and manifest['folder'] == signatures_folder \
+                and manifest['stamps'] == stamps:
+            return manifest['signatures']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    entries = []
+    for filename in filenames:
+        module_name = path.splitext(filename)[0]
         try:
-            signature = import_module(
-                f'.sigs.{filename.rstrip(".py")}',
-                package=__package__
-            )
-            signatures.append(signature.matcher)
+            matcher = import_module(f'.sigs.{module_name}', package=__package__).matcher
         except Exception:
-            print(f'Unknown error loading signature from {path.join(signatures_folder, filename)}')
+            entries.append({"module": module_name, "error": True})
+            continue
+
+        declaration = {
+            key: sorted(getattr(matcher, key)) if getattr(matcher, key, None) is not None else None
+            for key in ('directives', 'triggers', 'contexts')
+        }
+        entries.append({"module": module_name, **declaration, "local": getattr(matcher, 'local', False),
+                        "streaming": getattr(matcher, 'streaming', False)})
+
+    manifest = {"version": MANIFEST_VERSION, "folder": signatures_folder, "stamps": stamps, "signatures": entries}
+    try:
+        makedirs(path.dirname(manifest_path), exist_ok=True)
+        # Written to a temporary file first, as concurrent runs may read it
+        temporary_path = f'{manifest_path}.{getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(manifest, f)
+        replace(temporary_path, manifest_path)
+    except OSError:
+        pass
+
+    return entries
+
+
+def get_signatures(signatures_folder=None, config: Optional[NginxConfig] = None) -> list[Callable[[NginxConfig], Signature]]:
+    """
+    Retrieves a list of signatures.
+    Each signature should be a python file in the specified signatures folder,
+    containing a function named "matcher". Each matcher function takes in
+    an NginxConfig object as a parameter.
+
+    Signature modules are listed from the signature manifest and only
+    imported once a signature is run (see LazySignature).
+
+    Args:
+        signatures_folder: If not provided, defaults to 'sigs' folder.
+        config (NginxConfig, optional): If provided, signatures that declared
+                                        directives absent from the config
+                                        are left out
+
+    Returns:
+        list[Callable[[NginxConfig], Signature]]: Matcher functions
+    """
+    if signatures_folder is None:
+        signatures_folder = path.join(Path(__file__).parent, 'sigs')
+
+    signatures = []
+    for entry in get_signature_manifest(signatures_folder):
+        if entry.get("error"):
+            print(f'Unknown error loading signature from {path.join(signatures_folder, entry["module"])}.py')
+            continue
+        signatures.append(LazySignature(entry["module"], entry["directives"], entry["triggers"],
+                                        entry["contexts"], entry["local"], entry["streaming"]))
+
+    if config is not None:
+        return get_applicable_signatures(signatures, config)
 
     return signatures
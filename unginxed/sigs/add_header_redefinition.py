@@ -1,21 +1,30 @@
-from ..directive import DirectiveUtil
+from ..directive import Directive
+from ..engine import Visitor
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
 
-signature_builder: SignatureBuilder = None
 
+class AddHeaderRedefinition(Visitor):
+    local = True
 
-def matcher(config: NginxConfig) -> Signature:
-    signature_builder = SignatureBuilder(config.raw).set_name('add_header Redefinition') \
-                                          .set_reference_url('https://github.com/yandex/gixy/blob/master/docs/en/plugins/addheaderredefinition.md') \
-                                          .set_description('Lower level add_header redefinition overwrites higher level add_header definitions, causing high level definitions to be lost.') \
-                                          .set_severity(1)
-    add_header_directives = DirectiveUtil.get_directives('add_header', config.directives)
-    for directive in add_header_directives:
-        if not directive.parent.parent:
-            continue
-        temp = [d for d in directive.parent.parent.block if d.directive == 'add_header']
-        if temp:
-            signature_builder.add_flagged(directive, config.raw)
+    def __init__(self, config: NginxConfig):
+        super().__init__(config)
+        self.signature_builder.set_name('add_header Redefinition') \
+                              .set_reference_url('https://github.com/yandex/gixy/blob/master/docs/en/plugins/addheaderredefinition.md') \
+                              .set_description('Lower level add_header redefinition overwrites higher level add_header definitions, causing high level definitions to be lost.') \
+                              .set_severity(1)
 
-    return signature_builder.build()
+    def on_add_header(self, directive: Directive, ancestors: list[Directive]):
+        block = directive.parent
+        if block is None:
+            return
+        inherited = self.config.inheritance.get_inherited(block, 'add_header')
+        if not inherited:
+            return
+        # Headers of the enclosing blocks that this block does not set again are lost
+        own_headers = {header.args[0].lower() for header in self.config.inheritance.get(block, 'add_header')
+                       if header.args}
+        if any(header.args and header.args[0].lower() not in own_headers for header in inherited):
+            self.flag(directive)
+
+
+matcher = AddHeaderRedefinition.as_matcher()
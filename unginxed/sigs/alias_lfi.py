@@ -1,22 +1,25 @@
-from ..directive import DirectiveUtil
+from ..directive import Directive
+from ..engine import Visitor
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
 
 
-def matcher(config: NginxConfig) -> Signature:
-    signature_builder = SignatureBuilder(config.raw).set_name('Alias traversal') \
-                                          .set_reference_url('https://www.acunetix.com/vulnerabilities/web/path-traversal-via-misconfigured-nginx-alias/') \
-                                          .set_description('Location for aliases not ending with a / could allow an attacker to read file stored outside the target folder.') \
-                                          .set_severity(3)
+class AliasTraversal(Visitor):
+    directives = ['location', 'alias']
+    triggers = ['alias']
+    contexts = ['location']
+    local = True
 
-    location_directives = DirectiveUtil.get_directives('location', config.directives)
+    def __init__(self, config: NginxConfig):
+        super().__init__(config)
+        self.signature_builder.set_name('Alias traversal') \
+                              .set_reference_url('https://www.acunetix.com/vulnerabilities/web/path-traversal-via-misconfigured-nginx-alias/') \
+                              .set_description('Location for aliases not ending with a / could allow an attacker to read file stored outside the target folder.') \
+                              .set_severity(3)
 
-    for location_directive in location_directives:
-        blocks = location_directive.block
-
-        for directive in blocks:
-            # print(directive)
+    def on_location(self, location_directive: Directive, ancestors: list[Directive]):
+        for directive in location_directive.block:
             if directive.directive == 'alias' and not location_directive.get_full_directive().endswith('/'):
-                signature_builder.add_flagged(location_directive, config.raw)
+                self.flag(location_directive)
+
 
-    return signature_builder.build()
+matcher = AliasTraversal.as_matcher()
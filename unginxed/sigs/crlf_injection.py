@@ -1,20 +1,39 @@
-from ..directive import DirectiveUtil
+from ..directive import Directive
+from ..engine import Visitor
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
+from ..signature import Flagged
 
 
-def matcher(config: NginxConfig) -> Signature:
-    crlf_directives = ['rewrite', 'return', 'add_header', 'proxy_set_header', 'proxy_pass']
-    crlf_indicators = ['$uri', '$document_uri']
-    signature_builder = SignatureBuilder(config.raw).set_name('CRLF Injection') \
-                                          .set_reference_url('https://www.acunetix.com/vulnerabilities/web/crlf-injection-http-response-splitting-web-server/') \
-                                          .set_description('Improper usage of normalized URI variables $uri and $document_uri could allow an attacker to perform cross site scripting.') \
-                                          .set_severity(3)
+class CRLFInjection(Visitor):
+    local = True
+    streaming = True
 
-    return_directives = [return_directive for directive in crlf_directives for return_directive in DirectiveUtil.get_directives(directive, config.directives)]
+    CRLF_DIRECTIVES = ['rewrite', 'return', 'add_header', 'proxy_set_header', 'proxy_pass']
+    CRLF_VARIABLES = frozenset(['uri', 'document_uri'])
 
-    for return_directive in return_directives:
-        if any(crlf_indicator in return_directive.get_full_args() for crlf_indicator in crlf_indicators):
-            signature_builder.add_flagged(return_directive, config.raw)
+    def __init__(self, config: NginxConfig):
+        super().__init__(config)
+        self.signature_builder.set_name('CRLF Injection') \
+                              .set_reference_url('https://www.acunetix.com/vulnerabilities/web/crlf-injection-http-response-splitting-web-server/') \
+                              .set_description('Improper usage of normalized URI variables $uri and $document_uri could allow an attacker to perform cross site scripting.') \
+                              .set_severity(3)
 
-    return signature_builder.build()
+    def check(self, directive: Directive, ancestors: list[Directive]):
+        if not self.CRLF_VARIABLES.isdisjoint(self.config.variables.get_variables(directive)):
+            self.flag(directive)
+
+    on_rewrite = on_return = on_add_header = on_proxy_set_header = on_proxy_pass = check
+
+    @classmethod
+    def sort_findings(cls, flagged: list[Flagged]) -> None:
+        # Grouped by directive name. The sort is stable, so each group stays
+        # in document order, which (line, column) would not be across
+        # included files
+        flagged.sort(key=cls.get_order)
+
+    @classmethod
+    def get_order(cls, flagged: Flagged) -> int:
+        return cls.CRLF_DIRECTIVES.index(flagged["directive_and_args"][0])
+
+
+matcher = CRLFInjection.as_matcher()
@@ -1,17 +1,26 @@
-from ..directive import DirectiveUtil
+from ..directive import Directive
+from ..engine import Visitor
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
 
 
-def matcher(config: NginxConfig) -> Signature:
-    signature_builder = SignatureBuilder(config.raw).set_name('Host Spoofing') \
-                                          .set_reference_url('https://github.com/yandex/gixy/blob/master/docs/en/plugins/hostspoofing.md') \
-                                          .set_description('Usage of $http_host instead of $host may lead to unexpected behaviour (such as phishing and SSRF) due to order of precedence') \
-                                          .set_severity(2)
+class HostSpoofing(Visitor):
+    local = True
+    streaming = True
 
-    proxy_header_directives = DirectiveUtil.get_directives('proxy_set_header', config.directives)
-    for directive in proxy_header_directives:
-        if 'Host' in directive.args and '$http_host' in directive.args:
-            signature_builder.add_flagged(directive, config.raw)
+    def __init__(self, config: NginxConfig):
+        super().__init__(config)
+        self.signature_builder.set_name('Host Spoofing') \
+                              .set_reference_url('https://github.com/yandex/gixy/blob/master/docs/en/plugins/hostspoofing.md') \
+                              .set_description('Usage of $http_host instead of $host may lead to unexpected behaviour (such as phishing and SSRF) due to order of precedence') \
+                              .set_severity(2)
 
-    return signature_builder.build()
+    def on_proxy_set_header(self, directive: Directive, ancestors: list[Directive]):
+        # Header names are case-insensitive, and $http_host may be part of a longer value
+        if not directive.args or directive.args[0].lower() != 'host':
+            return
+        if any(reference.variable == 'http_host' and reference.arg_index > 0
+               for reference in self.config.variables.get_directive_references(directive)):
+            self.flag(directive)
+
+
+matcher = HostSpoofing.as_matcher()
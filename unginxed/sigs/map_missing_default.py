@@ -1,22 +1,24 @@
-from ..directive import DirectiveUtil
+from ..directive import Directive
+from ..engine import Visitor
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
 
 
-def matcher(config: NginxConfig) -> Signature:
-    signature_builder = SignatureBuilder(config.raw).set_name('Missing Default Value for map Directive') \
-                                          .set_reference_url('https://book.hacktricks.xyz/network-services-pentesting/pentesting-web/nginx') \
-                                          .set_description('If map is used for authorisation, not including a default value can lead to unexpected behaviour.') \
-                                          .set_severity(1)
+class MapMissingDefault(Visitor):
+    local = True
+
+    def __init__(self, config: NginxConfig):
+        super().__init__(config)
+        self.signature_builder.set_name('Missing Default Value for map Directive') \
+                              .set_reference_url('https://book.hacktricks.xyz/network-services-pentesting/pentesting-web/nginx') \
+                              .set_description('If map is used for authorisation, not including a default value can lead to unexpected behaviour.') \
+                              .set_severity(1)
+
+    def on_map(self, map_directive: Directive, ancestors: list[Directive]):
+        contains_default = any('default' in block_directive.get_full_directive()
+                               for block_directive in map_directive.block)
 
-    return_directives = DirectiveUtil.get_directives('map', config.directives)
-    for return_directive in return_directives:
-        contains_default = False
-        for block_directive in return_directive.block:
-            if 'default' in block_directive.get_full_directive():
-                contains_default = True
-        
         if not contains_default:
-            signature_builder.add_flagged(return_directive, config.raw)
+            self.flag(map_directive)
+
 
-    return signature_builder.build()
+matcher = MapMissingDefault.as_matcher()
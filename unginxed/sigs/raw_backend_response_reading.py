@@ -1,18 +1,24 @@
-from ..directive import DirectiveUtil
+from ..directive import Directive
+from ..engine import Visitor
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
 
 
-def matcher(config: NginxConfig) -> Signature:
-    signature_builder = SignatureBuilder(config.raw).set_name('Raw Backend Response Reading') \
-                                          .set_reference_url('https://blog.detectify.com/2020/11/10/common-nginx-misconfigurations') \
-                                          .set_description('If Nginx does not understand the request type, usage of proxy_hide_header and proxy_intercept_errors will fail to hide potential sensitive information') \
-                                          .set_severity(1)
+class RawBackendResponseReading(Visitor):
+    directives = ['proxy_hide_header', 'proxy_intercept_errors']
+    triggers = ['proxy_hide_header']
+    local = True
 
-    hide_headers_directive = DirectiveUtil.get_directives('proxy_hide_header', config.directives)
-    for directive in hide_headers_directive:
-        sub_directives = [sub_directive.directive for sub_directive in directive.parent.block]
-        if 'proxy_intercept_errors' in sub_directives:
-            signature_builder.add_flagged(directive, config.raw)
+    def __init__(self, config: NginxConfig):
+        super().__init__(config)
+        self.signature_builder.set_name('Raw Backend Response Reading') \
+                              .set_reference_url('https://blog.detectify.com/2020/11/10/common-nginx-misconfigurations') \
+                              .set_description('If Nginx does not understand the request type, usage of proxy_hide_header and proxy_intercept_errors will fail to hide potential sensitive information') \
+                              .set_severity(1)
 
-    return signature_builder.build()
+    def on_proxy_hide_header(self, directive: Directive, ancestors: list[Directive]):
+        # proxy_intercept_errors may be turned on in an enclosing block
+        if self.config.inheritance.get_value(directive.parent, 'proxy_intercept_errors') == ['on']:
+            self.flag(directive)
+
+
+matcher = RawBackendResponseReading.as_matcher()
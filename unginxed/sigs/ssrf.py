@@ -1,40 +1,40 @@
-from ..directive import DirectiveUtil
+from ..directive import Directive
+from ..engine import Visitor
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
-from re import compile
+from ..predicates import has_capture_groups, is_regex_location, parse_location
 
 
-def _uses_regex(arg: str) -> bool:
-    return compile(arg).groups != 0
+class SSRF(Visitor):
+    directives = ['location', 'internal', 'proxy_pass']
+    triggers = ['proxy_pass']
+    contexts = ['location']
+    local = True
 
+    def __init__(self, config: NginxConfig):
+        super().__init__(config)
+        self.signature_builder.set_name('SSRF') \
+                              .set_reference_url('https://github.com/yandex/gixy/blob/master/docs/en/plugins/ssrf.md') \
+                              .set_description('Possible SSRF due to attacker controlled parameters to proxy_pass, without restrictions(internal)') \
+                              .set_severity(2)
 
-def _uses_vars(arg: str) -> bool:
-    return '$' in arg
-
-
-def matcher(config: NginxConfig) -> Signature:
-    signature_builder = SignatureBuilder(config.raw).set_name('SSRF') \
-                                          .set_reference_url('https://github.com/yandex/gixy/blob/master/docs/en/plugins/ssrf.md') \
-                                          .set_description('Possible SSRF due to attacker controlled parameters to proxy_pass, without restrictions(internal)') \
-                                          .set_severity(2)
-
-    location_directives = DirectiveUtil.get_directives('location', config.directives)
-    for location_directive in location_directives:
+    def on_location(self, location_directive: Directive, ancestors: list[Directive]):
         blocks = location_directive.block
         directives = [directive.directive for directive in blocks]
         if 'internal' in directives:
-            continue
+            return
         # case of proxy pass without internal and location has regex
         proxy_pass = [directive for directive in blocks if directive.directive == 'proxy_pass']
         if not proxy_pass:
-            continue
-        location_arg = location_directive.get_full_args()
-        for pp_arg in proxy_pass[0].args:
-            if _uses_regex(location_arg) and _uses_vars(pp_arg):
-                signature_builder.add_flagged(location_directive, config.raw)
+            return
+        uses_regex = is_regex_location(location_directive) \
+            and has_capture_groups(parse_location(location_directive)[1])
+        variable_args = {reference.arg_index for reference in self.config.variables.get_directive_references(proxy_pass[0])}
+        for arg_index in range(len(proxy_pass[0].args)):
+            if uses_regex and arg_index in variable_args:
+                self.flag(location_directive)
             # case of proxy pass with variable without internal
-            elif not _uses_regex(location_arg) and _uses_vars(pp_arg):
-                signature_builder.add_flagged(proxy_pass[0], config.raw)
+            elif not uses_regex and arg_index in variable_args:
+                self.flag(proxy_pass[0])
 
 
-    return signature_builder.build()
+matcher = SSRF.as_matcher()
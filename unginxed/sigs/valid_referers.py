@@ -1,17 +1,22 @@
-from ..directive import DirectiveUtil
+from ..directive import Directive
+from ..engine import Visitor
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
 
 
-def matcher(config: NginxConfig) -> Signature:
-    signature_builder = SignatureBuilder(config.raw).set_name('Valid Referers') \
-                                          .set_reference_url('https://github.com/yandex/gixy/blob/master/docs/en/plugins/validreferers.md') \
-                                          .set_description('none is an allowed referer amongst other filtered referers') \
-                                          .set_severity(1)
+class ValidReferers(Visitor):
+    local = True
+    streaming = True
 
-    referers_directives = DirectiveUtil.get_directives('valid_referers', config.directives)
-    for directive in referers_directives:
+    def __init__(self, config: NginxConfig):
+        super().__init__(config)
+        self.signature_builder.set_name('Valid Referers') \
+                              .set_reference_url('https://github.com/yandex/gixy/blob/master/docs/en/plugins/validreferers.md') \
+                              .set_description('none is an allowed referer amongst other filtered referers') \
+                              .set_severity(1)
+
+    def on_valid_referers(self, directive: Directive, ancestors: list[Directive]):
         if len(directive.args) > 1 and 'none' in directive.args:
-            signature_builder.add_flagged(directive, config.raw)
+            self.flag(directive)
+
 
-    return signature_builder.build()
+matcher = ValidReferers.as_matcher()
@@ -0,0 +1,213 @@
+"""
+Scans a config while it is being parsed.
+
+Visitor signatures declaring streaming = True (see Visitor.streaming) are
+handed each directive as soon as it is parsed, and their findings are
+yielded right away instead of once the whole tree is built. Signatures
+that need the whole tree are run once the config is parsed, and their
+findings yielded last. When every signature streams, the tree is not built
+at all, and each block is released as soon as it is closed, e.g. so that
+huge generated lists of server blocks are scanned in little memory.
+
+Files are memory-mapped and parsed as in low memory mode (see mapped.py).
+"""
+
+from typing import Callable, Iterator, NamedTuple, Optional
+
+from .directive import Directive, DirectiveList
+from .engine import ScanEngine, Visitor, get_dispatch
+from .mapped import MappedConfigLoader
+from .nginx_config import NginxConfig
+from .signature import Flagged, Signature
+from .variables import VariableIndex
+
+
+class Finding(NamedTuple):
+    """
+    A directive flagged by a signature, as soon as it is flagged
+    """
+    # Result of the signature, only complete once the scan is done
+    signature: Signature
+    flagged: Flagged
+
+
+class StreamingConfig(NginxConfig):
+    """
+    Config whose directives are handed out while it is parsed, see load.
+    Until the parse is done, directives and index are empty, and variables
+    only covers the directive being handed out.
+    """
+    def __init__(self, filepath: str):
+        """
+        Args:
+            filepath (str): Absolute or relative path to the config file
+        """
+        self._set_up(filepath, MappedConfigLoader(filepath))
+        self.directives: list[Directive] = DirectiveList()
+        self.index = self.directives.index
+        # Directive being handed out, None once the parse is done
+        self.current: Optional[Directive] = None
+        self._current_variables: Optional[tuple[Directive, VariableIndex]] = None
+
+    @property
+    def variables(self) -> VariableIndex:
+        current = self.current
+        if current is None:
+            return NginxConfig.variables.fget(self)
+        if self._current_variables is None or self._current_variables[0] is not current:
+            variables = VariableIndex([])
+            variables.add(current)
+            self._current_variables = (current, variables)
+        return self._current_variables[1]
+
+    def load(self, keep_tree: bool = True) -> Iterator[Directive]:
+        """
+        Parse the config, handing out each directive as soon as it is
+        parsed (see MappedConfigLoader.iter_load).
+
+        Args:
+            keep_tree (bool, optional): Build the tree, and complete the
+                                        config with it once the parse is done.
+                                        Otherwise each block is released
+                                        once it is closed
+
+        Yields:
+            Directive: Every directive and comment of the config
+
+        Raises:
+            RuntimeError: If the config has no directives, once the parse is done
+        """
+        num_directives = 0
+        for directive in self.loader.iter_load(keep_tree):
+            self.current = directive
+            num_directives += 1
+            yield directive
+        self.current = None
+        self._current_variables = None
+
+        if not num_directives:
+            raise RuntimeError('Invalid NGINX config!')
+        if keep_tree:
+            self._set_directives(self.loader.index_tree())
+        else:
+            self.raw = self.sources[self.filepath]
+
+
+def get_ancestors(directive: Directive) -> list[Directive]:
+    """
+    Args:
+        directive (Directive): Directive
+
+    Returns:
+        list[Directive]: Directives enclosing it, outermost first
+    """
+    ancestors = []
+    ancestor = directive.parent
+    while ancestor is not None:
+        ancestors.append(ancestor)
+        ancestor = ancestor.parent
+    ancestors.reverse()
+    return ancestors
+
+
+class StreamingScan:
+    """
+    Runs a set of signatures over a config while it is parsed. Iterating
+    over the scan runs it, yielding each finding as soon as it is made.
+
+    Streaming visitors are run during the parse, unless they declared
+    contexts, which can only be checked once the parse is done. Whether
+    they apply to the config (see @inspects) is decided once the parse is
+    done as well. Every other signature is run by a ScanEngine at the end.
+
+    Files the native parser gives up on part way (see mapped.py) are
+    handed out again once crossplane has parsed them. Findings already
+    yielded are not yielded again, but are not withdrawn either, should
+    crossplane read the file differently.
+
+    Example:
+        scan = StreamingScan(filepath, get_signatures())
+        for finding in scan:
+            print(finding.signature.name, finding.flagged["line"])
+        results = scan.get_results()
+    """
+    def __init__(self, filepath: str, signatures: list[Callable[[NginxConfig], Signature]]):
+        """
+        Args:
+            filepath (str): Path to the config file
+            signatures (list[Callable]): Matcher functions, e.g. from get_signatures()
+        """
+        self.config: StreamingConfig = StreamingConfig(filepath)
+        self.signatures: list[Callable[[NginxConfig], Signature]] = signatures
+        self.results: list[Optional[Signature]] = [None] * len(signatures)
+
+    def __iter__(self) -> Iterator[Finding]:
+        streaming: dict[int, Callable[[NginxConfig], Signature]] = {
+            signature_index: signature for signature_index, signature in enumerate(self.signatures)
+            if getattr(signature, 'streaming', False) and getattr(signature, 'contexts', None) is None
+        }
+        others = [signature_index for signature_index in range(len(self.signatures))
+                  if signature_index not in streaming]
+
+        visitors: dict[int, Visitor] = {signature_index: signature.visitor(self.config)
+                                        for signature_index, signature in streaming.items()}
+        callbacks, all_directives_callbacks = get_dispatch(list(visitors.values()))
+        trigger_names = frozenset().union(*(getattr(signature, 'triggers', None) or ()
+                                            for signature in streaming.values()))
+        triggered: set[str] = set()
+        # Positions flagged by each visitor, as files may be handed out twice
+        reported: dict[Visitor, set[tuple]] = {visitor: set() for visitor in visitors.values()}
+
+        for directive in self.config.load(keep_tree=bool(others)):
+            name = directive.directive
+            if name in trigger_names:
+                triggered.add(name)
+
+            directive_callbacks = callbacks.get(name, ())
+            if not directive_callbacks and not all_directives_callbacks:
+                continue
+
+            ancestors = get_ancestors(directive)
+            for callback in (*directive_callbacks, *all_directives_callbacks):
+                visitor = callback.__self__
+                flagged = visitor.signature_builder.signature.flagged
+                num_flagged = len(flagged)
+                callback(directive, ancestors)
+                yield from self._report(visitor, flagged, num_flagged, reported[visitor])
+
+        for signature_index, visitor in visitors.items():
+            triggers = getattr(self.signatures[signature_index], 'triggers', None)
+            if not triggers or not triggers.isdisjoint(triggered):
+                self.results[signature_index] = visitor.finish()
+
+        if others:
+            results = ScanEngine([self.signatures[signature_index] for signature_index in others]) \
+                .run_all(self.config)
+            for signature_index, result in zip(others, results):
+                self.results[signature_index] = result
+                if result is not None:
+                    for flagged in result.flagged:
+                        yield Finding(result, flagged)
+
+    @staticmethod
+    def _report(visitor: Visitor, flagged: list[Flagged], start: int, reported: set[tuple]) -> Iterator[Finding]:
+        signature = visitor.signature_builder.signature
+        flagged_index = start
+        while flagged_index < len(flagged):
+            entry = flagged[flagged_index]
+            key = (entry["file"], entry["line"], entry["column_start"], entry["column_end"])
+            if key in reported:
+                del flagged[flagged_index]
+                continue
+            reported.add(key)
+            flagged_index += 1
+            yield Finding(signature, entry)
+
+    def get_results(self) -> list[Signature]:
+        """
+        Returns:
+            list[Signature]: Results of the applicable signatures, in the
+                             order of the signatures, as ScanEngine.run
+                             returns them. Complete once the scan is done
+        """
+        return [result for result in self.results if result is not None]
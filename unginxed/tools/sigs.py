@@ -17,11 +17,14 @@ def handle_create(args):
 
     template = f"""
 from ..nginx_config import NginxConfig
-from ..signature import Signature, SignatureBuilder
+from ..signature import Signature, SignatureBuilder, inspects
 
 
+# Declare the directives your logic looks at, so that the signature is skipped
+# for configs without them. Remove the decorator if the signature flags an absence.
+@inspects()
 def matcher(config: NginxConfig) -> Signature:
-    signature_builder = SignatureBuilder(config.raw).set_name('{name}') \\
+    signature_builder = SignatureBuilder(config).set_name('{name}') \\
                                           .set_reference_url('') \\
                                           .set_description('') \\
                                           .set_severity()
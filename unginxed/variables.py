@@ -0,0 +1,125 @@
+from typing import Iterable, NamedTuple, Optional
+
+from .directive import Directive, DirectiveIndex, DirectiveUtil
+from .predicates import get_variables
+
+
+class VariableReference(NamedTuple):
+    """
+    A reference to a variable (e.g. $uri) in an argument of a directive
+    """
+    directive: Directive
+    # Index into directive.args
+    arg_index: int
+    # Variable name, without the $
+    variable: str
+
+
+class VariableIndex:
+    """
+    Lookup tables of the variables referenced by directive arguments, so
+    that signatures can find the users of a variable without scanning the
+    arguments of every directive. Every argument is tokenized once.
+    """
+    def __init__(self, directives: list[Directive], index: Optional[DirectiveIndex] = None):
+        """
+        Args:
+            directives (list[Directive]): Top-level directives of the tree
+            index (DirectiveIndex, optional): Index of the tree. Lookups are
+                                              recorded in it while it records
+        """
+        self.index: Optional[DirectiveIndex] = index
+        self.by_variable: dict[str, list[VariableReference]] = {}
+        self.by_directive: dict[Directive, list[VariableReference]] = {}
+        DirectiveUtil.traverse(directives, self.add)
+
+    def add(self, directive: Directive) -> None:
+        """
+        Register the variable references of a directive. Directives must be
+        added in document order.
+
+        Args:
+            directive (Directive): Directive to register
+        """
+        for arg_index, arg in enumerate(directive.args):
+            for variable in get_variables(arg):
+                reference = VariableReference(directive, arg_index, variable)
+                self.by_variable.setdefault(variable, []).append(reference)
+                self.by_directive.setdefault(directive, []).append(reference)
+
+    def get_references(self, variable: str, directive_names: Optional[Iterable[str]] = None) -> list[VariableReference]:
+        """
+        Args:
+            variable (str): Variable name, without the $
+            directive_names (Iterable[str], optional): Only return references
+                                                       in directives of these names
+
+        Returns:
+            list[VariableReference]: References to the variable, in document order
+        """
+        references = self.by_variable.get(variable, ())
+        if directive_names is None:
+            self._record([DirectiveIndex.ALL_NAMES])
+            return list(references)
+
+        directive_names = set(directive_names)
+        self._record(directive_names)
+        return [reference for reference in references if reference.directive.directive in directive_names]
+
+    def get_directives(self, *variables: str, directive_names: Optional[Iterable[str]] = None) -> list[Directive]:
+        """
+        Args:
+            *variables (str): Variable names, without the $
+            directive_names (Iterable[str], optional): Only return directives of these names
+
+        Returns:
+            list[Directive]: Directives referencing any of the variables, each
+                             once, in document order
+        """
+        if directive_names is not None:
+            directive_names = set(directive_names)
+
+        directives: dict[Directive, None] = {}
+        for variable in variables:
+            for reference in self.get_references(variable, directive_names):
+                directives[reference.directive] = None
+        if len(variables) < 2:
+            return list(directives)
+        # Directives were registered in document order
+        return [directive for directive in self.by_directive if directive in directives]
+
+    def get_directive_references(self, directive: Directive) -> list[VariableReference]:
+        """
+        Args:
+            directive (Directive): Directive in the indexed tree
+
+        Returns:
+            list[VariableReference]: Variables referenced by the directive, by argument
+        """
+        return list(self.by_directive.get(directive, ()))
+
+    def get_variables(self, directive: Directive, arg_index: Optional[int] = None) -> set[str]:
+        """
+        Args:
+            directive (Directive): Directive in the indexed tree
+            arg_index (int, optional): Only look at this argument
+
+        Returns:
+            set[str]: Names of the variables referenced by the directive
+        """
+        return {reference.variable for reference in self.by_directive.get(directive, ())
+                if arg_index is None or reference.arg_index == arg_index}
+
+    def names(self) -> set[str]:
+        """
+        Returns:
+            set[str]: Names of every variable referenced in the tree
+        """
+        self._record([DirectiveIndex.ALL_NAMES])
+        return set(self.by_variable)
+
+    def _record(self, directive_names: Iterable[str]) -> None:
+        # Which directives reference a variable depends on the directives
+        # searched, so those count as looked up (see DirectiveIndex.record)
+        if self.index is not None:
+            self.index.mark_looked_up(directive_names)
@@ -0,0 +1,214 @@
+from os import stat
+from time import perf_counter, sleep
+from typing import Callable, Iterable, Optional
+
+from .batch import expand_config_paths
+from .directive import DirectiveIndex
+from .nginx_config import NginxConfig
+from .signature import Signature, get_signatures, is_applicable
+
+
+class WatchSession:
+    """
+    Keeps a config loaded along with its signature results, so that a
+    change to one of its files only re-parses that file and re-runs the
+    signatures that looked up the affected directives.
+    """
+    def __init__(self, filepath: str, signatures: list[Callable[[NginxConfig], Signature]]):
+        """
+        Args:
+            filepath (str): Path to the main config file
+            signatures (list[Callable]): Signature matchers to run
+
+        Raises:
+            Same as NginxConfig, if the config cannot be loaded
+        """
+        self.filepath: str = filepath
+        self.signatures: list[Callable[[NginxConfig], Signature]] = signatures
+        self.config: NginxConfig = None
+        # None for signatures skipped as not applicable to the config
+        self.results: list[Optional[Signature]] = []
+        # Directive names each signature looked up on its last run, or declared
+        # through @inspects if it was skipped
+        self.watched: list[set[str]] = []
+        self.load()
+
+    def load(self) -> int:
+        """
+        (Re)load the whole config and run every applicable signature.
+
+        Returns:
+            int: Number of signatures that were run
+        """
+        self.config = NginxConfig(self.filepath)
+        self.results = [None] * len(self.signatures)
+        self.watched = [set() for _ in self.signatures]
+        return sum(self._run(signature_index) for signature_index in range(len(self.signatures)))
+
+    def get_results(self) -> list[Signature]:
+        """
+        Returns:
+            list[Signature]: Results of the signatures that were run
+        """
+        return [result for result in self.results if result is not None]
+
+    def get_files(self) -> list[str]:
+        """
+        Returns:
+            list[str]: The main config file and every file it includes
+        """
+        return list(self.config.sources)
+
+    def update(self, changed_files: set[str]) -> int:
+        """
+        Apply changes to files of this config.
+
+        Args:
+            changed_files (set[str]): Paths of files that were modified or removed
+
+        Returns:
+            int: Number of signatures that were re-run
+        """
+        if self.filepath in changed_files or self.config.has_include_changes():
+            return self.load()
+
+        changed_names: set[str] = set()
+        for filepath in changed_files:
+            if filepath in self.config.sources:
+                changed_names |= self.config.reload_file(filepath)
+
+        num_rerun = 0
+        for signature_index, watched in enumerate(self.watched):
+            if DirectiveIndex.ALL_NAMES in watched or watched & changed_names:
+                num_rerun += self._run(signature_index)
+
+        return num_rerun
+
+    def _run(self, signature_index: int) -> bool:
+        signature = self.signatures[signature_index]
+        if not is_applicable(signature, self.config):
+            self.results[signature_index] = None
+            self.watched[signature_index] = set(signature.directives)
+            return False
+
+        self.watched[signature_index] = self.config.index.record()
+        try:
+            self.results[signature_index] = signature(self.config)
+        finally:
+            self.config.index.stop_recording()
+        return True
+
+
+class ConfigWatcher:
+    """
+    Watches config files for changes by polling their modification times,
+    incrementally re-scanning the configs they belong to.
+    """
+    def __init__(self, targets: Iterable[str],
+                 on_update: Callable[[WatchSession, int, float], None],
+                 on_error: Callable[[str, Exception], None],
+                 interval: float = 1.0):
+        """
+        Args:
+            targets (Iterable[str]): File paths, directories or glob patterns of
+                                     the main config files. Directories and
+                                     patterns are re-expanded on every poll, so
+                                     that new configs are picked up.
+            on_update (Callable): Called with the session, the number of
+                                  signatures run and the time taken, whenever
+                                  a config is (re-)scanned
+            on_error (Callable): Called with the file path and the exception
+                                 when a config cannot be loaded
+            interval (float, optional): Seconds between polls
+        """
+        self.targets: list[str] = list(targets)
+        self.on_update = on_update
+        self.on_error = on_error
+        self.interval: float = interval
+        self.signatures: list[Callable[[NginxConfig], Signature]] = get_signatures()
+        self.sessions: dict[str, Optional[WatchSession]] = {}
+        self.mtimes: dict[str, Optional[tuple[int, int]]] = {}
+
+    def poll(self) -> None:
+        """
+        Check every watched file once, and re-scan the configs affected by
+        the files that changed since the previous poll.
+        """
+        filepaths = expand_config_paths(self.targets)
+
+        for filepath in list(self.sessions):
+            if filepath not in filepaths:
+                del self.sessions[filepath]
+
+        for filepath in filepaths:
+            if filepath not in self.sessions:
+                self._load(filepath)
+
+        changed_files = set()
+        for filepath in self._get_watched_files():
+            mtime = _get_mtime(filepath)
+            if filepath in self.mtimes and self.mtimes[filepath] != mtime:
+                changed_files.add(filepath)
+            self.mtimes[filepath] = mtime
+
+        for filepath, session in list(self.sessions.items()):
+            if session is None:
+                # Config could not be loaded before, retry once it changes
+                if filepath in changed_files:
+                    self._load(filepath)
+                continue
+
+            session_changed_files = changed_files.intersection(session.get_files())
+            if not session_changed_files and not session.config.has_include_changes():
+                continue
+
+            start = perf_counter()
+            try:
+                num_rerun = session.update(session_changed_files)
+            except Exception as e:
+                self.sessions[filepath] = None
+                self.on_error(filepath, e)
+                continue
+            self.on_update(session, num_rerun, perf_counter() - start)
+
+        # Pick up files that became part of a config through the update
+        for filepath in self._get_watched_files():
+            self.mtimes.setdefault(filepath, _get_mtime(filepath))
+
+    def run(self) -> None:
+        """
+        Poll forever, until interrupted.
+        """
+        while True:
+            self.poll()
+            sleep(self.interval)
+
+    def _load(self, filepath: str) -> None:
+        start = perf_counter()
+        try:
+            session = WatchSession(filepath, self.signatures)
+        except Exception as e:
+            self.sessions[filepath] = None
+            self.mtimes.setdefault(filepath, _get_mtime(filepath))
+            self.on_error(filepath, e)
+            return
+
+        self.sessions[filepath] = session
+        self.on_update(session, len(session.get_results()), perf_counter() - start)
+
+    def _get_watched_files(self) -> set[str]:
+        watched_files = set()
+        for filepath, session in self.sessions.items():
+            watched_files.add(filepath)
+            if session is not None:
+                watched_files.update(session.get_files())
+        return watched_files
+
+
+def _get_mtime(filepath: str) -> Optional[tuple[int, int]]:
+    # Size is compared as well, in case of coarse modification times
+    try:
+        stat_result = stat(filepath)
+    except OSError:
+        return None
+    return (stat_result.st_mtime_ns, stat_result.st_size)